@@ -1,12 +1,48 @@
+import collections
 import librosa
+import logging
 import numpy as np
 import requests
 import io
+import os
+import threading
 import time
+from concurrent.futures import Future
+import dsp
+import executor
+from cache import content_hash, make_key
 from config import settings
-from openai import OpenAI
+from ingest import StreamingIngest
+from emotion_model import get_local_model, log_answer
+from metrics import CHUNKS, EMOTIONS, observe_stages, timed
+from pipeline import Batcher, Stage, StagedPipeline
+from clients import get_clients
+from ratelimit import get_limits
 from pydantic import BaseModel, Field
 
+EMOTION_MODEL = "gpt-4o-mini"
+IMAGE_MODEL = "luma/photon-flash"
+PROMPT_VERSION = 1  # bump when the emotion or image prompt changes; part of every cache key
+TEMPO_VERSION = 2  # bump when tempo estimation changes; part of every cache key
+
+logger = logging.getLogger(__name__)
+
+# How the three features read emotionally; shared by the single and batched emotion prompts
+FEATURE_GUIDE = """- **Energy (0.0–1.0):** A normalized measure of loudness and intensity computed from RMS energy.
+  • Low values (~0.0–0.3) indicate soft, gentle, or quiet passages.
+  • Mid values (~0.4–0.7) indicate moderate intensity.
+  • High values (~0.8–1.0) indicate strong, loud, or forceful segments.
+
+- **Tempo (in BPM):** The estimated local beat speed of the chunk.
+  • Slow tempo (<80 BPM) = calm, relaxed, or romantic.
+  • Medium tempo (80–120 BPM) = balanced or emotional.
+  • Fast tempo (>120 BPM) = energetic, excited, or tense.
+
+- **Key (note and mode):** The detected tonal center and mode of the music (e.g., 'C major', 'A minor').
+  • Major keys generally express brighter, happier, or more confident moods.
+  • Minor keys often sound sadder, darker, or more emotional.
+"""
+
 class EmotionOutput(BaseModel):
     """Structured output for music emotion classification with percentage distribution"""
     happy: float = Field(description="Percentage likelihood of Happy emotion (0-100)", ge=0.0, le=100.0)
@@ -23,12 +59,44 @@ class EmotionOutput(BaseModel):
     )
 
 
+# Stands in for a chunk whose GPT call failed for good; never cached
+UNAVAILABLE_EMOTION = EmotionOutput(
+    happy=0, sad=0, calm=0, energetic=0, excited=0, relaxed=0, angry=0, romantic=0, other=100,
+    reasoning="Emotion analysis was unavailable for this chunk (the service was busy); showing a neutral placeholder.",
+)
 
-class Process:
 
-    def __init__(self, url):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+class EmotionBatchOutput(BaseModel):
+    """Structured output for several chunks classified in one request, in chunk order"""
+    results: list[EmotionOutput] = Field(description="One emotion distribution per chunk, in the order given")
+
+
+
+class Process:
+    CHUNK_DURATION = 7.0
+    HOP_DURATION = 6.0          # overlap for smoother updates
+
+    def __init__(self, url, dsp_executor=None, cache=None, emotion_memo=None, image_memo=None, clients=None):
+        # clients.Clients: pooled OpenAI, Replicate and download sessions; the application's unless given
+        self.clients = clients or get_clients()
+        self.client = self.clients.openai
+        self.replicate = self.clients.replicate
+        self.http = self.clients.http
+        self.limits = get_limits()  # process-wide rate limits per provider
+        self.local_model = get_local_model()  # emotion_model.LocalEmotionModel unless EMOTION_MODE is "gpt"
         self.url = url
+        # Optional concurrent.futures executor (see executor.get_dsp_pool) for librosa work
+        self.dsp_executor = dsp_executor
+        # Optional cache.ResultCache for waveforms and chunk results
+        self.cache = cache
+        # Optional cache.ResultCache of GPT emotions by quantized features (see cache.get_emotion_memo)
+        self.emotion_memo = emotion_memo
+        # Optional cache.ResultCache of image URLs by emotion signature (see cache.get_image_memo)
+        self.image_memo = image_memo
+        self._image_pending = {}  # signature -> Future of an image being generated
+        self._image_lock = threading.Lock()
+        self.content_hash = None
+        self.cached_chunks = None  # set when the whole track replays from the cache
         self.wave = None
         self.sr = None
         self.chunk1 = None
@@ -37,75 +105,214 @@ class Process:
         self.tempo = None
         self.emotions = []
         self.waveform_data = []
+        self.waveform_features = None  # (rms, spectral centroid, seconds) behind waveform_data, for adaptive chunking
+        self.timings = {}  # track-level stage -> seconds (download, decode, waveform, ...)
+        self.features = None  # dsp.TrackFeatures when FEATURE_MODE is "track"
+        self._features_lock = threading.Lock()
+        self.ingest = None  # ingest.StreamingIngest when INGEST_MODE is "streaming"
+        # Decided upfront rather than from self.ingest, so cache keys match before and after loading;
+        # local files are always read whole
+        self.stream_ingest = settings.INGEST_MODE == "streaming" and not os.path.isfile(url)
+        self._emotion_batcher = None  # pipeline.Batcher when EMOTION_BATCH_SIZE > 1
+        self._url_key = None
+
+    @property
+    def streaming(self):
+        """True when the track is decoded while it downloads and the waveform comes from process_waveform"""
+        return self.ingest is not None
+
+    @property
+    def feature_mode(self):
+        # Whole-track features need the whole track in memory, which streaming ingest avoids
+        return "chunk" if self.stream_ingest else settings.FEATURE_MODE
     
     def load_and_calculate_waveform(self):
         """Load audio and calculate full waveform visualization data"""
         try:
-            print(f"[Process] Downloading audio from: {self.url}")
-            response = requests.get(self.url)
-            response.raise_for_status()
-            audio_data = io.BytesIO(response.content)
-            print(f"[Process] Audio downloaded successfully ({len(response.content)} bytes)")
-
-            print("[Process] Loading audio file with librosa...")
-            self.wave, self.sr = librosa.load(audio_data, sr=None)
-            print(f"[Process] Audio loaded: {len(self.wave)} samples at {self.sr} Hz")
-            
-            # Calculate waveform data for visualization
-            print("[Process] Calculating waveform data for visualization...")
-            self.waveform_data = self.calculate_waveform_data()
-            print(f"[Process] Calculated {len(self.waveform_data)} waveform frames")
-            
+            loaded = self._load_audio()
+            if loaded is not None:
+                self._prepare_audio(*loaded)
             return self.waveform_data
         except Exception as e:
-            print(f"[Process] ERROR loading waveform: {str(e)}")
+            logger.error("Loading %s failed: %s", self.url, e)
             return []
 
+    def load_waveform_progressively(self):
+        """
+        load_and_calculate_waveform for clients that draw while it runs: yields
+        {"overview": frames} (dsp.waveform_overview) as soon as the track is
+        decoded, then {"waveform": frames} with the detailed frames, before the
+        analysis resample runs. Cached tracks skip the overview. Nothing is drawn
+        during the download: buffered ingest decodes once it has the whole file,
+        and with streaming ingest nothing is yielded and the waveform comes from
+        process_waveform. The detailed frames are normalized over the whole
+        track, so there is nothing to send between the two.
+        """
+        try:
+            loaded = self._load_audio()
+            if loaded is not None:
+                native, native_sr = loaded
+                with timed("overview", self.timings):
+                    overview = dsp.waveform_overview(
+                        native, native_sr, settings.WAVEFORM_OVERVIEW_FRAMES, settings.WAVEFORM_OVERVIEW_SR
+                    )
+                yield {"overview": overview}
+                self._prepare_waveform(native, native_sr)
+            if self.waveform_data:
+                yield {"waveform": self.waveform_data}
+            if loaded is not None:
+                self._prepare_analysis(native, native_sr)
+        except Exception as e:
+            logger.error("Loading %s failed: %s", self.url, e)
+
+    def _load_audio(self):
+        """
+        Download and decode the track: (samples, sr) at the native rate, or None
+        when there is nothing to decode here (replayed from cache, or streaming ingest)
+        """
+        url_key = self._url_key = self._url_cache_key() if self.cache is not None else None
+        if url_key is not None:
+            self.content_hash = self.cache.get(url_key)
+            if self.content_hash is not None and self._load_cached_track():
+                logger.info("Replaying %s from cache", self.url)
+                return None
+
+        if self.stream_ingest:
+            # Download and decode run in the background; process_waveform consumes them
+            logger.info("Streaming audio from %s", self.url)
+            self.ingest = StreamingIngest(
+                self.url,
+                self.CHUNK_DURATION,
+                self.HOP_DURATION,
+                timeout=settings.DOWNLOAD_TIMEOUT,
+                block_bytes=settings.DOWNLOAD_BLOCK_BYTES,
+                max_pending_chunks=settings.INGEST_PENDING_CHUNKS,
+                analysis_sr=settings.ANALYSIS_SR,
+                waveform_sr=settings.WAVEFORM_SR,
+                resample_quality=settings.RESAMPLE_QUALITY,
+                session=self.http,
+            )
+            return None
+
+        local = os.path.isfile(self.url)
+        if local:
+            # Local files only come from the batch CLI; the web API takes CDN URLs (see main.check_audio_url)
+            with timed("read", self.timings), open(self.url, "rb") as f:
+                content = f.read()
+        else:
+            logger.info("Downloading audio from %s", self.url)
+            with timed("download", self.timings):
+                response = self.http.get(self.url, timeout=settings.DOWNLOAD_TIMEOUT)
+                response.raise_for_status()
+            content = response.content
+        audio_data = io.BytesIO(content)
+        logger.info("Audio %s (%d bytes)", "read" if local else "downloaded", len(content))
+
+        self.content_hash = content_hash(content)
+        if self.cache is not None:
+            if url_key is not None:
+                self.cache.set(url_key, self.content_hash)
+            if self._load_cached_track():
+                logger.info("Same audio already processed, replaying from cache")
+                return None
+
+        with timed("decode", self.timings):
+            native, native_sr = librosa.load(audio_data, sr=None, dtype=np.float32)
+        logger.info("Audio loaded: %d samples at %d Hz", len(native), native_sr)
+        return native, native_sr
+
+    def _prepare_audio(self, native, native_sr):
+        """Detailed waveform frames and the analysis-rate track from the decoded audio"""
+        self._prepare_waveform(native, native_sr)
+        self._prepare_analysis(native, native_sr)
+
+    def _prepare_waveform(self, native, native_sr):
+        # Calculate waveform data for visualization (at its own rate, native by default)
+        with timed("waveform", self.timings):
+            display_wave, display_sr = dsp.resample(native, native_sr, settings.WAVEFORM_SR, settings.RESAMPLE_QUALITY)
+            self.waveform_data = self.calculate_waveform_data(display_wave, display_sr)
+        logger.info("Calculated %d waveform frames", len(self.waveform_data))
+
+    def _prepare_analysis(self, native, native_sr):
+        # Tempo and key need far less bandwidth than the native rate
+        with timed("resample", self.timings):
+            self.wave, self.sr = dsp.resample(native, native_sr, settings.ANALYSIS_SR, settings.RESAMPLE_QUALITY)
+        if self.sr != native_sr:
+            logger.debug("Resampled to %d Hz for analysis", self.sr)
+
     def process_waveform(self):   
-        """Generator that yields chunk results as they're processed"""
+        """
+        Generator that yields chunk results, in chunk order, as they're processed.
+        With streaming ingest it also yields {"waveform": frames} once, as soon as the track is decoded.
+        """
         try: 
-            samples_per_chunk, hop_samples = self.chunk()
-            
-            total_chunks = (len(self.wave) - samples_per_chunk) // hop_samples
-            chunk_number = 0
-            print(f"[Process] Starting to process {total_chunks} chunks...")
+            if self.cached_chunks is not None:
+                for result in self.cached_chunks:
+                    self.energy, self.tempo, self.key = result["energy"], result["tempo"], result["key"]
+                    self.emotions.append(EmotionOutput(**result["emotion"]))
+                    yield {k: v for k, v in result.items() if k not in ("image_created", "degraded")}
+                return
+
+            if self.streaming:
+                self.ingest.wait_header()
+                self.sr = self.ingest.sr
+                total_chunks = self.ingest.total_chunks
+                chunks = (
+                    self._chunk_state(n + 1, total_chunks, start, start + len(samples), samples)
+                    for n, (start, samples) in enumerate(self.ingest.chunks())
+                )
+            else:
+                bounds = self.chunk_bounds()
+                total_chunks = len(bounds)
+                chunks = (
+                    self._chunk_state(n + 1, total_chunks, start, end, self.wave[start:end])
+                    for n, (start, end) in enumerate(bounds)
+                )
+            logger.info("Processing %d chunks", total_chunks)
+
+            emotion_slots, window = settings.EMOTION_CONCURRENCY, settings.PIPELINE_WINDOW
+            if settings.EMOTION_BATCH_SIZE > 1:
+                # Up to EMOTION_CONCURRENCY batched requests in flight, and enough chunks to fill them
+                self._emotion_batcher = Batcher(
+                    self.calculate_emotions,
+                    lambda features: self.calculate_emotion(*features),
+                    settings.EMOTION_BATCH_SIZE,
+                    settings.EMOTION_BATCH_LATENCY,
+                )
+                emotion_slots *= settings.EMOTION_BATCH_SIZE
+                window = max(window, settings.EMOTION_BATCH_SIZE)
+
+            # DSP for chunk N+1, GPT for chunk N and the image for chunk N-1 overlap
+            pipeline = StagedPipeline(
+                [
+                    Stage("dsp", self._dsp_stage, settings.DSP_CONCURRENCY),
+                    Stage("emotion", self._emotion_stage, emotion_slots),
+                    Stage("image", self._image_stage, settings.IMAGE_CONCURRENCY),
+                ],
+                window=window,
+            )
+            completed = []
+            emotion_sources = collections.Counter()  # memo, local, gpt, unavailable or cache, per chunk
+            waveform_sent = not self.streaming
             
-            for start in range(0, len(self.wave) - samples_per_chunk, hop_samples):
-                end = start + samples_per_chunk
-                chunk = self.wave[start:end]
-                self.chunk1 = chunk
-                
-                print(f"\n[Chunk {chunk_number + 1}/{total_chunks}] Processing...")
-                
-                print(f"[Chunk {chunk_number + 1}] Calculating energy...")
-                self.energy = self.get_chunk_energy()
-                print(f"[Chunk {chunk_number + 1}] Energy: {self.energy:.4f}")
-                
-                print(f"[Chunk {chunk_number + 1}] Calculating tempo...")
-                self.tempo = self.get_chunk_tempo()
-                print(f"[Chunk {chunk_number + 1}] Tempo: {self.tempo:.1f} BPM")
-                
-                print(f"[Chunk {chunk_number + 1}] Detecting key...")
-                self.key = self.get_chunk_key()
-                print(f"[Chunk {chunk_number + 1}] Key: {self.key}")
-                
-                print(f"[Chunk {chunk_number + 1}] Calculating emotions with GPT...")
-                emotional_output = self.calculate_emotion()
+            for state in pipeline.run(chunks):
+                if not waveform_sent and self.ingest.waveform.done():
+                    yield self._streamed_waveform()
+                    waveform_sent = True
+
+                self._collect_image(state)
+                emotional_output = state["emotion"]
+                self.energy, self.tempo, self.key = state["energy"], state["tempo"], state["key"]
                 self.emotions.append(emotional_output)
-                print(f"[Chunk {chunk_number + 1}] Emotions calculated")
-                
-                print(f"[Chunk {chunk_number + 1}] Generating image with DALL-E...")
-                image_url = self.generate_emotion_image()
-                print(f"[Chunk {chunk_number + 1}] Image generated: {len(image_url) if image_url else 0} chars")
-                
-                chunk_number += 1
                 
-                yield {
-                    "chunk_number": chunk_number,
+                result = {
+                    "chunk_number": state["chunk_number"],
                     "total_chunks": total_chunks,
                     "energy": float(self.energy),
                     "tempo": float(self.tempo),
                     "key": self.key,
+                    "start_time": round(state["start"] / self.sr, 3),
+                    "end_time": round(state["end"] / self.sr, 3),
                     "emotion": {
                         "happy": emotional_output.happy,
                         "sad": emotional_output.sad,
@@ -118,204 +325,406 @@ class Process:
                         "other": emotional_output.other,
                         "reasoning": emotional_output.reasoning
                     },
-                    "image_url": image_url
+                    "image_url": state["image_url"],
+                    "timings": state["timings"],
                 }
+                if "key_confidence" in state:
+                    result["key_confidence"] = state["key_confidence"]
+                CHUNKS.inc(source="cache" if state.get("cached") else "pipeline")
+                emotion_sources[state.get("emotion_source", "cache")] += 1
+                if self.cache is not None:
+                    stored = {k: v for k, v in result.items() if k != "timings"}
+                    stored.update(image_created=state.get("image_created"), degraded=state.get("degraded", False))
+                    if not state.get("cached") and not state.get("degraded"):
+                        self.cache.set(state["cache_key"], stored)
+                    completed.append(stored)
+                yield result
                 
-            print(f"\n[Process] All {total_chunks} chunks processed successfully!")
+            logger.info("All %d chunks processed; emotions from %s", total_chunks,
+                        ", ".join(f"{source} {count}" for source, count in sorted(emotion_sources.items())) or "none")
+            if not waveform_sent:
+                yield self._streamed_waveform()
+            if self.streaming:
+                self.content_hash = self.ingest.content_hash
+                if self._url_key is not None:
+                    self.cache.set(self._url_key, self.content_hash)
+            # A track with placeholder emotions is worth redoing later rather than replaying
+            if self.cache is not None and not any(chunk.get("degraded") for chunk in completed):
+                self.cache.set(self._track_cache_key(), {"waveform": self.waveform_data, "chunks": completed})
                 
         except Exception as e:
-            print(f"[Process] ERROR: {str(e)}")
+            logger.exception("Processing %s failed", self.url)
             yield {"error": f"Could not load file: {str(e)}"}
+        finally:
+            if self.streaming:
+                self.ingest.close()
+
+    def _streamed_waveform(self):
+        """Waveform frames from the streaming decoder, waiting for it if needed"""
+        self.waveform_data = self.ingest.waveform.result()
+        logger.info("Calculated %d waveform frames", len(self.waveform_data))
+        return {"waveform": self.waveform_data}
+
+    def analysis_params(self):
+        """Everything besides the audio itself that changes the results; part of every cache key"""
+        return {
+            "chunk_duration": self.CHUNK_DURATION,
+            "hop_duration": self.HOP_DURATION,
+            "feature_mode": self.feature_mode,
+            "chunking": self._chunking_params(),
+            "analysis_sr": settings.ANALYSIS_SR,
+            "key_chroma": settings.KEY_CHROMA,
+            "tempo_version": TEMPO_VERSION,
+            "tempo_prior_octaves": settings.TEMPO_PRIOR_OCTAVES,
+            "emotion_model": EMOTION_MODEL,
+            "emotion_source": self._emotion_params(),
+            "image_model": IMAGE_MODEL,
+            "prompt_version": PROMPT_VERSION,
+        }
+
+    def _chunking_params(self):
+        if settings.CHUNKING != "adaptive" or self.stream_ingest:
+            return "fixed"
+        return [settings.SEGMENT_MIN_SECONDS, settings.SEGMENT_MAX_SECONDS, settings.SEGMENT_BUDGET, settings.SEGMENT_NOVELTY]
+
+    def _emotion_params(self):
+        if self.local_model is None:
+            return "gpt"
+        threshold = settings.EMOTION_LOCAL_CONFIDENCE if settings.EMOTION_MODE == "hybrid" else None
+        return [settings.EMOTION_MODE, self.local_model.version, threshold]
+
+    def _track_cache_key(self):
+        return make_key("track", self.content_hash, self.analysis_params())
+
+    def _url_cache_key(self):
+        """Key that maps the current version of self.url (per ETag/Last-Modified) to its content hash"""
+        if os.path.isfile(self.url):
+            stat = os.stat(self.url)
+            return make_key("file", os.path.abspath(self.url), stat.st_mtime_ns, stat.st_size)
+        try:
+            head = self.http.head(self.url, allow_redirects=True, timeout=5)
+            head.raise_for_status()
+        except requests.RequestException:
+            return None
+        version = head.headers.get("ETag") or head.headers.get("Last-Modified")
+        if not version:
+            return None
+        return make_key("url", self.url, version, head.headers.get("Content-Length"))
+
+    def _emotion_memo_key(self, energy, tempo, key):
+        """Chunks whose energy and tempo fall in the same buckets, with the same key, share a GPT result"""
+        energy_step, tempo_step = settings.EMOTION_MEMO_ENERGY_STEP, settings.EMOTION_MEMO_TEMPO_STEP
+        return make_key(
+            "emotion", round(energy / energy_step), round(tempo / tempo_step), key,
+            energy_step, tempo_step, EMOTION_MODEL, PROMPT_VERSION,
+        )
+
+    def _image_expired(self, result):
+        # Replicate output URLs are short-lived, so old image URLs are regenerated rather than replayed
+        created = result.get("image_created")
+        return result.get("image_url") is None or created is None or time.time() - created > settings.IMAGE_URL_TTL_SECONDS
+
+    def _load_cached_track(self):
+        """Set up a replay of a fully processed track from the cache. Returns True on a hit."""
+        entry = self.cache.get(self._track_cache_key())
+        if entry is None or any(self._image_expired(result) for result in entry["chunks"]):
+            return False
+        self.waveform_data = entry["waveform"]
+        self.cached_chunks = entry["chunks"]
+        return True
+
+    def _chunk_state(self, chunk_number, total_chunks, start, end, samples):
+        """Pipeline input for one chunk, pre-filled with whatever the cache already knows about it"""
+        state = {
+            "chunk_number": chunk_number, "total_chunks": total_chunks, "start": start, "end": end, "samples": samples,
+            "timings": {},  # stage -> seconds, for metrics and optional NDJSON timing fields
+        }
+        if self.cache is None:
+            return state
+
+        # Track-mode features also depend on the rest of the track (HPSS context, the tempo prior)
+        track = self._track_cache_key() if self.feature_mode == "track" else None
+        state["cache_key"] = make_key("chunk", content_hash(samples), track, self.analysis_params())
+        cached = self.cache.get(state["cache_key"])
+        if cached is not None:
+            state["energy"], state["tempo"], state["key"] = cached["energy"], cached["tempo"], cached["key"]
+            if settings.KEY_CONFIDENCE and "key_confidence" in cached:
+                state["key_confidence"] = cached["key_confidence"]
+            state["emotion"] = EmotionOutput(**cached["emotion"])
+            if not self._image_expired(cached):
+                state["image_url"] = cached["image_url"]
+                state["image_created"] = cached["image_created"]
+                state["cached"] = True
+        return state
+
+    def _track_features(self):
+        """Whole-track features, extracted on first use so fully cached tracks skip them"""
+        with self._features_lock:
+            if self.features is None:
+                logger.info("Extracting whole-track features")
+                with timed("track_features", self.timings):
+                    self.features = self.extract_track_features()
+                observe_stages(self.features.timings, prefix="track_")
+                self.timings["tempogram"] = self.features.timings.get("tempogram", 0.0)
+                logger.info("Track tempo %.1f BPM", self.features.track_tempo)
+            return self.features
+
+    def _dsp_stage(self, state):
+        """Pipeline stage: energy, tempo and key for one chunk"""
+        if "energy" in state:
+            return state
+        n = state["chunk_number"]
+        with_confidence = settings.KEY_CONFIDENCE
+        if self.feature_mode == "track":
+            features = self._track_features()
+            with timed("dsp", state["timings"]):
+                values = self._run_dsp(
+                    dsp.sliced_chunk_features, self.sr, *features.chunk_slices(state["start"], state["end"]),
+                    features.track_tempo, with_confidence, settings.TEMPO_PRIOR_OCTAVES,
+                )
+        else:
+            with timed("dsp", state["timings"]):
+                values = self._run_dsp(dsp.analyse_chunk, state["samples"], self.sr, settings.KEY_CHROMA, with_confidence)
+        state.update(zip(("energy", "tempo", "key", "key_confidence"), values))
+        logger.debug("Chunk %d/%d: energy %.4f, tempo %.1f BPM, key %s", n, state["total_chunks"],
+                     state["energy"], state["tempo"], state["key"], extra={"chunk": n})
+        return state
+
+    def _emotion_stage(self, state):
+        """Pipeline stage: emotion classification for one chunk, by GPT or the local model"""
+        if "emotion" in state:
+            return state
+        n = state["chunk_number"]
+        features = (state["energy"], state["tempo"], state["key"])
+        memo_key = self._emotion_memo_key(*features) if self.emotion_memo is not None else None
+        if memo_key is not None:
+            memoized = self.emotion_memo.get(memo_key)
+            if memoized is not None:
+                state["emotion"] = EmotionOutput(**memoized)
+                state["emotion_source"] = "memo"
+                EMOTIONS.inc(source="memo")
+                logger.debug("Chunk %d: emotions reused from a similar chunk", n, extra={"chunk": n})
+                return state
+        if self.local_model is not None:
+            with timed("emotion_local", state["timings"]):
+                emotion = self.local_emotion(*features)
+            if emotion is not None:
+                state["emotion"] = emotion
+                state["emotion_source"] = "local"
+                EMOTIONS.inc(source="local")
+                return state
+            logger.debug("Chunk %d: local emotions too uncertain, asking GPT", n, extra={"chunk": n})
+        try:
+            with timed("emotion", state["timings"]):
+                if self._emotion_batcher is not None:
+                    state["emotion"] = self._emotion_batcher(features)
+                else:
+                    state["emotion"] = self.calculate_emotion(*features)
+        except Exception as e:
+            # Out of retries (or unparseable): keep the stream going with a neutral placeholder
+            logger.warning("Chunk %d: emotions unavailable, using a placeholder: %s", n, e, extra={"chunk": n})
+            state["emotion"] = UNAVAILABLE_EMOTION
+            state["degraded"] = True
+            state["emotion_source"] = "unavailable"
+            EMOTIONS.inc(source="unavailable")
+            return state
+        state["emotion_source"] = "gpt"
+        EMOTIONS.inc(source="gpt")
+        answer = state["emotion"].model_dump()
+        if memo_key is not None:
+            self.emotion_memo.set(memo_key, answer)
+        log_answer(*features, answer)
+        return state
+
+    def local_emotion(self, energy, tempo, key):
+        """
+        The local model's EmotionOutput for a chunk, or None when EMOTION_MODE is
+        "hybrid" and it is less than EMOTION_LOCAL_CONFIDENCE sure (GPT decides then)
+        """
+        distribution, confidence = self.local_model.predict(energy, tempo, key)
+        if settings.EMOTION_MODE == "hybrid" and confidence < settings.EMOTION_LOCAL_CONFIDENCE:
+            return None
+        return EmotionOutput(
+            **distribution,
+            reasoning=f"Estimated locally ({confidence:.0%} confidence) from analysed chunks closest to "
+                      f"energy {energy:.2f}, {tempo:.0f} BPM and {key}.",
+        )
+
+    def _image_stage(self, state):
+        """
+        Pipeline stage: starts image generation for one chunk on the async client loop,
+        shared with similar chunks when deduplicating; process_waveform collects it in order
+        """
+        if "image_url" in state:
+            return state
+        state["image"] = self._new_image(state) if self.image_memo is None else self._shared_image(state)
+        return state
+
+    def _collect_image(self, state):
+        """Wait for the image the image stage started (nothing to do for replayed chunks)"""
+        image = state.pop("image", None)
+        if image is None:
+            return
+        if image.done():
+            state["image_url"], state["image_created"] = image.result()
+        else:
+            with timed("image_wait", state["timings"]):
+                state["image_url"], state["image_created"] = image.result()
+        n = state["chunk_number"]
+        logger.debug("Chunk %d: image %s", n, state["image_url"], extra={"chunk": n})
+
+    def _new_image(self, state):
+        """Future of (image_url, created) for the chunk; no thread waits while Replicate works"""
+        async def generate():
+            with timed("image", state["timings"]):
+                image_url = await self.generate_emotion_image(
+                    energy=state["energy"], tempo=state["tempo"], key=state["key"], emotion=state["emotion"]
+                )
+            return image_url, time.time()
+        return executor.submit_async(generate())
+
+    def _image_signature(self, state):
+        """Coarse description of a chunk's image: bucketed top-k emotions, key, tempo and energy bands"""
+        emotions = state["emotion"].model_dump(exclude={"reasoning"})
+        top = sorted(emotions.items(), key=lambda item: (-item[1], item[0]))[:settings.IMAGE_DEDUP_TOP_K]
+        emotion_step = settings.IMAGE_DEDUP_EMOTION_STEP
+        tempo_step, energy_step = settings.IMAGE_DEDUP_TEMPO_STEP, settings.IMAGE_DEDUP_ENERGY_STEP
+        return make_key(
+            "image", [(name, round(score / emotion_step)) for name, score in top], state["key"],
+            round(state["tempo"] / tempo_step), round(state["energy"] / energy_step),
+            emotion_step, tempo_step, energy_step, IMAGE_MODEL, PROMPT_VERSION,
+        )
+
+    def _shared_image(self, state):
+        """
+        Future of (image_url, created) for the chunk's signature: a remembered image, the one a
+        similar chunk is generating right now, or a new one. Only scene changes pay for Photon.
+        """
+        signature = self._image_signature(state)
+        with self._image_lock:
+            pending = self._image_pending.get(signature)
+            if pending is not None:
+                logger.debug("Chunk %d: sharing a similar chunk's image", state["chunk_number"])
+                return pending
+            remembered = self.image_memo.get(signature)
+            if remembered is not None:
+                logger.debug("Chunk %d: reusing the image of a similar chunk", state["chunk_number"])
+                pending = Future()
+                pending.set_result((remembered["image_url"], remembered["image_created"]))
+                return pending
+            pending = self._image_pending[signature] = self._new_image(state)
+
+        def settle(future):
+            # Remembered before it stops being pending, so no chunk in between starts a duplicate
+            if not future.cancelled() and future.exception() is None:
+                image_url, created = future.result()
+                if image_url is not None:
+                    self.image_memo.set(signature, {"image_url": image_url, "image_created": created})
+            with self._image_lock:
+                self._image_pending.pop(signature, None)
+
+        pending.add_done_callback(settle)
+        return pending
+
     #def get 
-    def calculate_waveform_data(self):
+    def calculate_waveform_data(self, wave=None, sr=None):
         """Calculate frame-level RMS and emotion colors for visualization (Brady's logic)"""
-        # Use Brady's parameters
-        hop_length = 1024
-        frame_length = 2048
-        
-        # RMS (energy/arousal)
-        rms = librosa.feature.rms(y=self.wave, frame_length=frame_length, hop_length=hop_length)[0]
-        rms_norm = (rms - rms.min()) / (rms.max() - rms.min())
-        
-        # Spectral centroid (brightness/valence)
-        spec_centroid = librosa.feature.spectral_centroid(y=self.wave, sr=self.sr, hop_length=hop_length)[0]
-        centroid_norm = (spec_centroid - spec_centroid.min()) / (spec_centroid.max() - spec_centroid.min())
-        
-        # Calculate times for each frame
-        total_seconds = len(self.wave) / self.sr
-        rms_times = np.linspace(0, total_seconds, len(rms))
-        
-        # Map frames to emotion colors
-        colors_raw = np.array([self.emotion_to_color(a, v) for a, v in zip(rms_norm, centroid_norm)])
-        
-        # Apply block_size for discrete sections (Brady's approach)
-        block_size = 30
-        num_frames = len(colors_raw)
-        colors = np.zeros_like(colors_raw)
-        
-        for i in range(num_frames):
-            block_index = i // block_size
-            start_idx = block_index * block_size
-            colors[i] = colors_raw[start_idx]
-        
-        # Build waveform frames (downsample to reduce JSON size)
-        # Take every 3rd frame for high detail (buffering handles large payloads)
-        downsample_factor = 3
-        waveform_frames = []
-        for i in range(0, num_frames, downsample_factor):
-            # Convert RGB (0-1) to hex
-            rgb = (colors[i] * 255).astype(int)
-            hex_color = f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"
-            
-            waveform_frames.append({
-                "time": float(rms_times[i]),
-                "amplitude": float(rms[i]),
-                "color": hex_color
-            })
-        
-        print(f"[Waveform] Downsampled from {num_frames} to {len(waveform_frames)} frames")
-        return waveform_frames
-    
-    def brighten_color(self, color, factor):
-        """Brighten an RGB color array (values 0-1). Factor >1 increases brightness."""
-        brightened = color * factor
-        return np.clip(brightened, 0, 1)
-    
-    def emotion_to_color(self, loudness, brightness):
-        """Map arousal (energy) and valence (brightness) to an RGB color (Brady's logic)"""
-        happy = np.array([255, 230, 0])      # bright yellow
-        sad = np.array([0, 0, 200])          # bright blue
-        calm = np.array([0, 255, 150])       # bright teal
-        angry = np.array([255, 0, 0])        # bright red
-        
-        color = (
-            brightness * (loudness * happy + (1 - loudness) * calm) +
-            (1 - brightness) * (loudness * angry + (1 - loudness) * sad)
-        )
-        
-        # Apply brightening (fixing Brady's bug where result wasn't used)
-        color = self.brighten_color(color / 255, factor=2)
-        
-        return color  # Returns normalized RGB (0-1)
+        if wave is None:
+            wave, sr = self.wave, self.sr
+        frames, rms, spec_centroid = self._run_dsp(dsp.waveform_analysis, wave, sr)
+        self.waveform_features = (rms, spec_centroid, len(wave) / sr)
+        return frames
     
     def chunk(self):
-        chunk_duration = 7.0
-        hop_duration = 6.0          # overlap for smoother updates
-        samples_per_chunk = int(chunk_duration * self.sr)
-        hop_samples = int(hop_duration * self.sr)
+        samples_per_chunk = int(self.CHUNK_DURATION * self.sr)
+        hop_samples = int(self.HOP_DURATION * self.sr)
 
         return samples_per_chunk, hop_samples
+
+    def chunk_bounds(self):
+        """
+        [(start, end)] sample ranges to analyse: fixed CHUNK_DURATION windows every
+        HOP_DURATION, or with CHUNKING="adaptive" one segment per stretch of
+        similar-sounding music (see dsp.novelty_segments)
+        """
+        if settings.CHUNKING == "adaptive" and self.waveform_features is not None:
+            rms, spec_centroid, seconds = self.waveform_features
+            segments = dsp.novelty_segments(
+                rms, spec_centroid, seconds,
+                settings.SEGMENT_MIN_SECONDS, settings.SEGMENT_MAX_SECONDS,
+                settings.SEGMENT_BUDGET, settings.SEGMENT_NOVELTY,
+            )
+            bounds = [(int(start * self.sr), min(len(self.wave), int(end * self.sr))) for start, end in segments]
+            logger.info("Adaptive chunking: %d segments for %.0f s", len(bounds), seconds)
+            return bounds
+        samples_per_chunk, hop_samples = self.chunk()
+        starts = range(0, len(self.wave) - samples_per_chunk, hop_samples)
+        return [(start, start + samples_per_chunk) for start in starts]
         
         # split everything up into 0.5 second chunks 
     def get_chunk_energy(self):
-        """
-        Compute the energy of one chunk of amplitudes.
-        `chunk` is a list or numpy array of amplitude values.
-        """
-        if len(self.chunk1) == 0:
-            return 0.0
-
-        # Convert to mono float32 just in case
-        y = librosa.util.normalize(self.chunk1.astype(float))
+        """Compute the energy (0-1) of the current chunk."""
+        return dsp.chunk_energy(self.chunk1, self.sr)
 
-        # Compute RMS (frame-wise)
-        rms = librosa.feature.rms(y=y, frame_length=2048, hop_length=512)[0]
-
-        # Convert to decibels for perceptual scaling
-        rms_db = librosa.amplitude_to_db(rms, ref=np.max)
-
-        # Normalize 0–1 range (0 = silence, 1 = loudest)
-        energy = np.clip((rms_db + 60) / 60, 0, 1)
-
-        return float(np.mean(energy))
     def get_chunk_tempo(self):
-        # get the tempo from  one chunk of the audio file
-        if len(self.chunk1) == 0:
-            return 0.0
-
-        # Separate harmonic and percussive parts
-        y_harm, y_perc = librosa.effects.hpss(self.chunk1)
-
-        # Onset strength envelope from percussive component
-        onset_env = librosa.onset.onset_strength(y=y_perc, sr=self.sr, hop_length=256)
-
-        # Estimate tempo using global autocorrelation
-        tempo = librosa.beat.tempo(onset_envelope=onset_env, sr=self.sr, aggregate=None)
-
-        # Use median to reduce jitter between short chunks
-        bpm = float(np.median(tempo))
-
-        return bpm
+        """Estimate the tempo (BPM) of the current chunk."""
+        return dsp.chunk_tempo(self.chunk1, self.sr)
     
     def get_chunk_key(self):
         """
         Estimate musical key (e.g., 'C major' or 'A minor') for current chunk.
         """
-        if len(self.chunk1) == 0:
-            return "Unknown"
-
-        y = self.chunk1
-
-        # Emphasize harmonic content
-        y_harm = librosa.effects.harmonic(y)
-
-        # Compute chroma features (12 pitch classes)
-        chroma = librosa.feature.chroma_cqt(y=y_harm, sr=self.sr)
-        chroma_mean = np.mean(chroma, axis=1)
+        return dsp.chunk_key(self.chunk1, self.sr, settings.KEY_CHROMA)
 
-        # Normalize chroma vector
-        chroma_mean /= chroma_mean.sum() + 1e-6
-
-        # Key templates from major/minor profiles (Krumhansl–Kessler)
-        major_profile = np.array(
-            [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88]
-        )
-        minor_profile = np.array(
-            [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17]
-        )
-
-        # Rotate templates to match each of the 12 pitch classes
-        corrs_major = [np.corrcoef(np.roll(major_profile, i), chroma_mean)[0, 1] for i in range(12)]
-        corrs_minor = [np.corrcoef(np.roll(minor_profile, i), chroma_mean)[0, 1] for i in range(12)]
-
-        best_major = np.argmax(corrs_major)
-        best_minor = np.argmax(corrs_minor)
-
-        # Compare correlation strength
-        if corrs_major[best_major] >= corrs_minor[best_minor]:
-            key = librosa.midi_to_note(12 + best_major, octave=False) + " major"
-        else:
-            key = librosa.midi_to_note(12 + best_minor, octave=False) + " minor"
-
-        return key
+    def extract_track_features(self):
+        """
+        Compute dsp.TrackFeatures for the loaded track, tempogram included, on
+        the DSP pool if there is one. Long tracks are split into padded blocks
+        that run there in parallel.
+        """
+        align = dsp.TrackFeatures.BLOCK_ALIGN
+        block = max(align, int(settings.FEATURE_BLOCK_SECONDS * self.sr) // align * align)
+        pad = int(2.0 * self.sr) // align * align  # covers HPSS median filters and low CQT bins
+        starts = range(0, len(self.wave), block)
+        if len(starts) == 1 or self.dsp_executor is None:
+            return self._run_dsp(dsp.track_features, self.wave, self.sr, 0, None, settings.KEY_CHROMA, True)
+
+        futures = []
+        for start in starts:
+            end = start + block
+            last = end >= len(self.wave)
+            lead = min(pad, start)
+            segment = self.wave[start - lead:end + pad]
+            futures.append(self.dsp_executor.submit(
+                dsp.track_features, segment, self.sr, lead, None if last else block, settings.KEY_CHROMA
+            ))
+        features = dsp.TrackFeatures.concatenate([f.result() for f in futures])
+        return self._run_dsp(dsp.with_tempogram, features)
+
+    def _run_dsp(self, fn, *args):
+        """Run a dsp function on the attached process pool, or inline without one."""
+        if self.dsp_executor is None:
+            return fn(*args)
+        return self.dsp_executor.submit(fn, *args).result()
 
         
-    def calculate_emotion(self) -> EmotionOutput:
-        #Calculate the emotion of the current chunk using structured outputs. Returns an EmotionOutput object with percentage distribution for each emotion.
+    def calculate_emotion(self, energy=None, tempo=None, key=None) -> EmotionOutput:
+        #Calculate the emotion of a chunk using structured outputs. Returns an EmotionOutput object with percentage distribution for each emotion.
+        #Features default to the current chunk (self.energy/tempo/key).
+        energy = self.energy if energy is None else energy
+        tempo = self.tempo if tempo is None else tempo
+        key = self.key if key is None else key
         
-        prompt = fprompt = f"""
+        prompt = f"""
 You are a music emotion classifier.
 
 Your task is to classify the emotion of a short audio chunk based on these extracted musical features:
 
-- **Energy (0.0–1.0):** A normalized measure of loudness and intensity computed from RMS energy.
-  • Low values (~0.0–0.3) indicate soft, gentle, or quiet passages.
-  • Mid values (~0.4–0.7) indicate moderate intensity.
-  • High values (~0.8–1.0) indicate strong, loud, or forceful segments.
-
-- **Tempo (in BPM):** The estimated local beat speed of the chunk.
-  • Slow tempo (<80 BPM) = calm, relaxed, or romantic.
-  • Medium tempo (80–120 BPM) = balanced or emotional.
-  • Fast tempo (>120 BPM) = energetic, excited, or tense.
-
-- **Key (note and mode):** The detected tonal center and mode of the music (e.g., 'C major', 'A minor').
-  • Major keys generally express brighter, happier, or more confident moods.
-  • Minor keys often sound sadder, darker, or more emotional.
-
+{FEATURE_GUIDE}
 Here are the feature values for this audio chunk:
-- Energy: {self.energy:.3f}
-- Tempo: {self.tempo:.2f} BPM
-- Key: {self.key}
+- Energy: {energy:.3f}
+- Tempo: {tempo:.2f} BPM
+- Key: {key}
 
 Based on these features:
 1. Estimate the emotional composition of the music by assigning a **percentage likelihood (0–100%)** to each of these categories:
@@ -330,8 +739,10 @@ Return the result as a valid JSON object with these fields:
 
         # Use OpenAI SDK with structured output
         try:
-            completion = self.client.beta.chat.completions.parse(
-                model="gpt-4o-mini",
+            # Waits for a rate-limit slot and retries 429s/5xx (see ratelimit.py)
+            completion = self.limits["openai"].call(
+                self.client.beta.chat.completions.parse,
+                model=EMOTION_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a music emotion analysis expert."},
                     {"role": "user", "content": prompt}
@@ -342,26 +753,85 @@ Return the result as a valid JSON object with these fields:
             result = completion.choices[0].message.parsed
             return result
         except Exception as e:
-            print(f"[Emotion] Error calculating emotion: {e}")
+            logger.warning("Emotion classification failed: %s", e)
             raise
-    
-    def generate_emotion_image(self, output_path: str = "emotion_visualization.png"):
+
+    def calculate_emotions(self, features) -> list[EmotionOutput]:
+        """
+        Classify several chunks in one structured-output request.
+        `features` is a list of (energy, tempo, key); returns one EmotionOutput per entry, in order.
+        Raises if the reply can't be parsed or has the wrong length (Batcher then falls back to calculate_emotion).
         """
-        Generate an image visualization based on the current chunk's emotion.
+        chunk_lines = "\n".join(
+            f"{i}. Energy: {energy:.3f}, Tempo: {tempo:.2f} BPM, Key: {key}"
+            for i, (energy, tempo, key) in enumerate(features, start=1)
+        )
+        prompt = f"""
+You are a music emotion classifier.
+
+Your task is to classify the emotion of {len(features)} short audio chunks, each described by these extracted musical features:
+
+{FEATURE_GUIDE}
+Here are the feature values for each audio chunk:
+{chunk_lines}
+
+For each chunk, independently:
+1. Estimate the emotional composition of the music by assigning a **percentage likelihood (0–100%)** to each of these categories:
+   Happy, Sad, Calm, Energetic, Excited, Relaxed, Angry, Romantic, Other.
+2. The total across all emotions **must sum to 100%**.
+3. Provide a short **reasoning** connecting the musical features (energy, tempo, key/mode) to your emotion estimates.
+
+Return a JSON object whose `results` list has exactly {len(features)} entries, one per chunk in the order given, each with these fields:
+`happy`, `sad`, `calm`, `energetic`, `excited`, `relaxed`, `angry`, `romantic`, `other`, and `reasoning`.
+"""
+
+        try:
+            # Waits for a rate-limit slot and retries 429s/5xx (see ratelimit.py)
+            completion = self.limits["openai"].call(
+                self.client.beta.chat.completions.parse,
+                model=EMOTION_MODEL,
+                messages=[
+                    {"role": "system", "content": "You are a music emotion analysis expert."},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format=EmotionBatchOutput
+            )
+            parsed = completion.choices[0].message.parsed
+            if parsed is None:
+                raise ValueError("No parsed output (refusal or truncated reply)")
+            if len(parsed.results) != len(features):
+                raise ValueError(f"Expected {len(features)} results, got {len(parsed.results)}")
+            logger.debug("Classified %d chunks in one request", len(features))
+            return parsed.results
+        except Exception as e:
+            logger.warning("Batched emotion classification failed: %s", e)
+            raise
+
+    async def generate_emotion_image(self, output_path: str = "emotion_visualization.png", energy=None, tempo=None, key=None, emotion=None):
+        """
+        Generate an image visualization based on a chunk's emotion.
         Uses Luma Photon Flash to create an artistic representation.
+        Features and emotion default to the current chunk (self.energy/tempo/key, self.emotions[-1]).
+        A coroutine for the async client loop (see executor.submit_async); returns None on failure.
         """
-        if not self.energy or not self.tempo or not self.key:
-            print("[Image] No chunk data calculated yet.")
+        energy = self.energy if energy is None else energy
+        tempo = self.tempo if tempo is None else tempo
+        key = self.key if key is None else key
+        if emotion is None and self.emotions:
+            emotion = self.emotions[-1]
+
+        if not energy or not tempo or not key:
+            logger.warning("No chunk data calculated yet")
             return None
         
-        # Use current chunk's emotion data
+        # Use the chunk's emotion data
         current_emotion = {
             "happy": 0, "sad": 0, "calm": 0, "energetic": 0,
             "excited": 0, "relaxed": 0, "angry": 0, "romantic": 0, "other": 0
         }
         
-        if self.emotions:
-            last_emotion = self.emotions[-1]
+        if emotion is not None:
+            last_emotion = emotion
             current_emotion = {
                 "happy": last_emotion.happy,
                 "sad": last_emotion.sad,
@@ -382,72 +852,16 @@ Return the result as a valid JSON object with these fields:
         emotions_str = ", ".join(dominant_emotions)
         
         prompt = f"""Abstract artistic visualization of music emotions: {emotions_str}. 
-Tempo {self.tempo} BPM, {self.key} key, energy level {self.energy:.2f}.
+Tempo {tempo} BPM, {key} key, energy level {energy:.2f}.
 Flowing colors, shapes, and patterns evoking these feelings. 
 Abstract, emotional, flowing, vibrant style.
 No music notes, instruments, or musical symbols."""
         
         try:
-            print("[Image] Creating prediction with Luma Photon Flash...")
-            
-            # Create prediction
-            response = requests.post(
-                "https://api.replicate.com/v1/models/luma/photon-flash/predictions",
-                headers={
-                    "Authorization": f"Token {settings.REPLICATE_API_TOKEN}",
-                    "Content-Type": "application/json",
-                    "Prefer": "wait"
-                },
-                json={
-                    "input": {
-                        "prompt": prompt,
-                        "aspect_ratio": "1:1"
-                    }
-                }
-            )
-            response.raise_for_status()
-            prediction = response.json()
-            prediction_id = prediction["id"]
-            
-            print(f"[Image] Prediction created: {prediction_id}")
-            
-            # Poll for completion
-            max_attempts = 60
-            for attempt in range(max_attempts):
-                time.sleep(2)
-                
-                status_response = requests.get(
-                    f"https://api.replicate.com/v1/predictions/{prediction_id}",
-                    headers={"Authorization": f"Token {settings.REPLICATE_API_TOKEN}"}
-                )
-                status_response.raise_for_status()
-                status = status_response.json()
-                
-                if status["status"] == "succeeded":
-                    image_url = status["output"]
-                    print(f"[Image] Successfully generated image: {image_url}")
-                    return image_url
-                elif status["status"] == "failed":
-                    print(f"[Image] Generation failed: {status.get('error')}")
-                    return None
-                
-                print(f"[Image] Status: {status['status']}, attempt {attempt + 1}/{max_attempts}")
-            
-            print("[Image] Timeout waiting for image generation")
-            return None
-            
+            # Each Replicate request takes a rate-limit slot of its own (see replicate_client.py)
+            image_url = await self.replicate.predict(IMAGE_MODEL, {"prompt": prompt, "aspect_ratio": "1:1"})
+            logger.debug("Generated image %s", image_url)
+            return image_url
         except Exception as e:
-            print(f"[Image] Error generating image: {e}")
+            logger.warning("Image generation failed: %s", e)
             return None
-    
-if __name__ == "__main__":
-    url = "https://audio.com/bee-music-finder/audio/spotidownloadercom-happy-from-despicable-me-2-pharrell-williams"
-    processor = Process(url)
-    processor.process_waveform()
-    
-    # Calculate emotion for the last chunk
-    emotion_result = processor.calculate_emotion()
-    print(emotion_result.json(indent=2))
-
-    image_url = processor.generate_emotion_image()
-    print("Generated image URL:", image_url)
\ No newline at end of file
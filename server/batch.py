@@ -0,0 +1,231 @@
+"""
+Batch analysis: many tracks through one set of workers, to pre-compute a
+catalog instead of paying for it on first play.
+
+Tracks run BATCH_CONCURRENCY at a time on threads, each as a regular Process,
+so one track's download and decode overlap other tracks' DSP, and all of
+them send their waveform and chunk work to the shared process pool. Results
+land in the result cache like those of any stream, so the first play of a
+pre-computed track replays it. POST /api/batch streams one line per finished
+track and a throughput summary; the CLI does the same on stdout and can
+write every track's stream messages to a file:
+
+    python batch.py urls.txt --out results/          # one URL or path per line
+    python batch.py song1.mp3 song2.wav --workers 8  # local files work too
+
+Each <out>/<name>.ndjson holds the messages /api/process-audio would have
+sent for the track; <out>/summary.ndjson has the per-track lines and the summary.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import executor
+import logconfig
+import startup
+from config import settings
+from payload import WAVEFORM_FORMATS, chunk_message, waveform_message
+
+logger = logging.getLogger(__name__)
+
+
+def analyse_track(source, include_timings=False):
+    """
+    Run one track through Process: (record, messages). `messages` are its
+    stream messages, with waveform frames not yet encoded (see encode_messages);
+    `record` is the "track_complete" or "track_error" line that sums it up.
+    """
+    from cache import get_cache, get_emotion_memo, get_image_memo
+    from clients import get_clients
+    from Process import Process
+
+    start = time.perf_counter()
+    p = Process(
+        source,
+        dsp_executor=executor.get_dsp_pool(),
+        cache=get_cache(),
+        emotion_memo=get_emotion_memo(),
+        image_memo=get_image_memo(),
+        clients=get_clients(),
+    )
+    messages, error = [], None
+    timings = {}  # track stages, plus chunk stages summed over the track
+    waveform = p.load_and_calculate_waveform()
+    if not p.streaming and not waveform:
+        error = f"Could not load {source}"  # Process logged why
+    elif not p.streaming:
+        messages.append({"status": "waveform_ready", "progress": 10, "waveform": waveform})
+    for chunk_result in p.process_waveform() if error is None else ():
+        if "error" in chunk_result:
+            error = chunk_result["error"]
+            break
+        if "waveform" in chunk_result:
+            messages.append({"status": "waveform_ready", "progress": 10, "waveform": chunk_result["waveform"]})
+            continue
+        for stage, seconds in (chunk_result.get("timings") or {}).items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+        messages.append(chunk_message(chunk_result, source, include_timings))
+    timings.update(p.timings)
+
+    record = {
+        "status": "track_error" if error else "track_complete",
+        "audio_url": source,
+        "chunks": sum(1 for m in messages if m["status"] == "processing_chunk"),
+        "audio_seconds": round(_audio_seconds(p), 3),
+        "seconds": round(time.perf_counter() - start, 3),
+        "cached": p.cached_chunks is not None,
+        "timings": {stage: round(seconds, 4) for stage, seconds in timings.items()},
+    }
+    if error:
+        record["error"] = error
+        messages.append({"status": "error", "message": error})
+    else:
+        messages.append({"status": "complete", "progress": 100})
+    return record, messages
+
+
+def _audio_seconds(p):
+    if p.wave is not None:
+        return len(p.wave) / p.sr
+    # Replayed from the cache, or streamed: the last waveform frame is within a few ms of the end
+    return p.waveform_data[-1]["time"] if p.waveform_data else 0.0
+
+
+def run_batch(sources, concurrency=None, include_timings=False):
+    """
+    Analyse `sources` (URLs or local paths) `concurrency` at a time; yields
+    (index, record, messages) per track as they finish. Closing the generator
+    drops the tracks that haven't started.
+    """
+    workers = ThreadPoolExecutor(max_workers=max(1, concurrency or settings.BATCH_CONCURRENCY),
+                                 thread_name_prefix="batch")
+    try:
+        futures = {workers.submit(analyse_track, source, include_timings): i for i, source in enumerate(sources)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                record, messages = future.result()
+            except Exception as e:
+                logger.exception("Batch track %s failed", sources[index])
+                record = {"status": "track_error", "audio_url": sources[index], "error": str(e)}
+                messages = [{"status": "error", "message": str(e)}]
+            yield index, record, messages
+    finally:
+        workers.shutdown(wait=False, cancel_futures=True)
+
+
+def encode_messages(messages, fmt="json", amplitude_bits=8):
+    """`messages` from analyse_track with their waveforms in wire format `fmt`"""
+    return [
+        waveform_message(m["waveform"], m["progress"], fmt, amplitude_bits) if m["status"] == "waveform_ready" else m
+        for m in messages
+    ]
+
+
+class BatchSummary:
+    """Running totals over finished tracks, and the throughput they add up to"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.tracks = self.failed = self.cached = self.chunks = 0
+        self.audio_seconds = 0.0
+        self.stages = {}
+
+    def add(self, record):
+        self.tracks += 1
+        self.failed += record["status"] == "track_error"
+        self.cached += bool(record.get("cached"))
+        self.chunks += record.get("chunks", 0)
+        self.audio_seconds += record.get("audio_seconds", 0.0)
+        for stage, seconds in record.get("timings", {}).items():
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def summary(self):
+        seconds = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "status": "complete",
+            "tracks": self.tracks,
+            "failed": self.failed,
+            "cached": self.cached,
+            "chunks": self.chunks,
+            "audio_seconds": round(self.audio_seconds, 3),
+            "seconds": round(seconds, 3),
+            "audio_seconds_per_second": round(self.audio_seconds / seconds, 2),
+            "tracks_per_hour": round(self.tracks * 3600 / seconds, 1),
+            "stages": {stage: round(total, 3) for stage, total in sorted(self.stages.items())},  # summed over tracks
+        }
+
+
+def read_sources(args):
+    """URLs and paths from the command line; a .txt file or "-" (stdin) lists one per line"""
+    sources = []
+    for arg in args:
+        if arg == "-" or (arg.endswith(".txt") and os.path.isfile(arg)):
+            f = sys.stdin if arg == "-" else open(arg, encoding="utf-8")
+            with f:
+                sources.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+        else:
+            sources.append(arg)
+    return sources
+
+
+def output_name(source):
+    """File name for a track's messages: its own name plus a hash of the full URL or path, so names don't collide"""
+    stem = os.path.splitext(os.path.basename(urlparse(source).path or source))[0] or "track"
+    return f"{stem}-{hashlib.sha1(source.encode()).hexdigest()[:8]}.ndjson"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse many tracks with shared DSP workers")
+    parser.add_argument("sources", nargs="+", help='CDN URLs or local audio files; a .txt file or "-" lists one per line')
+    parser.add_argument("--out", help="directory for each track's messages and summary.ndjson")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="DSP processes (default: one per core)")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY, help="tracks analysed at once")
+    parser.add_argument("--waveform-format", choices=WAVEFORM_FORMATS, default="compact",
+                        help="waveform encoding in the output files")
+    args = parser.parse_args()
+
+    logconfig.configure()
+    startup.configure_numba()
+    settings.DSP_WORKERS = args.workers
+    sources = read_sources(args.sources)
+    logger.info("Analysing %d tracks, %d at a time, on %d DSP processes", len(sources), args.concurrency, args.workers)
+
+    summary = BatchSummary()
+    summary_file = None
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        summary_file = open(os.path.join(args.out, "summary.ndjson"), "w", encoding="utf-8")
+    try:
+        for index, record, messages in run_batch(sources, args.concurrency, include_timings=True):
+            summary.add(record)
+            line = {"index": index, **record}
+            if args.out:
+                line["output"] = output_name(record["audio_url"])
+                with open(os.path.join(args.out, line["output"]), "w", encoding="utf-8") as f:
+                    f.writelines(json.dumps(m) + "\n" for m in encode_messages(messages, args.waveform_format))
+                summary_file.write(json.dumps(line) + "\n")
+            print(json.dumps(line), flush=True)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; tracks already running finish in the background")
+    finally:
+        from clients import close_clients
+        total = summary.summary()
+        print(json.dumps(total), flush=True)
+        if summary_file is not None:
+            summary_file.write(json.dumps(total) + "\n")
+            summary_file.close()
+        close_clients()
+        executor.shutdown()
+    sys.exit(1 if summary.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Benchmark suite for the DSP hot paths on synthetic audio.
+
+Times Process.calculate_waveform_data, dsp.waveform_overview,
+get_chunk_energy/tempo/key and a full load + process_waveform run (both
+FEATURE_MODEs) on generated tracks, with GPT, Replicate and the download replaced by local fakes (benchmarks/fakes.py).
+For every case it reports throughput in audio-seconds per CPU-second and
+peak traced memory, and compares both against a stored baseline; the exit
+status is 1 if anything regressed by more than --tolerance.
+
+Run from the server directory:
+    python benchmarks/bench_dsp.py                  # compare with benchmarks/baseline.json
+    python benchmarks/bench_dsp.py --save-baseline  # record this machine's numbers
+    python benchmarks/bench_dsp.py --only clicks --repeat 1
+
+Baselines are only comparable on the same machine and settings.
+"""
+
+import argparse
+import collections
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("REPLICATE_API_TOKEN", "benchmark")
+
+import dsp  # noqa: E402
+import executor  # noqa: E402
+import startup  # noqa: E402
+from config import settings  # noqa: E402
+from fakes import FakeClients  # noqa: E402
+from Process import Process  # noqa: E402
+from synthetic import DEFAULT_TRACKS, SyntheticTrack  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+CHUNK_FUNCTIONS = ("get_chunk_energy", "get_chunk_tempo", "get_chunk_key")
+MEMORY_NOISE_MB = 2.0
+MIN_RUN_SECONDS = 0.5  # fast cases are called again until a timed run lasts this long
+
+
+def configure_offline():
+    """Settings for a deterministic offline run: buffered ingest and no rate limiting of the fakes"""
+    settings.INGEST_MODE = "buffered"
+    settings.API_MAX_CONCURRENCY = 1024
+    settings.OPENAI_CONCURRENCY = settings.REPLICATE_CONCURRENCY = 1024
+    settings.OPENAI_RATE = settings.REPLICATE_RATE = 1e9
+    settings.OPENAI_BURST = settings.REPLICATE_BURST = 1024
+
+
+def measure(fn, repeat):
+    """
+    (wall seconds, CPU seconds, peak traced bytes, result); times are per call,
+    the best of `repeat` runs (main warms the kernels up first, so numba's JIT
+    isn't timed even with one). A run repeats fast cases until it has taken
+    MIN_RUN_SECONDS, so a few-millisecond case isn't a single noisy sample.
+    """
+    best_wall = best_cpu = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        wall, cpu = time.perf_counter(), time.process_time()
+        calls = 0
+        while not calls or time.perf_counter() - wall < MIN_RUN_SECONDS:
+            fn()
+            calls += 1
+        best_cpu = min(best_cpu, (time.process_time() - cpu) / calls)
+        best_wall = min(best_wall, (time.perf_counter() - wall) / calls)
+    # Separate pass for memory, since tracemalloc slows allocation-heavy code down
+    # too much to time under it; after the timed runs, librosa's caches are warm
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best_wall, best_cpu, peak, result
+
+
+class TrackBench:
+    """All benchmark cases for one synthetic track"""
+
+    def __init__(self, track, clients, dsp_executor=None):
+        self.track = track
+        self.url = f"https://benchmark.invalid/{track.name}.wav"
+        self.clients = clients
+        self.dsp_executor = dsp_executor
+        self.wave = track.render()
+        clients.http.files[self.url] = track.wav_bytes()
+        self.analysis_wave, self.analysis_sr = dsp.resample(
+            self.wave, track.sr, settings.ANALYSIS_SR, settings.RESAMPLE_QUALITY
+        )
+
+    def process(self):
+        return Process(self.url, dsp_executor=self.dsp_executor, clients=self.clients)
+
+    def cases(self):
+        """(name, fn) pairs; every fn covers the whole track"""
+        yield "calculate_waveform_data", lambda: self.process().calculate_waveform_data(self.wave, self.track.sr)
+        yield "waveform_overview", lambda: dsp.waveform_overview(
+            self.wave, self.track.sr, settings.WAVEFORM_OVERVIEW_FRAMES, settings.WAVEFORM_OVERVIEW_SR
+        )
+        for name in CHUNK_FUNCTIONS:
+            yield name, lambda name=name: self.each_chunk(name)
+        for mode in ("track", "chunk"):
+            yield f"process_waveform[{mode}]", lambda mode=mode: self.full_run(mode)
+        yield "process_waveform[adaptive]", lambda: self.full_run("track", chunking="adaptive")
+
+    def each_chunk(self, name):
+        p = self.process()
+        p.wave, p.sr = self.analysis_wave, self.analysis_sr
+        samples_per_chunk, hop_samples = p.chunk()
+        values = []
+        for start in range(0, len(p.wave) - samples_per_chunk, hop_samples):
+            p.chunk1 = p.wave[start:start + samples_per_chunk]
+            values.append(getattr(p, name)())
+        return values
+
+    def full_run(self, mode, chunking="fixed"):
+        settings.FEATURE_MODE = mode
+        settings.CHUNKING = chunking
+        p = self.process()
+        if not p.load_and_calculate_waveform():
+            raise RuntimeError(f"Loading {self.url} failed")
+        results = list(p.process_waveform())
+        errors = [r["error"] for r in results if "error" in r]
+        if errors:
+            raise RuntimeError(errors[0])
+        return results
+
+
+def describe(case, result, track):
+    """What the analysis found, next to what the generator put in"""
+    found = []
+    if case.startswith("process_waveform"):
+        found.append(f"{len(result)} chunks")
+    if case == "get_chunk_tempo" or case.startswith("process_waveform"):
+        tempos = result if case == "get_chunk_tempo" else [r["tempo"] for r in result]
+        if track.bpm:
+            found.append(f"tempo {np.median(tempos):.1f} (expected {track.bpm:g})")
+    if case == "get_chunk_key" or case.startswith("process_waveform"):
+        keys = result if case == "get_chunk_key" else [r["key"] for r in result]
+        if track.key:
+            key, count = collections.Counter(keys).most_common(1)[0]
+            found.append(f"key {key} in {count}/{len(keys)} chunks (expected {track.key})")
+    return ", ".join(found)
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing changes against `baseline`, and whether any case regressed"""
+    lines, regressed = [], False
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        speed = current["throughput"] / previous["throughput"] - 1
+        memory = current["peak_mb"] / max(previous["peak_mb"], 1e-6) - 1
+        flags = []
+        if speed < -tolerance:
+            flags.append("SLOWER")
+        # Small absolute changes are allocator noise (and first-use caches), not regressions
+        if memory > tolerance and current["peak_mb"] - previous["peak_mb"] > MEMORY_NOISE_MB:
+            flags.append("MORE MEMORY")
+        regressed = regressed or bool(flags)
+        lines.append(f"{key:<58} throughput {speed:+7.1%}  peak memory {memory:+7.1%}  {' '.join(flags)}")
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case; the best is reported")
+    parser.add_argument("--only", default="", help="run only cases whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="10 s versions of the tracks")
+    parser.add_argument("--pool", action="store_true",
+                        help="run DSP on the process pool (CPU time then excludes the workers)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run's results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="fractional throughput loss or memory growth counted as a regression")
+    parser.add_argument("--openai-latency", type=float, default=0.0, help="seconds per fake GPT call")
+    parser.add_argument("--image-latency", type=float, default=0.0, help="seconds per fake image")
+    args = parser.parse_args()
+
+    configure_offline()
+    tracks = DEFAULT_TRACKS
+    if args.quick:
+        tracks = [SyntheticTrack(t.kind, 10, t.sr, t.bpm, t.key, t.seed) for t in tracks]
+    clients = FakeClients({}, args.openai_latency, args.image_latency)
+    pool = executor.get_dsp_pool() if args.pool else None
+    print(f"Warmed up in {startup.warm_up():.2f}s")
+    if pool is not None:
+        for future in [pool.submit(startup.warm_up) for _ in range(settings.DSP_WORKERS)]:
+            future.result()
+
+    results = {}
+    print(f"{'case':<58} {'wall s':>8} {'cpu s':>8} {'audio s/cpu s':>14} {'peak MB':>8}")
+    try:
+        for track in tracks:
+            bench = TrackBench(track, clients, pool)
+            for case, fn in bench.cases():
+                key = f"{case}/{track.name}"
+                if args.only not in key:
+                    continue
+                wall, cpu, peak, result = measure(fn, args.repeat)
+                results[key] = {
+                    "wall": round(wall, 4),
+                    "cpu": round(cpu, 4),
+                    "audio_seconds": track.seconds,
+                    "throughput": round(track.seconds / max(cpu, 1e-9), 2),
+                    "peak_mb": round(peak / 2 ** 20, 2),
+                }
+                r = results[key]
+                print(f"{key:<58} {wall:8.3f} {cpu:8.3f} {r['throughput']:14.1f} {r['peak_mb']:8.1f}  "
+                      f"{describe(case, result, track)}", flush=True)
+    finally:
+        clients.close()
+        executor.shutdown()
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "machine": f"{platform.machine()} {platform.processor() or platform.system()}, "
+                           f"{os.cpu_count()} CPUs, Python {platform.python_version()}",
+                "settings": {"ANALYSIS_SR": settings.ANALYSIS_SR, "RESAMPLE_QUALITY": settings.RESAMPLE_QUALITY,
+                             "FEATURE_BLOCK_SECONDS": settings.FEATURE_BLOCK_SECONDS, "pool": args.pool},
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    lines, regressed = compare(results, baseline["results"], args.tolerance)
+    print(f"\nAgainst baseline ({baseline.get('machine', 'unknown machine')}):")
+    print("\n".join(lines) or "no cases in common")
+    if regressed:
+        sys.exit(f"Regression beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Local stand-ins for the pooled API clients (see clients.Clients), so a full
+Process run works offline: downloads come from memory, GPT returns a fixed
+emotion mix and Replicate a fake URL, each after an optional delay.
+"""
+
+import asyncio
+import itertools
+import re
+import time
+from types import SimpleNamespace
+
+import executor
+from Process import EmotionOutput
+
+FIXED_EMOTION = dict(
+    happy=40, sad=10, calm=15, energetic=15, excited=5, relaxed=5, angry=5, romantic=5, other=0,
+    reasoning="benchmark stub",
+)
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    """requests.Session stand-in serving `files` ({url: bytes})"""
+
+    def __init__(self, files):
+        self.files = files
+
+    def get(self, url, timeout=None, **kwargs):
+        return FakeResponse(self.files[url])
+
+    def close(self):
+        pass
+
+
+class FakeOpenAI:
+    """Answers `beta.chat.completions.parse` for EmotionOutput and batched EmotionBatchOutput"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(parse=self.parse)))
+
+    def parse(self, model, messages, response_format):
+        self.calls += 1
+        time.sleep(self.latency)
+        if "results" in response_format.model_fields:
+            count = len(re.findall(r"^\d+\. Energy:", messages[-1]["content"], re.MULTILINE))
+            parsed = response_format(results=[EmotionOutput(**FIXED_EMOTION) for _ in range(count)])
+        else:
+            parsed = response_format(**FIXED_EMOTION)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(parsed=parsed))])
+
+    def close(self):
+        pass
+
+
+class FakeReplicate:
+    """replicate_client.ReplicateClient stand-in"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.loop = None  # the event loop predictions run on, once there's been one
+        self._ids = itertools.count(1)
+
+    async def predict(self, model, model_input):
+        self.loop = asyncio.get_running_loop()
+        await asyncio.sleep(self.latency)
+        return f"https://replicate.invalid/benchmark/{next(self._ids)}.webp"
+
+    def notify(self, prediction_id):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class FakeClients:
+    def __init__(self, files, openai_latency=0.0, image_latency=0.0):
+        self.openai = FakeOpenAI(openai_latency)
+        self.replicate = FakeReplicate(image_latency)
+        self.http = FakeSession(files)
+
+    def close(self):
+        # Same calls as clients.Clients.close, so the fakes can't drift from the real interface
+        self.openai.close()
+        if self.replicate.loop is not None:
+            executor.run_async(self.replicate.aclose(), timeout=5)
+        self.http.close()
@@ -0,0 +1,98 @@
+"""
+Synthetic test tracks with known properties, so benchmarks need no downloads.
+
+Every track is generated from a fixed seed, so runs are comparable across
+machines and commits. `bpm` and `key` are what the generator put in; they are
+reported next to what the analysis found.
+"""
+
+import io
+from dataclasses import dataclass
+
+import numpy as np
+import soundfile as sf
+
+NOTES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+
+
+@dataclass(frozen=True)
+class SyntheticTrack:
+    kind: str  # tone, clicks, noise or mix
+    seconds: float
+    sr: int
+    bpm: float = None
+    key: str = None
+    seed: int = 0
+
+    @property
+    def name(self):
+        label = self.kind
+        if self.bpm:
+            label += f"-{self.bpm:g}bpm"
+        if self.key:
+            label += "-" + self.key.replace(" ", "")
+        return f"{label}-{self.seconds:g}s@{self.sr // 1000}k"
+
+    def render(self):
+        """float32 mono samples in [-1, 1]"""
+        rng = np.random.default_rng(self.seed)
+        n = int(self.seconds * self.sr)
+        t = np.arange(n, dtype=np.float64) / self.sr
+        y = np.zeros(n)
+        if self.key:
+            y += 0.3 * chord(t, self.key)
+        if self.bpm:
+            y += 0.6 * clicks(n, self.sr, self.bpm)
+        if self.kind in ("noise", "mix"):
+            y += (0.5 if self.kind == "noise" else 0.1) * pink_noise(n, rng)
+        # Slow swell so energy and color vary along the track
+        y *= 0.6 + 0.4 * np.sin(2 * np.pi * t / 20.0) ** 2
+        peak = np.abs(y).max() or 1.0
+        return (0.9 * y / peak).astype(np.float32)
+
+    def wav_bytes(self):
+        buffer = io.BytesIO()
+        sf.write(buffer, self.render(), self.sr, format="WAV", subtype="PCM_16")
+        return buffer.getvalue()
+
+
+def chord(t, key):
+    """Root-position triad of `key` ("C major", "A minor") with a few harmonics per note"""
+    root, mode = key.split()
+    base = 48 + NOTES.index(root)  # MIDI note in the octave below middle C
+    intervals = (0, 4, 7, 12) if mode == "major" else (0, 3, 7, 12)
+    y = np.zeros_like(t)
+    for interval in intervals:
+        freq = 440.0 * 2 ** ((base + interval - 69) / 12)
+        for harmonic, gain in ((1, 1.0), (2, 0.5), (3, 0.25)):
+            y += gain * np.sin(2 * np.pi * freq * harmonic * t)
+    return y / len(intervals)
+
+
+def clicks(n, sr, bpm):
+    """Decaying noise bursts on every beat, the downbeat of each bar accented"""
+    y = np.zeros(n)
+    length = int(0.03 * sr)
+    burst = np.random.default_rng(1).standard_normal(length) * np.exp(-np.linspace(0, 8, length))
+    period = 60.0 / bpm * sr
+    for beat, start in enumerate(np.arange(0, n - length, period).astype(int)):
+        y[start:start + length] += burst * (1.0 if beat % 4 == 0 else 0.6)
+    return y
+
+
+def pink_noise(n, rng):
+    """Noise with a 1/f spectrum, shaped in the frequency domain"""
+    spectrum = np.fft.rfft(rng.standard_normal(n))
+    spectrum /= np.sqrt(np.maximum(np.arange(len(spectrum)), 1))
+    y = np.fft.irfft(spectrum, n)
+    return y / (np.abs(y).max() or 1.0)
+
+
+# Short tracks at the three common rates plus a longer one, so both per-chunk
+# overhead and per-track scaling show up
+DEFAULT_TRACKS = (
+    SyntheticTrack("tone", 30, 44100, key="C major"),
+    SyntheticTrack("clicks", 30, 44100, bpm=120, key="A minor"),
+    SyntheticTrack("noise", 30, 22050),
+    SyntheticTrack("mix", 120, 48000, bpm=128, key="D major"),
+)
@@ -0,0 +1,204 @@
+"""
+Content-addressed result cache.
+
+Values are JSON-serialisable results (waveform frames, per-chunk analysis)
+stored under keys derived from the audio content hash and the analysis
+parameters. A small in-memory LRU sits in front of an SQLite file; both drop
+entries older than the TTL, and the file is trimmed to a byte budget by
+least-recent access.
+
+The same class backs the emotion memo (see get_emotion_memo), whose keys are
+quantized chunk features rather than audio content, so similar chunks of any
+track share one GPT result, and the image memo (see get_image_memo), which
+does the same for generated images.
+
+The SQLite file is shared by the web app and the job workers, so it runs in
+WAL mode with a busy timeout, and a write that still fails (locked, disk
+full) is logged and dropped: the value stays in memory and the stream goes on.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+_emotion_memo = None
+_image_memo = None
+_cache_lock = threading.Lock()
+
+
+def make_key(*parts):
+    """Stable cache key for any JSON-serialisable parts."""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def content_hash(data):
+    """SHA-256 of raw bytes or of a NumPy array's buffer."""
+    return hashlib.sha256(memoryview(data).cast("B")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path=None, memory_entries=256, max_bytes=512 * 1024 * 1024, ttl=7 * 24 * 3600,
+                 busy_timeout=5.0):
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._memory = collections.OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+        if path:
+            # busy_timeout: seconds to wait for another process's write before giving up on this one
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=busy_timeout)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+            self._db.commit()
+
+    def get(self, key):
+        """Cached value for `key`, or None on a miss or an expired entry."""
+        value = self._get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT value, stored_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._write(self._delete, key)
+                return None
+            self._write(self._touch, key, now)
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        blob = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self._remember(key, now, value)
+            if self._db is None:
+                return
+            self._write(self._store, key, blob, now)
+
+    def _write(self, statements, *args):
+        """Run `statements` (a method taking *args) and commit; on failure log, roll back and carry on."""
+        try:
+            statements(*args)
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning("Result cache write failed, keeping the entry in memory only: %s", e)
+            self._db.rollback()
+
+    def _store(self, key, blob, now):
+        self._db.execute(
+            "INSERT OR REPLACE INTO results (key, value, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, blob, len(blob), now, now),
+        )
+        self._evict(now)
+
+    def _delete(self, key):
+        self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def _touch(self, key, now):
+        self._db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+
+    def _remember(self, key, stored_at, value):
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        """Drop expired rows, then least recently used rows until under max_bytes."""
+        self._db.execute("DELETE FROM results WHERE stored_at < ?", (now - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY accessed_at").fetchall():
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+def get_cache():
+    """Application-wide ResultCache, or None when caching is disabled."""
+    global _cache
+    if not settings.CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                path=settings.CACHE_PATH or None,
+                memory_entries=settings.CACHE_MEMORY_ENTRIES,
+                max_bytes=settings.CACHE_MAX_BYTES,
+                ttl=settings.CACHE_TTL_SECONDS,
+            )
+        return _cache
+
+
+def get_emotion_memo():
+    """Application-wide ResultCache for quantized emotion results, or None when disabled."""
+    global _emotion_memo
+    if not settings.EMOTION_MEMO_ENABLED:
+        return None
+    with _cache_lock:
+        if _emotion_memo is None:
+            _emotion_memo = ResultCache(
+                path=settings.EMOTION_MEMO_PATH or None,
+                memory_entries=settings.EMOTION_MEMO_ENTRIES,
+                max_bytes=settings.CACHE_MAX_BYTES,
+                ttl=settings.EMOTION_MEMO_TTL_SECONDS,
+            )
+        return _emotion_memo
+
+
+def get_image_memo():
+    """Application-wide ResultCache of image URLs by emotion signature, or None when disabled."""
+    global _image_memo
+    if not settings.IMAGE_DEDUP_ENABLED:
+        return None
+    with _cache_lock:
+        if _image_memo is None:
+            # Memory only: entries live no longer than the Replicate URLs they hold
+            _image_memo = ResultCache(
+                memory_entries=settings.IMAGE_DEDUP_ENTRIES,
+                ttl=settings.IMAGE_URL_TTL_SECONDS,
+            )
+        return _image_memo
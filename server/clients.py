@@ -0,0 +1,98 @@
+"""
+Application-scoped API clients.
+
+One registry per process holds the OpenAI client, the Replicate client and a
+pooled `requests` session for the CDN (downloads and HEAD checks), so
+connections and TLS sessions are reused across chunks and requests instead
+of being set up per call. The FastAPI lifespan creates it at startup and
+closes it at shutdown; every Process receives it.
+"""
+
+import threading
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import executor
+from config import settings
+from ratelimit import get_limits
+from replicate_client import ReplicateClient
+
+_clients = None
+_clients_lock = threading.Lock()
+
+
+class Clients:
+    def __init__(self):
+        # The SDK's imports take about a second, so they wait until clients are built
+        from openai import OpenAI
+
+        self.openai = OpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            max_retries=settings.OPENAI_MAX_RETRIES,  # the SDK backs off exponentially, honouring Retry-After
+            timeout=settings.OPENAI_TIMEOUT,
+            http_client=httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=settings.OPENAI_POOL_SIZE,
+                    max_keepalive_connections=settings.OPENAI_POOL_SIZE,
+                    keepalive_expiry=settings.HTTP_KEEPALIVE_SECONDS,
+                ),
+            ),
+        )
+        self.replicate = ReplicateClient(
+            settings.REPLICATE_API_TOKEN,
+            base_url=settings.REPLICATE_API_URL,
+            max_concurrency=settings.REPLICATE_CONCURRENCY,
+            wait_seconds=settings.REPLICATE_WAIT_SECONDS,
+            poll_initial=settings.REPLICATE_POLL_INITIAL,
+            poll_max=settings.REPLICATE_POLL_MAX,
+            timeout=settings.IMAGE_TIMEOUT,
+            webhook_url=settings.REPLICATE_WEBHOOK_URL,
+            retries=settings.HTTP_RETRIES,
+            keepalive=settings.HTTP_KEEPALIVE_SECONDS,
+            limit=get_limits()["replicate"],
+        )
+        self.http = _pooled_session()
+
+    def close(self):
+        self.openai.close()
+        if self.replicate.loop is not None:
+            executor.run_async(self.replicate.aclose(), timeout=5)
+        self.http.close()
+
+
+def _pooled_session():
+    """requests.Session with a shared connection pool and retries for idempotent requests"""
+    retry = Retry(
+        total=settings.HTTP_RETRIES,
+        backoff_factor=settings.HTTP_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=settings.HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_clients() -> Clients:
+    """The application's Clients, created on first use (normally by the FastAPI lifespan)."""
+    global _clients
+    with _clients_lock:
+        if _clients is None:
+            _clients = Clients()
+        return _clients
+
+
+def close_clients():
+    """Close every pooled connection. Called from the FastAPI lifespan before executor.shutdown."""
+    global _clients
+    with _clients_lock:
+        clients, _clients = _clients, None
+    if clients is not None:
+        clients.close()
@@ -3,6 +3,8 @@ FastAPI Environment Configuration
 Manages environment variables using Pydantic Settings
 """
 
+import os
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -14,6 +16,128 @@ class Settings(BaseSettings):
     
     OPENAI_API_KEY: str
     REPLICATE_API_TOKEN: str
+
+    # Execution layer (see executor.py)
+    DSP_WORKERS: int = max(1, (os.cpu_count() or 2) - 1)  # librosa process pool size
+    IO_WORKERS: int = 64  # threads for downloads and OpenAI calls
+    STREAM_QUEUE_SIZE: int = 4  # chunk results buffered per stream before the producer waits
+
+    # Per-chunk pipeline (see pipeline.py); limits are per stream
+    DSP_CONCURRENCY: int = 2  # chunks in librosa analysis at once
+    EMOTION_CONCURRENCY: int = 4  # GPT calls in flight
+    IMAGE_CONCURRENCY: int = 4  # chunks starting image generations at once (REPLICATE_CONCURRENCY caps the API calls)
+    PIPELINE_WINDOW: int = 8  # chunks in flight across all stages
+    EMOTION_BATCH_SIZE: int = 1  # chunks per GPT request; 1 sends one request per chunk
+    EMOTION_BATCH_LATENCY: float = 1.0  # seconds a partial batch waits for more chunks
+
+    # DSP
+    ANALYSIS_SR: int = 22050  # rate for energy/tempo/key analysis; 0 keeps the native rate
+    WAVEFORM_SR: int = 0  # rate for the waveform display; 0 keeps the native rate
+    RESAMPLE_QUALITY: str = "HQ"  # soxr quality: QQ, LQ, MQ, HQ or VHQ
+    FEATURE_MODE: str = "track"  # "track": STFT/HPSS/chroma once per track, sliced per chunk; "chunk": per-chunk librosa
+    FEATURE_BLOCK_SECONDS: float = 60.0  # track-mode features are computed in blocks of this length in parallel
+    KEY_CHROMA: str = "cqt_fast"  # key detection chroma: "cqt" (36 bins/octave), "cqt_fast" (12 bins/octave) or "stft" (reuses HPSS)
+    TEMPO_PRIOR_OCTAVES: float = 0.5  # track mode: pull chunk tempos towards the track's tempo (log-normal width); 0 turns it off
+    KEY_CONFIDENCE: bool = False  # add key_confidence (lead of the best key's correlation over the runner-up) to chunks
+
+    # Progressive waveform (requests with progressive_waveform; see dsp.waveform_overview)
+    WAVEFORM_OVERVIEW_FRAMES: int = 400  # frames in the coarse overview sent right after decode
+    WAVEFORM_OVERVIEW_SR: int = 4000  # the overview is computed on the track decimated to this rate
+
+    # Chunking (see dsp.novelty_segments)
+    CHUNKING: str = "fixed"  # "fixed": 7 s windows every 6 s; "adaptive": one segment per stretch of similar music (buffered ingest)
+    SEGMENT_MIN_SECONDS: float = 7.0
+    SEGMENT_MAX_SECONDS: float = 60.0
+    SEGMENT_BUDGET: int = 24  # most segments per track, 0 for no limit; SEGMENT_MAX_SECONDS stretches to fit
+    SEGMENT_NOVELTY: float = 1.0  # change that starts a segment: 1.0 is about 6 dB of loudness or half an octave of brightness
+
+    # Shared API clients (see clients.py)
+    OPENAI_POOL_SIZE: int = 32  # keep-alive connections to OpenAI
+    OPENAI_TIMEOUT: float = 60.0
+    OPENAI_MAX_RETRIES: int = 0  # SDK-level retries; ratelimit.py already retries with jitter and Retry-After
+    HTTP_POOL_SIZE: int = 32  # keep-alive connections per host for audio downloads
+    HTTP_RETRIES: int = 3  # retries for downloads/HEAD (also 429/5xx) and Replicate reconnects
+    HTTP_BACKOFF: float = 0.5  # seconds before the first download retry, doubled after each
+    HTTP_KEEPALIVE_SECONDS: float = 30.0  # idle time before a pooled connection is dropped
+
+    # Rate limits for external APIs (see ratelimit.py); shared by every stream in the process
+    API_MAX_CONCURRENCY: int = 16  # OpenAI and Replicate calls in flight together
+    OPENAI_CONCURRENCY: int = 8
+    OPENAI_RATE: float = 8.0  # requests per second, refilling a bucket of OPENAI_BURST
+    OPENAI_BURST: int = 16
+    REPLICATE_RATE: float = 5.0  # predictions created per second, refilling a bucket of REPLICATE_BURST
+    REPLICATE_BURST: int = 10
+    API_RETRY_ATTEMPTS: int = 5  # tries per call on 429, 5xx and dropped connections
+    API_RETRY_BASE: float = 1.0  # seconds; backoff is exponential with full jitter unless Retry-After says otherwise
+    API_RETRY_MAX: float = 30.0
+    API_WAIT_TIMEOUT: float = 120.0  # longest a call waits for a slot before giving up
+    API_MAX_WAITING: int = 64  # calls queued for one provider before new streams are turned away
+    MAX_ACTIVE_STREAMS: int = 32  # /api/process-audio streams at once; more get 503 with Retry-After
+
+    # Image generation (see replicate_client.py)
+    REPLICATE_API_URL: str = "https://api.replicate.com/v1"  # point at a local fake for testing
+    REPLICATE_CONCURRENCY: int = 8  # predictions in flight across all streams
+    REPLICATE_WAIT_SECONDS: int = 60  # Prefer: wait; how long Replicate may hold the create request (1-60)
+    REPLICATE_POLL_INITIAL: float = 0.5  # first poll delay, doubled each time up to REPLICATE_POLL_MAX
+    REPLICATE_POLL_MAX: float = 5.0
+    REPLICATE_WEBHOOK_URL: str = ""  # public URL of /api/replicate-webhook; "" relies on polling alone
+    IMAGE_TIMEOUT: float = 120.0  # seconds per image before giving up on it
+
+    # Ingest (see ingest.py)
+    INGEST_MODE: str = "buffered"  # "buffered": download, then decode; "streaming": decode while downloading (chunk features only)
+    DOWNLOAD_TIMEOUT: float = 30.0  # seconds to connect / between received bytes
+    DOWNLOAD_BLOCK_BYTES: int = 64 * 1024
+    INGEST_PENDING_CHUNKS: int = 4  # decoded chunks waiting for the pipeline before decoding pauses
+
+    # Batch analysis (see batch.py)
+    BATCH_CONCURRENCY: int = os.cpu_count() or 2  # tracks at once; downloads and decodes overlap other tracks' DSP
+    BATCH_MAX_TRACKS: int = 100  # most URLs per POST /api/batch; the CLI has no limit
+
+    # Job queue (see jobs.py)
+    JOBS_PATH: str = "jobs.sqlite3"  # shared by the web app and every worker
+    JOB_WORKERS: int = 1  # worker processes the web app starts; 0 when they run separately (python jobs.py)
+    JOB_QUEUE_LIMIT: int = 32  # queued jobs before POST /api/jobs answers 503
+    JOB_POLL_SECONDS: float = 0.5  # how often idle workers and stream readers look for news
+    JOB_STALE_SECONDS: float = 120.0  # a running job without a heartbeat for this long is picked up again
+    JOB_TTL_SECONDS: int = 24 * 3600  # finished jobs and their events are kept this long
+
+    # Result cache (see cache.py); CACHE_PATH="" keeps it in memory only
+    CACHE_ENABLED: bool = True
+    CACHE_PATH: str = "cache.sqlite3"
+    CACHE_MEMORY_ENTRIES: int = 512
+    CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    IMAGE_URL_TTL_SECONDS: int = 3600  # Replicate output URLs expire; older cached images are regenerated
+
+    # Emotion memo (see cache.py): GPT results keyed on quantized (energy, tempo, key), shared across tracks
+    EMOTION_MEMO_ENABLED: bool = True
+    EMOTION_MEMO_PATH: str = ""  # SQLite file to keep results across restarts; "" is memory only
+    EMOTION_MEMO_ENTRIES: int = 4096
+    EMOTION_MEMO_TTL_SECONDS: int = 30 * 24 * 3600
+    EMOTION_MEMO_ENERGY_STEP: float = 0.05
+    EMOTION_MEMO_TEMPO_STEP: float = 4.0  # BPM
+
+    # Local emotion model (see emotion_model.py)
+    EMOTION_MODE: str = "gpt"  # "gpt"; "hybrid": local model, GPT below EMOTION_LOCAL_CONFIDENCE; "local": never GPT
+    EMOTION_MODEL_PATH: str = ""  # trained by `python emotion_model.py`; needed unless EMOTION_MODE is "gpt"
+    EMOTION_LOCAL_CONFIDENCE: float = 0.7  # hybrid: least confidence (0-1) at which the local answer stands
+    EMOTION_LOG_PATH: str = ""  # append every GPT answer with its features here (JSON lines), to train on
+
+    # Image dedup (see cache.py): chunks with the same coarse signature share one image while its URL is valid
+    IMAGE_DEDUP_ENABLED: bool = True
+    IMAGE_DEDUP_ENTRIES: int = 1024
+    IMAGE_DEDUP_TOP_K: int = 3  # strongest emotions in the signature
+    IMAGE_DEDUP_EMOTION_STEP: float = 10.0  # percentage points per bucket; larger reuses more
+    IMAGE_DEDUP_TEMPO_STEP: float = 10.0  # BPM
+    IMAGE_DEDUP_ENERGY_STEP: float = 0.1
+
+    # Startup (see startup.py)
+    WARMUP: bool = True  # run every DSP kernel once at startup (web process, DSP pool, job workers) before serving
+    NUMBA_CACHE_DIR: str = ""  # persistent cache for numba's compiled kernels; "" keeps numba's default (next to librosa)
+
+    # Logging and metrics (see logconfig.py, metrics.py)
+    LOG_LEVEL: str = "INFO"  # DEBUG adds per-chunk detail
+    LOG_FORMAT: str = "text"  # "text" or "json" (one object per line, for log shippers)
     
     model_config = SettingsConfigDict(
         env_file=".env",
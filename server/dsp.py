@@ -0,0 +1,627 @@
+"""
+Pure DSP functions used by Process.
+
+Everything here takes plain NumPy arrays and returns plain Python/NumPy
+values, so the functions can be shipped to a process pool without dragging
+the OpenAI client or the full track along with them.
+"""
+
+import functools
+import logging
+import time
+
+import librosa
+import numpy as np
+import scipy.signal
+
+logger = logging.getLogger(__name__)
+
+
+def resample(y, sr, target_sr, quality="HQ"):
+    """
+    Resample to `target_sr` with soxr at the given quality (QQ, LQ, MQ, HQ, VHQ),
+    keeping float32. A falsy `target_sr` keeps the native rate.
+    Returns (y, sr).
+    """
+    if not target_sr or target_sr == sr:
+        return y, sr
+    y = librosa.resample(y, orig_sr=sr, target_sr=target_sr, res_type=f"soxr_{quality.lower()}")
+    return y.astype(np.float32, copy=False), target_sr
+
+
+def brighten_color(color, factor):
+    """Brighten an RGB color array (values 0-1). Factor >1 increases brightness."""
+    brightened = color * factor
+    return np.clip(brightened, 0, 1)
+
+
+HAPPY = np.array([255, 230, 0])      # bright yellow
+SAD = np.array([0, 0, 200])          # bright blue
+CALM = np.array([0, 255, 150])       # bright teal
+ANGRY = np.array([255, 0, 0])        # bright red
+
+
+def emotion_to_color(loudness, brightness):
+    """
+    Map arousal (energy) and valence (brightness) to an RGB color (Brady's logic).
+    Works on scalars (returns shape (3,)) or on arrays of frames (returns shape (n, 3)).
+    """
+    loudness = np.asarray(loudness)[..., np.newaxis]
+    brightness = np.asarray(brightness)[..., np.newaxis]
+    happy, sad, calm, angry = HAPPY, SAD, CALM, ANGRY
+
+    color = (
+        brightness * (loudness * happy + (1 - loudness) * calm) +
+        (1 - brightness) * (loudness * angry + (1 - loudness) * sad)
+    )
+
+    # Apply brightening (fixing Brady's bug where result wasn't used)
+    color = brighten_color(color / 255, factor=2)
+
+    return color  # Returns normalized RGB (0-1)
+
+
+WAVEFORM_HOP = 1024
+WAVEFORM_FRAME = 2048
+
+
+def waveform_analysis(wave, sr):
+    """
+    Calculate frame-level RMS and emotion colors for visualization (Brady's logic).
+    Returns (frames, rms, spectral centroid); the raw curves feed novelty_segments.
+    """
+    # Use Brady's parameters
+    hop_length = WAVEFORM_HOP
+    frame_length = WAVEFORM_FRAME
+
+    # RMS (energy/arousal)
+    rms = librosa.feature.rms(y=wave, frame_length=frame_length, hop_length=hop_length)[0]
+
+    # Spectral centroid (brightness/valence)
+    spec_centroid = librosa.feature.spectral_centroid(y=wave, sr=sr, hop_length=hop_length)[0]
+
+    return frames_from_features(rms, spec_centroid, len(wave) / sr), rms, spec_centroid
+
+
+def waveform_frames(wave, sr):
+    """Frames of waveform_analysis only"""
+    return waveform_analysis(wave, sr)[0]
+
+
+def frames_from_features(rms, spec_centroid, total_seconds, block_size=30, downsample_factor=3):
+    """
+    Turn per-frame RMS and spectral centroid into colored, downsampled waveform
+    frames; the defaults are the detailed waveform's
+    """
+    rms_norm = (rms - rms.min()) / (rms.max() - rms.min())
+    centroid_norm = (spec_centroid - spec_centroid.min()) / (spec_centroid.max() - spec_centroid.min())
+
+    # Calculate times for each frame
+    rms_times = np.linspace(0, total_seconds, len(rms))
+
+    # Apply block_size for discrete sections (Brady's approach): every frame takes
+    # the color of its block's first frame, so only those frames need a color
+    num_frames = len(rms)
+    block_colors = emotion_to_color(rms_norm[::block_size], centroid_norm[::block_size])
+
+    # Convert RGB (0-1) to hex, once per block
+    rgb = (block_colors * 255).astype(int)
+    packed = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    block_hex = [f"#{value:06x}" for value in packed.tolist()]
+
+    # Build waveform frames (downsample to reduce JSON size)
+    # Take every 3rd frame for high detail (buffering handles large payloads)
+    kept = np.arange(0, num_frames, downsample_factor)
+    frames = [
+        {"time": time, "amplitude": amplitude, "color": block_hex[block]}
+        for time, amplitude, block in zip(
+            rms_times[kept].tolist(), rms[kept].tolist(), (kept // block_size).tolist()
+        )
+    ]
+
+    logger.debug("Waveform downsampled from %d to %d frames", num_frames, len(frames))
+    return frames
+
+
+OVERVIEW_SR = 4000
+OVERVIEW_FFT = 512
+
+
+def waveform_overview(wave, sr, frames=400, overview_sr=OVERVIEW_SR):
+    """
+    About `frames` coarse waveform frames for the whole track, one color each,
+    computed on the track decimated to `overview_sr`: a few milliseconds for a
+    song, so clients can draw something before the detailed frames are ready.
+    Colors are normalized over the overview alone and only roughly match the
+    detailed ones.
+    """
+    y, y_sr = resample(wave, sr, min(sr, overview_sr), "QQ")
+    hop_length = max(1, len(y) // max(1, frames))
+    rms = librosa.feature.rms(y=y, frame_length=2 * hop_length, hop_length=hop_length)[0]
+    spec_centroid = librosa.feature.spectral_centroid(y=y, sr=y_sr, n_fft=OVERVIEW_FFT, hop_length=hop_length)[0]
+    return frames_from_features(rms, spec_centroid, len(wave) / sr, block_size=1, downsample_factor=1)
+
+
+class WaveformAccumulator:
+    """
+    Builds the same frames as waveform_frames from audio that arrives in blocks.
+
+    Only the per-frame RMS and centroid are kept, plus less than one frame of
+    samples between blocks, so memory does not grow with the raw audio.
+    Zero padding at both ends reproduces librosa's centered framing.
+    """
+
+    def __init__(self, sr):
+        self.sr = sr
+        self.samples = 0
+        self._pending = np.zeros(WAVEFORM_FRAME // 2, dtype=np.float32)
+        self._rms = []
+        self._centroid = []
+
+    def add(self, block):
+        self.samples += len(block)
+        self._pending = np.concatenate([self._pending, block.astype(np.float32, copy=False)])
+        self._consume()
+
+    def _consume(self):
+        if len(self._pending) < WAVEFORM_FRAME:
+            return
+        count = 1 + (len(self._pending) - WAVEFORM_FRAME) // WAVEFORM_HOP
+        y = self._pending[:(count - 1) * WAVEFORM_HOP + WAVEFORM_FRAME]
+        self._rms.append(librosa.feature.rms(
+            y=y, frame_length=WAVEFORM_FRAME, hop_length=WAVEFORM_HOP, center=False
+        )[0])
+        self._centroid.append(librosa.feature.spectral_centroid(
+            y=y, sr=self.sr, n_fft=WAVEFORM_FRAME, hop_length=WAVEFORM_HOP, center=False
+        )[0])
+        self._pending = self._pending[count * WAVEFORM_HOP:]
+
+    def finish(self):
+        """Frames for everything added so far; call once after the last block"""
+        self._pending = np.concatenate([self._pending, np.zeros(WAVEFORM_FRAME // 2, dtype=np.float32)])
+        self._consume()
+        return frames_from_features(
+            np.concatenate(self._rms), np.concatenate(self._centroid), self.samples / self.sr
+        )
+
+
+# Novelty units: this much change in loudness or brightness counts as 1
+NOVELTY_DB = 6.0
+NOVELTY_OCTAVES = 0.5
+
+
+def novelty_segments(rms, spec_centroid, total_seconds, min_seconds, max_seconds, budget=0, threshold=1.0):
+    """
+    Split a track into [(start, end)] seconds where its sound changes, from
+    the per-frame RMS and spectral centroid of waveform_analysis.
+
+    Novelty at each frame is the distance between the mean loudness (dB) and
+    brightness (octaves) of the `min_seconds / 2` before it and after it, in
+    units of NOVELTY_DB and NOVELTY_OCTAVES. Boundaries go at the strongest
+    peaks above `threshold`, at least `min_seconds` apart; segments longer than
+    `max_seconds` are split evenly. With a `budget`, there are at most that
+    many segments: the weakest boundaries are dropped and `max_seconds` is
+    stretched to total_seconds / budget if needed.
+    """
+    frames = len(rms)
+    if frames < 2 or total_seconds <= min_seconds:
+        return [(0.0, total_seconds)]
+    frame_seconds = total_seconds / frames
+    features = np.vstack([
+        librosa.amplitude_to_db(rms, ref=np.max) / NOVELTY_DB,
+        np.log2(np.maximum(spec_centroid, 1.0)) / NOVELTY_OCTAVES,
+    ])
+
+    # novelty[t] compares frames [t - half, t) with [t, t + half), via running sums
+    half = max(1, int(min_seconds / 2 / frame_seconds))
+    running = np.concatenate([np.zeros((2, 1)), np.cumsum(features, axis=1)], axis=1)
+    t = np.arange(half, frames - half + 1)
+    before = (running[:, t] - running[:, t - half]) / half
+    after = (running[:, t + half] - running[:, t]) / half
+    novelty = np.zeros(frames + 1)
+    novelty[t] = np.linalg.norm(after - before, axis=0)
+
+    # Strongest first, skipping anything too close to the ends or a stronger boundary
+    min_frames = min_seconds / frame_seconds
+    chosen = []
+    for frame in np.argsort(novelty)[::-1]:
+        if novelty[frame] < threshold:
+            break
+        if frame < min_frames or frames - frame < min_frames:
+            continue
+        if all(abs(frame - other) >= min_frames for other in chosen):
+            chosen.append(int(frame))
+
+    longest = max(max_seconds, total_seconds / budget) if budget else max_seconds
+    while True:
+        edges = [0.0] + sorted(frame * frame_seconds for frame in chosen) + [total_seconds]
+        segments = []
+        for start, end in zip(edges, edges[1:]):
+            pieces = max(1, int(np.ceil((end - start) / longest - 1e-9)))
+            step = (end - start) / pieces
+            segments.extend((start + i * step, start + (i + 1) * step) for i in range(pieces))
+        if not budget or len(segments) <= budget:
+            return segments
+        chosen.pop()  # weakest boundary
+
+
+# RMS window for energy: 2048 samples at 44.1 kHz, scaled so other analysis rates measure the same thing
+ENERGY_FRAME_SECONDS = 2048 / 44100
+
+
+def energy_frame_length(sr):
+    return int(round(ENERGY_FRAME_SECONDS * sr))
+
+
+def chunk_energy(y, sr=44100):
+    """
+    Compute the energy of one chunk of amplitudes.
+    `y` is a list or numpy array of amplitude values at sample rate `sr`.
+    """
+    if len(y) == 0:
+        return 0.0
+
+    # Convert to mono float32 just in case
+    y = librosa.util.normalize(y.astype(np.float32, copy=False))
+
+    # Compute RMS (frame-wise)
+    rms = librosa.feature.rms(y=y, frame_length=energy_frame_length(sr), hop_length=512)[0]
+
+    # Convert to decibels for perceptual scaling
+    rms_db = librosa.amplitude_to_db(rms, ref=np.max)
+
+    # Normalize 0–1 range (0 = silence, 1 = loudest)
+    energy = np.clip((rms_db + 60) / 60, 0, 1)
+
+    return float(np.mean(energy))
+
+
+ONSET_HOP = 256
+TEMPO_WINDOW_SECONDS = 8.0  # autocorrelation window of the tempogram (librosa's default ac_size)
+MIN_TEMPO = 30.0  # slowest BPM kept in a tempogram; longer lags are dropped to save memory
+
+
+def onset_tempogram(onset_env, sr, hop_length=ONSET_HOP, block_frames=256):
+    """
+    Autocorrelation tempogram (lags x frames) of an onset envelope, without
+    lags slower than MIN_TEMPO; the same values as librosa.feature.tempogram.
+    The windows are strided views of one padded envelope, autocorrelated
+    `block_frames` columns at a time, so the full-window float64 intermediate
+    never spans more than a block and lags that are dropped are never kept.
+    """
+    win_length = int(librosa.time_to_frames(TEMPO_WINDOW_SECONDS, sr=sr, hop_length=hop_length))
+    lags = min(win_length, int(np.ceil(60.0 * sr / (hop_length * MIN_TEMPO))) + 1)
+    if len(onset_env) == 0:
+        return np.zeros((lags, 0), dtype=np.float32)
+    window = scipy.signal.get_window("hann", win_length, fftbins=True)[:, np.newaxis]
+    padded = np.pad(onset_env, win_length // 2, mode="linear_ramp", end_values=0)
+    windows = librosa.util.frame(padded, frame_length=win_length, hop_length=1)
+    tempogram = np.empty((lags, len(onset_env)), dtype=np.float32)
+    for start in range(0, len(onset_env), block_frames):
+        end = min(len(onset_env), start + block_frames)
+        # Lag 0 is each column's maximum, so normalising the kept lags matches librosa
+        block = librosa.autocorrelate(windows[:, start:end] * window, max_size=lags, axis=0)
+        tempogram[:, start:end] = librosa.util.normalize(block, norm=np.inf, axis=0)
+    return tempogram
+
+
+def tempo_from_tempogram(tempogram, sr, hop_length=ONSET_HOP, prior_bpm=120.0, prior_octaves=1.0):
+    """
+    BPM of the strongest periodicity over all frames of `tempogram`, weighted by
+    a log-normal prior around `prior_bpm` that is `prior_octaves` wide
+    (librosa's default prior is 120 BPM, 1 octave).
+    """
+    if tempogram.shape[-1] == 0:
+        return 0.0
+    tempo = librosa.feature.tempo(
+        tg=tempogram, sr=sr, hop_length=hop_length, start_bpm=prior_bpm, std_bpm=prior_octaves, aggregate=np.mean
+    )
+    return float(tempo[0])
+
+
+def chunk_tempo(y, sr, y_perc=None):
+    # get the tempo from  one chunk of the audio file
+    if len(y) == 0:
+        return 0.0
+
+    # Separate harmonic and percussive parts, unless the caller already has them
+    if y_perc is None:
+        y_harm, y_perc = librosa.effects.hpss(y)
+
+    # Onset strength envelope from percussive component
+    onset_env = librosa.onset.onset_strength(y=y_perc, sr=sr, hop_length=ONSET_HOP)
+
+    # Strongest periodicity of the whole chunk, rather than the median of
+    # per-frame estimates, which jumps between octaves on short windows
+    return tempo_from_tempogram(onset_tempogram(onset_env, sr), sr)
+
+
+CHROMA_BACKENDS = ("cqt", "cqt_fast", "stft")
+
+
+def harmonic_chroma(sr, hop_length, backend="cqt", y_harm=None, harm_stft=None, length=None):
+    """
+    12 x frames chroma of the harmonic part of a signal, given either as
+    samples (`y_harm`) or as the harmonic STFT from HPSS (`harm_stft`).
+
+    "cqt" is librosa's constant-Q chroma (36 bins per octave over 7 octaves,
+    tuning estimated). "cqt_fast" uses 12 bins over 6 octaves at A440, and
+    "stft" folds the harmonic STFT magnitudes at A440, so it needs no
+    transform of its own when HPSS has already run.
+    """
+    if backend not in CHROMA_BACKENDS:
+        raise ValueError(f"Unknown chroma backend {backend!r}; expected one of {CHROMA_BACKENDS}")
+    if backend == "stft":
+        if harm_stft is None:
+            harm_stft = librosa.stft(y_harm, hop_length=hop_length)
+        return librosa.feature.chroma_stft(S=np.abs(harm_stft) ** 2, sr=sr, tuning=0.0)
+    if y_harm is None:
+        y_harm = librosa.istft(harm_stft, length=length)
+    if backend == "cqt_fast":
+        return librosa.feature.chroma_cqt(
+            y=y_harm, sr=sr, hop_length=hop_length, bins_per_octave=12, n_octaves=6, tuning=0.0
+        )
+    return librosa.feature.chroma_cqt(y=y_harm, sr=sr, hop_length=hop_length)
+
+
+def chunk_key(y, sr, backend="cqt", harm_stft=None, with_confidence=False):
+    """
+    Estimate musical key (e.g., 'C major' or 'A minor') for one chunk.
+    Pass `harm_stft` (the harmonic half of an HPSS of `y`) to skip separating it again.
+    """
+    if len(y) == 0:
+        return ("Unknown", 0.0) if with_confidence else "Unknown"
+
+    # Emphasize harmonic content
+    y_harm = None
+    if harm_stft is None:
+        if backend == "stft":
+            harm_stft = librosa.decompose.hpss(librosa.stft(y))[0]
+        else:
+            y_harm = librosa.effects.harmonic(y)
+
+    # Compute chroma features (12 pitch classes)
+    chroma = harmonic_chroma(sr, 512, backend, y_harm, harm_stft, length=len(y))
+    return key_from_chroma(np.mean(chroma, axis=1), with_confidence)
+
+
+# Krumhansl–Kessler key profiles, tonic first
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+_PITCH_CLASSES = [librosa.midi_to_note(12 + i, octave=False) for i in range(12)]
+KEY_NAMES = [f"{note} major" for note in _PITCH_CLASSES] + [f"{note} minor" for note in _PITCH_CLASSES]
+
+
+def _key_templates():
+    """24 x 12 circulant matrix of every rotated profile, centered and scaled to unit length"""
+    rows = np.array([np.roll(profile, i) for profile in (MAJOR_PROFILE, MINOR_PROFILE) for i in range(12)])
+    rows -= rows.mean(axis=1, keepdims=True)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+KEY_TEMPLATES = _key_templates()
+
+
+def key_scores(chroma_mean):
+    """
+    Pearson correlation of a mean chroma vector (12,) with every key profile,
+    in KEY_NAMES order; a 12 x N matrix of vectors gives 24 x N. NaN for flat chroma.
+    """
+    centered = chroma_mean - np.mean(chroma_mean, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return KEY_TEMPLATES @ (centered / np.linalg.norm(centered, axis=0))
+
+
+def key_from_chroma(chroma_mean, with_confidence=False):
+    """
+    Pick the best-matching major/minor key for a mean chroma vector. With
+    `with_confidence`, returns (key, confidence), where confidence is how far
+    the best correlation leads the runner-up (0 means a tie).
+    """
+    scores = key_scores(np.asarray(chroma_mean, dtype=np.float64))
+    if not np.all(np.isfinite(scores)):
+        key, confidence = "Unknown", 0.0  # silence: no pitch class stands out
+    else:
+        # Ties go to the major key, which comes first
+        best = int(np.argmax(scores))
+        key = KEY_NAMES[best]
+        confidence = round(float(scores[best] - np.partition(scores, -2)[-2]), 4)
+    return (key, confidence) if with_confidence else key
+
+
+def analyse_chunk(y, sr, chroma_backend="cqt", with_confidence=False):
+    """
+    Energy, tempo and key for one chunk, in a single process-pool round trip,
+    sharing one HPSS between tempo (percussive) and key (harmonic).
+    With `with_confidence`, the key's confidence is appended.
+    """
+    if len(y) == 0:
+        return (0.0, 0.0, "Unknown", 0.0)[:4 if with_confidence else 3]
+    harmonic, percussive = librosa.decompose.hpss(librosa.stft(y))
+    tempo = chunk_tempo(y, sr, y_perc=librosa.istft(percussive, length=len(y)))
+    key = chunk_key(y, sr, chroma_backend, harm_stft=harmonic, with_confidence=with_confidence)
+    if with_confidence:
+        return (chunk_energy(y, sr), tempo) + key
+    return chunk_energy(y, sr), tempo, key
+
+
+class TrackFeatures:
+    """
+    Frame-level features computed once over the whole track.
+
+    Chunks overlap heavily (7 s windows, 6 s hop), so slicing these matrices is
+    much cheaper than re-running STFT/HPSS/CQT on every chunk. With a process
+    pool, the matrices are built there (track_features, with_tempogram) and a
+    chunk's slices go back to it for the per-chunk math (chunk_slices,
+    sliced_chunk_features), so none of the DSP runs in the web process.
+    """
+
+    RMS_HOP = 512
+    ONSET_HOP = ONSET_HOP
+    CHROMA_HOP = 512
+    BLOCK_ALIGN = 512  # multiple of every hop above
+
+    def __init__(self, sr, rms, onset_env, chroma, timings=None):
+        self.sr = sr
+        self.rms = rms
+        self.onset_env = onset_env
+        self.chroma = chroma
+        self.timings = timings or {}  # step -> seconds spent computing them (summed over blocks)
+
+    @staticmethod
+    def _frames(start, end, hop):
+        """Frames whose centers fall inside samples [start, end]"""
+        return slice(-(-start // hop), end // hop + 1)
+
+    def energy(self, start, end):
+        """Same scale as chunk_energy: mean of dB-over-peak RMS mapped to 0–1"""
+        return _sliced_energy(self.rms[self._frames(start, end, self.RMS_HOP)])
+
+    @functools.cached_property
+    def tempogram(self):
+        """Tempogram of the whole track's onset envelope, computed on first use (after blocks are joined)"""
+        return onset_tempogram(self.onset_env, self.sr, self.ONSET_HOP)
+
+    @functools.cached_property
+    def track_tempo(self):
+        """Dominant tempo of the whole track"""
+        return tempo_from_tempogram(self.tempogram, self.sr, self.ONSET_HOP)
+
+    def tempo(self, start, end, prior_octaves=0.0):
+        """
+        Tempo from the track tempogram averaged over the chunk's frames. Each
+        frame's autocorrelation window reaches past the chunk, which smooths
+        the curve between overlapping chunks. With `prior_octaves`, estimates
+        are pulled towards the track tempo (a log-normal prior that wide),
+        which keeps neighboring chunks from jumping between octaves.
+        """
+        tempogram = self.tempogram[:, self._frames(start, end, self.ONSET_HOP)]
+        return _sliced_tempo(tempogram, self.sr, self.track_tempo if prior_octaves > 0 else None, prior_octaves)
+
+    def key(self, start, end, with_confidence=False):
+        return _sliced_key(self.chroma[:, self._frames(start, end, self.CHROMA_HOP)], with_confidence)
+
+    def chunk_slices(self, start, end):
+        """
+        (rms, tempogram, chroma) frames for samples [start, end), copied so they
+        pickle small: sliced_chunk_features' arguments after `sr`
+        """
+        return (
+            self.rms[self._frames(start, end, self.RMS_HOP)].copy(),
+            self.tempogram[:, self._frames(start, end, self.ONSET_HOP)].copy(),
+            self.chroma[:, self._frames(start, end, self.CHROMA_HOP)].copy(),
+        )
+
+    def chunk_features(self, start, end, with_confidence=False, tempo_prior_octaves=0.0):
+        """Energy, tempo and key (plus its confidence, if asked) for samples [start, end) of the track"""
+        return sliced_chunk_features(
+            self.sr, *self.chunk_slices(start, end), self.track_tempo, with_confidence, tempo_prior_octaves
+        )
+
+    @classmethod
+    def concatenate(cls, parts):
+        """Join features computed block by block (see track_features) back into one track"""
+        return cls(
+            parts[0].sr,
+            np.concatenate([p.rms for p in parts]),
+            np.concatenate([p.onset_env for p in parts]),
+            np.concatenate([p.chroma for p in parts], axis=1),
+            {step: sum(p.timings.get(step, 0.0) for p in parts) for step in parts[0].timings},
+        )
+
+
+def _sliced_energy(rms):
+    if len(rms) == 0:
+        return 0.0
+    rms_db = librosa.amplitude_to_db(rms, ref=np.max)
+    return float(np.mean(np.clip((rms_db + 60) / 60, 0, 1)))
+
+
+def _sliced_tempo(tempogram, sr, prior_bpm=None, prior_octaves=0.0):
+    if prior_bpm is not None and prior_octaves > 0:
+        return tempo_from_tempogram(tempogram, sr, TrackFeatures.ONSET_HOP, prior_bpm, prior_octaves)
+    return tempo_from_tempogram(tempogram, sr, TrackFeatures.ONSET_HOP)
+
+
+def _sliced_key(chroma, with_confidence=False):
+    if chroma.shape[1] == 0:
+        return ("Unknown", 0.0) if with_confidence else "Unknown"
+    return key_from_chroma(np.mean(chroma, axis=1), with_confidence)
+
+
+def sliced_chunk_features(sr, rms, tempogram, chroma, track_tempo, with_confidence=False, tempo_prior_octaves=0.0):
+    """
+    TrackFeatures.chunk_features from one chunk's slices (TrackFeatures.chunk_slices),
+    so it can run on the DSP pool without shipping the whole track's features
+    """
+    energy = _sliced_energy(rms)
+    tempo = _sliced_tempo(tempogram, sr, track_tempo, tempo_prior_octaves)
+    key = _sliced_key(chroma, with_confidence)
+    if with_confidence:
+        return (energy, tempo) + key
+    return energy, tempo, key
+
+
+def with_tempogram(features):
+    """`features` with its tempogram and track tempo computed, timed as "tempogram"; for the DSP pool"""
+    start = time.perf_counter()
+    features.track_tempo  # computes the tempogram on the way
+    features.timings["tempogram"] = time.perf_counter() - start
+    return features
+
+
+def track_features(wave, sr, lead=0, length=None, chroma_backend="cqt", tempogram=False):
+    """
+    Run STFT, HPSS, onset strength, RMS and chroma once over the whole track.
+    `chroma_backend` is one of CHROMA_BACKENDS (see harmonic_chroma).
+
+    To split the work across a pool, `wave` can instead be one block of the
+    track padded on both sides: only frames for samples [lead, lead + length)
+    are kept, and `length=None` marks the block that ends the track. Blocks must
+    start on a multiple of TrackFeatures.BLOCK_ALIGN samples. With `tempogram`
+    (whole tracks only), the tempogram is computed too (see with_tempogram).
+    """
+    timings = {}
+    clock = time.perf_counter()
+
+    def lap(step):
+        nonlocal clock
+        now = time.perf_counter()
+        timings[step] = now - clock
+        clock = now
+
+    rms = librosa.feature.rms(y=wave, frame_length=energy_frame_length(sr), hop_length=TrackFeatures.RMS_HOP)[0]
+    lap("rms")
+
+    # One HPSS split shared by tempo (percussive) and key (harmonic); the
+    # STFT's hop is CHROMA_HOP so the "stft" chroma backend can use it as is
+    stft = librosa.stft(wave, hop_length=TrackFeatures.CHROMA_HOP)
+    lap("stft")
+    harmonic, percussive = librosa.decompose.hpss(stft)
+    del stft
+    lap("hpss")
+    y_perc = librosa.istft(percussive, hop_length=TrackFeatures.CHROMA_HOP, length=len(wave))
+    del percussive
+    lap("istft")
+
+    onset_env = librosa.onset.onset_strength(y=y_perc, sr=sr, hop_length=TrackFeatures.ONSET_HOP)
+    lap("onset")
+    chroma = harmonic_chroma(sr, TrackFeatures.CHROMA_HOP, chroma_backend, harm_stft=harmonic, length=len(wave))
+    lap("chroma")
+
+    def keep(frames, hop):
+        if length is None:
+            count = 1 + (len(wave) - lead) // hop  # centered frames include the closing one
+        else:
+            count = length // hop
+        return frames[..., lead // hop:lead // hop + count]
+
+    features = TrackFeatures(
+        sr,
+        keep(rms, TrackFeatures.RMS_HOP),
+        keep(onset_env, TrackFeatures.ONSET_HOP),
+        keep(chroma, TrackFeatures.CHROMA_HOP),
+        timings,
+    )
+    return with_tempogram(features) if tempogram else features
@@ -0,0 +1,185 @@
+"""
+Local emotion model: a fast path in front of GPT, trained on its logged answers.
+
+GPT only ever sees a chunk's energy, tempo and key (see Process.FEATURE_GUIDE),
+so those are the features here too. Chroma, RMS and spectral centroid
+statistics are deliberately left out: a model imitating GPT can't learn
+anything from inputs GPT never saw, and the DSP stage doesn't keep them per
+chunk. With EMOTION_LOG_PATH set, every GPT answer is appended to a
+JSON-lines log; training indexes the logged answers, and a chunk's emotions
+are the distance-weighted mean of its nearest logged neighbours.
+
+Confidence (0-1) is how much those neighbours agree with each other, scaled
+down as they get further from the chunk, so new kinds of chunks fall back to
+GPT (EMOTION_MODE="hybrid") until the log covers them. EMOTION_MODE="local"
+never calls GPT.
+
+    python emotion_model.py --log emotion_log.jsonl --out emotion_model.npz
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import threading
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+EMOTIONS = ("happy", "sad", "calm", "energetic", "excited", "relaxed", "angry", "romantic", "other")
+EMOTION_MODES = ("gpt", "hybrid", "local")
+
+# One unit of feature distance is roughly a change GPT reacts to: 0.1 energy,
+# a 15% faster or slower tempo, or major against minor. Moving the tonic
+# round the circle of fifths adds at most TONIC_UNIT
+ENERGY_UNIT = 0.1
+TEMPO_UNIT = 0.2  # log2 of the tempo ratio
+TONIC_UNIT = 0.25
+DISTANCE_SCALE = 1.0  # neighbours this far away (mean, in units) keep e^-1 of the confidence
+NEIGHBORS = 8
+
+_PITCHES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+
+_model = None
+_model_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+def feature_vector(energy, tempo, key):
+    """Scaled features of one chunk; Euclidean distance between them is in the units above"""
+    tonic, _, mode = (key or "").partition(" ")
+    vector = [energy / ENERGY_UNIT, math.log2(max(tempo, 1.0) / 120.0) / TEMPO_UNIT, 0.0, 0.0, 0.0]
+    if tonic[:1] in _PITCHES and mode in ("major", "minor"):
+        pitch = _PITCHES[tonic[0]] + tonic.count("#") + tonic.count("♯") - tonic.count("b") - tonic.count("♭")
+        angle = 2 * math.pi * (pitch * 7 % 12) / 12  # position on the circle of fifths
+        vector[2:] = [0.5 if mode == "major" else -0.5, TONIC_UNIT * math.cos(angle), TONIC_UNIT * math.sin(angle)]
+    return vector
+
+
+class LocalEmotionModel:
+    """Nearest logged GPT answers to a chunk's features, averaged by distance"""
+
+    def __init__(self, features, targets, neighbors=NEIGHBORS):
+        from sklearn.neighbors import NearestNeighbors
+
+        self.features = np.asarray(features, dtype=np.float64)
+        self.targets = np.asarray(targets, dtype=np.float64)
+        if len(self.features) == 0:
+            raise ValueError("No logged GPT answers to train on")
+        self.neighbors = min(neighbors, len(self.features))
+        self.index = NearestNeighbors(n_neighbors=self.neighbors).fit(self.features)
+        # Identifies the training data in cache keys, so a retrained model doesn't replay old results
+        digest = hashlib.sha256(self.features.tobytes())
+        digest.update(self.targets.tobytes())
+        self.version = digest.hexdigest()[:16]
+
+    def predict(self, energy, tempo, key):
+        """({emotion: percentage}, confidence) for one chunk"""
+        prediction, confidence = self.predict_vector(feature_vector(energy, tempo, key))
+        return dict(zip(EMOTIONS, np.round(prediction, 1).tolist())), round(float(confidence), 3)
+
+    def predict_vector(self, vector):
+        """(percentages summing to 100, confidence) for a feature_vector"""
+        distances, indices = self.index.kneighbors([vector])
+        distances, found = distances[0], self.targets[indices[0]]
+        weights = 1.0 / (distances + 0.1)
+        weights /= weights.sum()
+        prediction = weights @ found
+        # Agreement: 1 minus the neighbours' mean total variation distance from the prediction
+        spread = weights @ (np.abs(found - prediction).sum(axis=1) / 2) / 100.0
+        confidence = (1.0 - spread) * math.exp(-(float(weights @ distances) / DISTANCE_SCALE) ** 2)
+        return prediction * 100.0 / max(prediction.sum(), 1e-9), max(0.0, confidence)
+
+    def save(self, path):
+        np.savez_compressed(path, features=self.features, targets=self.targets, neighbors=self.neighbors)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["features"], data["targets"], int(data["neighbors"]))
+
+
+def get_local_model():
+    """The model at EMOTION_MODEL_PATH, loaded on first use; None when EMOTION_MODE is "gpt" """
+    global _model
+    if settings.EMOTION_MODE not in EMOTION_MODES:
+        raise ValueError(f"EMOTION_MODE must be one of {EMOTION_MODES}")
+    if settings.EMOTION_MODE == "gpt":
+        return None
+    with _model_lock:
+        if _model is None:
+            if not settings.EMOTION_MODEL_PATH:
+                raise RuntimeError(f'EMOTION_MODE="{settings.EMOTION_MODE}" needs EMOTION_MODEL_PATH')
+            _model = LocalEmotionModel.load(settings.EMOTION_MODEL_PATH)
+            logger.info("Loaded local emotion model %s (%d logged answers)", _model.version, len(_model.targets))
+        return _model
+
+
+def log_answer(energy, tempo, key, emotion):
+    """Append a GPT answer to EMOTION_LOG_PATH (when set) as training data"""
+    if not settings.EMOTION_LOG_PATH:
+        return
+    line = json.dumps({"energy": energy, "tempo": tempo, "key": key, **{e: emotion[e] for e in EMOTIONS}})
+    with _log_lock, open(settings.EMOTION_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def read_log(path):
+    """(features, targets) from a log written by log_answer; answers that don't sum to ~100 are skipped"""
+    features, targets = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            target = [float(entry[e]) for e in EMOTIONS]
+            if not 50.0 <= sum(target) <= 150.0:
+                continue
+            features.append(feature_vector(float(entry["energy"]), float(entry["tempo"]), entry["key"]))
+            targets.append([value * 100.0 / sum(target) for value in target])
+    return np.array(features).reshape(-1, 5), np.array(targets).reshape(-1, len(EMOTIONS))
+
+
+def evaluate(features, targets, neighbors, threshold, holdout=0.2, seed=0):
+    """Held-out mean total variation distance (percentage points) from GPT, overall and above `threshold`"""
+    order = np.random.default_rng(seed).permutation(len(features))
+    split = max(1, int(len(features) * holdout))
+    test, train = order[:split], order[split:]
+    model = LocalEmotionModel(features[train], targets[train], neighbors)
+    errors, confident = [], []
+    for i in test:
+        prediction, confidence = model.predict_vector(features[i])
+        error = np.abs(prediction - targets[i]).sum() / 2
+        errors.append(error)
+        if confidence >= threshold:
+            confident.append(error)
+    return float(np.mean(errors)), len(confident) / len(test), float(np.mean(confident)) if confident else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local emotion model from logged GPT answers")
+    parser.add_argument("--log", default=settings.EMOTION_LOG_PATH or "emotion_log.jsonl",
+                        help="JSON lines written with EMOTION_LOG_PATH")
+    parser.add_argument("--out", default=settings.EMOTION_MODEL_PATH or "emotion_model.npz")
+    parser.add_argument("--neighbors", type=int, default=NEIGHBORS)
+    parser.add_argument("--threshold", type=float, default=settings.EMOTION_LOCAL_CONFIDENCE,
+                        help="confidence to report coverage at")
+    args = parser.parse_args()
+
+    features, targets = read_log(args.log)
+    print(f"{len(features)} logged GPT answers in {args.log}")
+    if len(features) >= 10:
+        error, coverage, confident_error = evaluate(features, targets, args.neighbors, args.threshold)
+        print(f"held out: {error:.1f} points from GPT on average; {coverage:.0%} of chunks above "
+              f"confidence {args.threshold:g}" + (f", {confident_error:.1f} points off" if confident_error is not None else ""))
+    model = LocalEmotionModel(features, targets, args.neighbors)
+    model.save(args.out)
+    print(f"Saved model {model.version} to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
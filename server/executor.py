@@ -0,0 +1,147 @@
+"""
+Execution layer for the audio pipeline.
+
+librosa work runs in a bounded process pool and blocking network calls
+(download, OpenAI) run in a thread pool, so the uvicorn event loop only moves
+finished results onto the NDJSON stream. Async clients (Replicate) live on a
+background event loop that pipeline threads hand coroutines to.
+"""
+
+import asyncio
+import concurrent.futures
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from config import settings
+
+_dsp_pool = None
+_io_pool = None
+_async_loop = None
+_lock = threading.Lock()
+
+# Marks the end of a stream produced by iterate_in_thread
+_DONE = object()
+
+
+class _Failure:
+    """Carries an exception raised by the producer thread over to the consumer."""
+
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def get_dsp_pool() -> ProcessPoolExecutor:
+    """Shared process pool for librosa work, created on first use."""
+    global _dsp_pool
+    with _lock:
+        if _dsp_pool is None:
+            # spawn: forking a threaded uvicorn worker can deadlock numba/BLAS
+            _dsp_pool = ProcessPoolExecutor(
+                max_workers=settings.DSP_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _dsp_pool
+
+
+def get_io_pool() -> ThreadPoolExecutor:
+    """Shared thread pool for blocking network calls, created on first use."""
+    global _io_pool
+    with _lock:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(max_workers=settings.IO_WORKERS, thread_name_prefix="io")
+        return _io_pool
+
+
+def get_async_loop() -> asyncio.AbstractEventLoop:
+    """Shared event loop on a background thread for async clients, started on first use."""
+    global _async_loop
+    with _lock:
+        if _async_loop is None:
+            _async_loop = asyncio.new_event_loop()
+            threading.Thread(target=_async_loop.run_forever, name="async-clients", daemon=True).start()
+        return _async_loop
+
+
+def submit_async(coro) -> concurrent.futures.Future:
+    """Schedule `coro` on the background loop without waiting for it."""
+    return asyncio.run_coroutine_threadsafe(coro, get_async_loop())
+
+
+def run_async(coro, timeout=None):
+    """Run `coro` on the background loop and block the calling thread for its result."""
+    return submit_async(coro).result(timeout)
+
+
+def shutdown():
+    """Stop the pools and the background loop, dropping queued work. Called from the FastAPI lifespan."""
+    global _dsp_pool, _io_pool, _async_loop
+    with _lock:
+        if _dsp_pool is not None:
+            _dsp_pool.shutdown(wait=False, cancel_futures=True)
+            _dsp_pool = None
+        if _io_pool is not None:
+            _io_pool.shutdown(wait=False, cancel_futures=True)
+            _io_pool = None
+        if _async_loop is not None:
+            _async_loop.call_soon_threadsafe(_async_loop.stop)
+            _async_loop = None
+
+
+async def run_io(fn, *args):
+    """Await a blocking call on the I/O thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_pool(), fn, *args)
+
+
+async def iterate_in_thread(make_iterator, maxsize=None):
+    """
+    Drive a blocking iterator on the I/O pool and yield its items asynchronously.
+
+    Items travel through a bounded queue, so a slow client makes the producer
+    wait instead of piling up results (backpressure). When the consumer goes
+    away (client disconnect cancels the stream) the producer notices at its
+    next hand-off and closes the iterator, so no further chunks are computed.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=maxsize or settings.STREAM_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def put(item):
+        # Returns False once the consumer has gone away
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=0.5)
+                return True
+            except concurrent.futures.TimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    return False
+
+    def produce():
+        iterator = make_iterator()
+        try:
+            for item in iterator:
+                if stop.is_set() or not put(item):
+                    return
+            put(_DONE)
+        except Exception as e:
+            put(_Failure(e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    producer = loop.run_in_executor(get_io_pool(), produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+        await producer
+    finally:
+        stop.set()
@@ -0,0 +1,282 @@
+"""
+Streaming ingest: download audio to a temporary file in the background and
+decode it block by block while the bytes are still arriving.
+
+Two independent decoders read the download: one feeds the waveform
+accumulator as fast as the bytes allow, the other cuts analysis chunks and
+waits whenever the pipeline falls behind. Neither keeps more than a chunk or
+so of decoded audio in memory, whatever the track length.
+"""
+
+import hashlib
+import io
+import queue
+import tempfile
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+import requests
+import soundfile as sf
+import soxr
+
+import dsp
+
+_END = object()
+
+
+class SpooledDownload:
+    """
+    Downloads `url` to a temporary file on a background thread.
+
+    Readers (see `reader`) see the file as if it were complete and block until
+    the bytes they ask for have arrived.
+    """
+
+    def __init__(self, url, timeout=30.0, block_bytes=64 * 1024, session=None):
+        self.size = 0
+        self.total = None  # from Content-Length, when the server sends a usable one
+        self.done = False
+        self.error = None
+        self.content_hash = None
+        self._file = tempfile.TemporaryFile()
+        self._cond = threading.Condition()
+        self._cancelled = False
+        self._session = session or requests  # a pooled requests.Session, or one-off connections
+        self._thread = threading.Thread(
+            target=self._run, args=(url, timeout, block_bytes), name="download", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, url, timeout, block_bytes):
+        digest = hashlib.sha256()
+        try:
+            with self._session.get(url, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                length = response.headers.get("Content-Length")
+                with self._cond:
+                    # A compressed transfer's length doesn't match the decoded bytes
+                    if length and not response.headers.get("Content-Encoding"):
+                        self.total = int(length)
+                    self._cond.notify_all()
+                for block in response.iter_content(block_bytes):
+                    if self._cancelled:
+                        return
+                    digest.update(block)
+                    with self._cond:
+                        self._file.seek(self.size)
+                        self._file.write(block)
+                        self.size += len(block)
+                        self._cond.notify_all()
+            self.content_hash = digest.hexdigest()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    def length(self):
+        """Final size in bytes, waiting for the end of the download if it isn't known upfront"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.total is not None or self.done)
+            self._raise_error()
+            return self.size if self.done else self.total
+
+    def read_at(self, offset, n, wait=True):
+        """
+        Up to `n` bytes at `offset`, waiting for them to arrive; without `wait`,
+        bytes that haven't arrived yet read as zeros
+        """
+        with self._cond:
+            if not wait and not self.done and self.size < offset + n:
+                self._raise_error()
+                return bytes(max(0, min(n, self.total - offset)))
+            self._cond.wait_for(lambda: self.done or self.size >= offset + n)
+            self._raise_error()
+            self._file.seek(offset)
+            return self._file.read(max(0, min(n, self.size - offset)))
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def reader(self):
+        return _DownloadReader(self)
+
+    def close(self):
+        self._cancelled = True
+        with self._cond:
+            self._file.close()
+
+
+class _DownloadReader(io.RawIOBase):
+    """
+    Seekable, read-only view of a SpooledDownload with its own position.
+
+    libsndfile opens an MP3 by seeking to the end and reading the last 128
+    bytes, looking for an ID3v1 tag. Waiting for those bytes would hold the
+    decode back until the whole file had downloaded, so a read straight after
+    a seek from the end doesn't wait: bytes that haven't arrived read as
+    zeros, which is no tag. Reads in decoding order always wait.
+    """
+
+    def __init__(self, download):
+        self._download = download
+        self._pos = 0
+        self._probe = False  # the next read follows a seek from the end
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._probe = whence == io.SEEK_END
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = self._download.length() + offset
+        return self._pos
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self._download.length() - self._pos
+        data = self._download.read_at(self._pos, n, wait=not self._probe)
+        self._probe = False
+        self._pos += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class StreamingIngest:
+    """
+    Streams `url` and yields analysis chunks and the waveform while it downloads.
+
+    `chunks()` produces the same (start, samples) windows that Process.chunk
+    would cut from the fully loaded track; `waveform` is a Future that resolves
+    to the waveform frames once the whole file has been decoded.
+    """
+
+    def __init__(self, url, chunk_duration, hop_duration, timeout=30.0, block_bytes=64 * 1024, max_pending_chunks=4,
+                 analysis_sr=None, waveform_sr=None, resample_quality="HQ", session=None):
+        self.chunk_duration = chunk_duration
+        self.hop_duration = hop_duration
+        self.analysis_sr = analysis_sr
+        self.waveform_sr = waveform_sr
+        self.resample_quality = resample_quality
+        self.sr = None  # rate of the chunks: analysis_sr, or the native rate
+        self.total_chunks = None
+        self.waveform = Future()
+        self.download = SpooledDownload(url, timeout, block_bytes, session)
+        self._header = threading.Event()
+        self._header_error = None
+        self._chunks = queue.Queue(maxsize=max_pending_chunks)
+        self._stop = threading.Event()
+        threading.Thread(target=self._decode_chunks, name="decode-chunks", daemon=True).start()
+        threading.Thread(target=self._decode_waveform, name="decode-waveform", daemon=True).start()
+
+    @property
+    def content_hash(self):
+        return self.download.content_hash
+
+    def wait_header(self):
+        """Block until the sample rate and chunk count are known"""
+        self._header.wait()
+        if self._header_error is not None:
+            raise self._header_error
+
+    def chunks(self):
+        """Yield (start_sample, samples) windows as soon as they are decoded"""
+        while True:
+            item = self._chunks.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        """Stop both decoders and the download, and drop the temporary file"""
+        self._stop.set()
+        self.download.close()
+
+    def _mono_blocks(self, f, frames, target_sr=None):
+        """Mono float32 blocks from `f`, resampled on the fly to `target_sr` if given"""
+        resampler = None
+        if target_sr and target_sr != f.samplerate:
+            resampler = soxr.ResampleStream(f.samplerate, target_sr, 1, dtype="float32", quality=self.resample_quality)
+        for block in f.blocks(blocksize=frames, dtype="float32", always_2d=True):
+            block = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+            if resampler is not None:
+                block = resampler.resample_chunk(block)
+            yield block
+        if resampler is not None:
+            yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+    def _put(self, item):
+        # Waits while the pipeline is behind (backpressure); gives up once closed
+        while not self._stop.is_set():
+            try:
+                self._chunks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode_chunks(self):
+        try:
+            self.download.length()  # surfaces HTTP errors here rather than inside libsndfile callbacks
+            with sf.SoundFile(self.download.reader()) as f:
+                self.sr = self.analysis_sr or f.samplerate
+                samples_per_chunk = int(self.chunk_duration * self.sr)
+                hop_samples = int(self.hop_duration * self.sr)
+                frames = int(f.frames * self.sr / f.samplerate)
+                self.total_chunks = len(range(0, frames - samples_per_chunk, hop_samples))
+                self._header.set()
+
+                buffer = np.zeros(0, dtype=np.float32)
+                offset = 0  # track position of buffer[0]
+                start = 0
+                for block in self._mono_blocks(f, hop_samples, self.analysis_sr):
+                    if self._stop.is_set():
+                        return
+                    buffer = np.concatenate([buffer, block])
+                    # Strictly more samples than the window, matching range(0, len - chunk, hop)
+                    while offset + len(buffer) > start + samples_per_chunk:
+                        window = buffer[start - offset:start - offset + samples_per_chunk].copy()
+                        if not self._put((start, window)):
+                            return
+                        start += hop_samples
+                        buffer = buffer[start - offset:]
+                        offset = start
+            self._put(_END)
+        except Exception as e:
+            if not self._header.is_set():
+                self._header_error = e
+                self._header.set()
+            self._put(e)
+
+    def _decode_waveform(self):
+        try:
+            self.download.length()
+            with sf.SoundFile(self.download.reader()) as f:
+                accumulator = dsp.WaveformAccumulator(self.waveform_sr or f.samplerate)
+                for block in self._mono_blocks(f, 1 << 16, self.waveform_sr):
+                    if self._stop.is_set():
+                        self.waveform.cancel()
+                        return
+                    accumulator.add(block)
+            self.waveform.set_result(accumulator.finish())
+        except Exception as e:
+            self.waveform.set_exception(e)
@@ -0,0 +1,296 @@
+"""
+Job queue: analysis that outlives the HTTP connection that asked for it.
+
+POST /api/jobs records a job in an SQLite file and returns its id; worker
+processes claim queued jobs, run Process and append every stream message
+(the same ones /api/process-audio sends) to the job's event log. Readers of
+GET /api/jobs/{id}/stream replay the log and then tail it, so a client that
+reconnects picks up after the last chunk it saw.
+
+The web app starts JOB_WORKERS worker processes itself; set it to 0 and run
+    python jobs.py --workers N
+to scale workers separately from the web tier (same JOBS_PATH).
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import logconfig
+import startup
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("complete", "error")
+
+
+class QueueFull(Exception):
+    """Raised by enqueue when JOB_QUEUE_LIMIT jobs are already waiting."""
+
+
+class JobStore:
+    """Jobs and their event logs in one SQLite file, shared by the web app and the workers."""
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, audio_url TEXT NOT NULL, status TEXT NOT NULL, error TEXT, worker TEXT, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat_at REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_url ON jobs (audio_url, created_at)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS job_events ("
+                "job_id TEXT NOT NULL, seq INTEGER NOT NULL, message TEXT NOT NULL, PRIMARY KEY (job_id, seq))"
+            )
+
+    def enqueue(self, audio_url, max_queued=None):
+        """
+        (job, created): the queued or running job for `audio_url` if there is
+        one, or one that completed less than IMAGE_URL_TTL_SECONDS ago (its image
+        URLs still work), else a new queued job. Failed and older jobs are not
+        reused; a rerun of an unchanged track replays from the ResultCache.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._purge(now - settings.JOB_TTL_SECONDS)
+                existing = self._db.execute(
+                    "SELECT * FROM jobs WHERE audio_url = ? AND (status IN ('queued', 'running') "
+                    "OR (status = 'complete' AND finished_at >= ?)) ORDER BY created_at DESC LIMIT 1",
+                    (audio_url, now - settings.IMAGE_URL_TTL_SECONDS),
+                ).fetchone()
+                if existing is not None:
+                    self._db.execute("COMMIT")
+                    return dict(existing), False
+                if max_queued is not None:
+                    queued = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                    if queued >= max_queued:
+                        raise QueueFull(f"{queued} jobs already queued")
+                job_id = uuid.uuid4().hex
+                self._db.execute(
+                    "INSERT INTO jobs (id, audio_url, status, created_at) VALUES (?, ?, 'queued', ?)",
+                    (job_id, audio_url, now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(job_id), True
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def queue_depth(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def claim(self, worker, stale_after):
+        """Oldest queued job (or a running one whose worker stopped heartbeating), now owned by `worker`."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' OR (status = 'running' AND heartbeat_at < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now - stale_after,),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ? WHERE id = ?",
+                        (worker, now, now, row["id"]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return dict(row, status="running", worker=worker) if row is not None else None
+
+    def heartbeat(self, job_id):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def append(self, job_id, message):
+        """Add `message` to the job's event log"""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO job_events (job_id, seq, message) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ? FROM job_events WHERE job_id = ?",
+                (job_id, json.dumps(message), job_id),
+            )
+            self._db.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def finish(self, job_id, status, error=None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def events(self, job_id, after=0):
+        """[(seq, message)] of the job's events after `after`"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, message FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after),
+            ).fetchall()
+        return [(seq, json.loads(message)) for seq, message in rows]
+
+    def _purge(self, before):
+        old = "SELECT id FROM jobs WHERE finished_at < ?"
+        self._db.execute(f"DELETE FROM job_events WHERE job_id IN ({old})", (before,))
+        self._db.execute("DELETE FROM jobs WHERE finished_at < ?", (before,))
+
+
+class EventFilter:
+    """
+    Turns a job's event log into a clean stream for one reader: chunks at or
+    before `from_chunk` are skipped, and so are messages repeated by a worker
+    that picked the job up again after a crash.
+    """
+
+    def __init__(self, from_chunk=0):
+        self.last_chunk = from_chunk
+        self.seen = set()
+
+    def accept(self, message):
+        status = message["status"]
+        if status == "processing_chunk":
+            if message["chunk_number"] <= self.last_chunk:
+                return False
+            self.last_chunk = message["chunk_number"]
+            return True
+        if status in self.seen:
+            return False
+        self.seen.add(status)
+        return True
+
+
+def run_job(store, job):
+    """Run Process for `job`, appending its stream messages to the store."""
+    from cache import get_cache, get_emotion_memo, get_image_memo
+    from clients import get_clients
+    from payload import chunk_message
+    from Process import Process
+
+    job_id, audio_url = job["id"], job["audio_url"]
+    stop = threading.Event()
+
+    def heartbeat():
+        # Loading and whole-track features can go a while without a new event
+        while not stop.wait(settings.JOB_STALE_SECONDS / 4):
+            store.heartbeat(job_id)
+
+    threading.Thread(target=heartbeat, name="job-heartbeat", daemon=True).start()
+    try:
+        store.append(job_id, {"status": "starting", "progress": 0})
+        # The worker process is the unit of DSP parallelism, so librosa runs in-process
+        p = Process(
+            audio_url,
+            cache=get_cache(),
+            emotion_memo=get_emotion_memo(),
+            image_memo=get_image_memo(),
+            clients=get_clients(),
+        )
+        store.append(job_id, {"status": "loading_audio", "progress": 5})
+        waveform = p.load_and_calculate_waveform()
+        # Waveforms are stored as frames and encoded per reader (see payload.py)
+        progress = 10
+        if not p.streaming:
+            store.append(job_id, {"status": "waveform_ready", "progress": progress, "waveform": waveform})
+        for chunk_result in p.process_waveform():
+            if "error" in chunk_result:
+                raise RuntimeError(chunk_result["error"])
+            if "waveform" in chunk_result:
+                store.append(job_id, {"status": "waveform_ready", "progress": progress, "waveform": chunk_result["waveform"]})
+                continue
+            message = chunk_message(chunk_result, audio_url)
+            progress = message["progress"]
+            store.append(job_id, message)
+        store.append(job_id, {"status": "complete", "progress": 100})
+        store.finish(job_id, "complete")
+    except Exception as e:
+        logger.warning("Job %s failed: %s", job_id, e, extra={"job": job_id})
+        store.append(job_id, {"status": "error", "message": str(e)})
+        store.finish(job_id, "error", str(e))
+    finally:
+        stop.set()
+
+
+def worker_main(stop=None, path=None):
+    """Claim and run jobs one at a time until `stop` (a multiprocessing.Event) is set."""
+    logconfig.configure()
+    startup.configure_numba()
+    store = JobStore(path or settings.JOBS_PATH)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    if settings.WARMUP:
+        logger.info("Worker %s warmed up in %.2fs", worker, startup.warm_up())
+    logger.info("Worker %s started", worker)
+    try:
+        while stop is None or not stop.is_set():
+            job = store.claim(worker, settings.JOB_STALE_SECONDS)
+            if job is None:
+                time.sleep(settings.JOB_POLL_SECONDS)
+                continue
+            logger.info("Worker %s running job %s (%s)", worker, job["id"], job["audio_url"], extra={"job": job["id"]})
+            run_job(store, job)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        from clients import close_clients
+        close_clients()
+
+
+def start_workers(count):
+    """Start `count` worker processes; returns (processes, stop event)."""
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    workers = [
+        context.Process(target=worker_main, args=(stop,), name=f"job-worker-{i}", daemon=True)
+        for i in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    return workers, stop
+
+
+def stop_workers(workers, stop, timeout=5.0):
+    """Ask workers to finish after their current job, terminating any that don't within `timeout`."""
+    stop.set()
+    deadline = time.monotonic() + timeout
+    for worker in workers:
+        worker.join(max(0.0, deadline - time.monotonic()))
+        if worker.is_alive():
+            worker.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run job queue workers")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes to run")
+    args = parser.parse_args()
+    if args.workers == 1:
+        worker_main()
+    else:
+        processes, stop_event = start_workers(args.workers)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            stop_workers(processes, stop_event)
@@ -0,0 +1,41 @@
+"""
+Logging setup: leveled stdlib logging, as text or one JSON object per line.
+
+Modules log through `logging.getLogger(__name__)` with %-style arguments, so
+a message below LOG_LEVEL is dropped before it is formatted. Fields passed
+via `extra=` (chunk, job, url, ...) become top-level keys in JSON output.
+"""
+
+import json
+import logging
+
+from config import settings
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _STANDARD})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure(level=None, fmt=None):
+    """Install the root handler; safe to call more than once (e.g. in spawned workers)."""
+    handler = logging.StreamHandler()
+    if (fmt or settings.LOG_FORMAT) == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s [%(name)s] %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel((level or settings.LOG_LEVEL).upper())
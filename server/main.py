@@ -1,17 +1,62 @@
-from fastapi import FastAPI, HTTPException
+import startup  # first, so the boot time it reports includes the imports below
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Literal, Optional
 import uvicorn
 import os
 import json
 import asyncio
+import logging
+import time
+from contextlib import aclosing, asynccontextmanager
+from functools import partial
 from urllib.parse import urlparse
-from Process import Process
+import batch
+import executor
+from cache import get_cache, get_emotion_memo, get_image_memo
+from payload import (
+    chunk_message,
+    negotiate_waveform_format,
+    waveform_message,
+    waveform_overview_message,
+)
+from clients import close_clients, get_clients
+from emotion_model import get_local_model
+from config import settings
+import jobs
+import logconfig
+import metrics
+import ratelimit
+
+logconfig.configure()
+startup.configure_numba()
+logger = logging.getLogger(__name__)
+startup.mark("import")
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled API clients shared by every request
+    began = time.perf_counter()
+    get_clients()
+    # Fails fast on a missing EMOTION_MODEL_PATH rather than on the first stream
+    get_local_model()
+    startup.mark("clients", began)
+    app.state.jobs = jobs.JobStore(settings.JOBS_PATH)
+    workers, stop_workers = jobs.start_workers(settings.JOB_WORKERS)
+    if settings.WARMUP:
+        # Imports and numba JIT now rather than on the first stream
+        await startup.warm_up_server(executor.get_dsp_pool(), settings.DSP_WORKERS)
+    startup.report()
+    yield
+    jobs.stop_workers(workers, stop_workers)
+    close_clients()
+    executor.shutdown()
 
 
-app = FastAPI(title="Audio Visualizer API")
+app = FastAPI(title="Audio Visualizer API", lifespan=lifespan)
 
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
 
@@ -27,56 +72,233 @@ ALLOWED_DOMAIN = "dsxcdn.adi.gg"
 
 class AudioProcessRequest(BaseModel):
     audio_url: str
+    # Opt-in compact waveform encoding (see payload.py); defaults to the Accept header, then "json"
+    waveform_format: Optional[Literal["json", "compact"]] = None
+    amplitude_bits: Literal[8, 16] = 8
+    # Adds per-stage seconds to each chunk message (and track stages to "complete")
+    include_timings: bool = False
+    # Coarse waveform_overview right after decode, ahead of waveform_ready (see payload.py)
+    progressive_waveform: bool = False
+
+class BatchRequest(BaseModel):
+    audio_urls: list[str]
+    # Each track's stream messages under "results"; otherwise just its summary line (results are cached either way)
+    include_results: bool = False
+    waveform_format: Optional[Literal["json", "compact"]] = None
+    amplitude_bits: Literal[8, 16] = 8
     
-async def process_audio_stream(audio_url: str):
+# /api/process-audio streams in progress (all on the event loop thread, so no lock)
+active_streams = 0
+
+def _cache_stats():
+    caches = {"result": get_cache(), "emotion_memo": get_emotion_memo(), "image_memo": get_image_memo()}
+    return {name: cache.stats() for name, cache in caches.items() if cache is not None}
+
+# Read at scrape time, so nothing is paid for them between scrapes
+metrics.Counter(
+    "audio_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"),
+    collect=lambda: {
+        (name, result): stats[key]
+        for name, stats in _cache_stats().items()
+        for result, key in (("hit", "hits"), ("miss", "misses"))
+    },
+)
+metrics.Gauge(
+    "audio_cache_hit_ratio", "Hits over lookups since start", ("cache",),
+    collect=lambda: {
+        (name,): round(stats["hits"] / max(1, stats["hits"] + stats["misses"]), 4)
+        for name, stats in _cache_stats().items()
+    },
+)
+metrics.Gauge("audio_active_streams", "/api/process-audio streams in progress", collect=lambda: {(): active_streams})
+metrics.Gauge(
+    "audio_api_waiting", "Calls queued for a rate-limit slot", ("provider",),
+    collect=lambda: {(name,): limit.waiting for name, limit in ratelimit.get_limits().items()},
+)
+metrics.Gauge(
+    "audio_job_queue_depth", "Jobs waiting for a worker",
+    collect=lambda: {(): app.state.jobs.queue_depth()},
+)
+metrics.Gauge(
+    "audio_startup_seconds", "Seconds each startup phase took (import, clients, warmup, warmup_pool, total)", ("phase",),
+    collect=lambda: {(phase,): seconds for phase, seconds in startup.timings.items()},
+)
+
+async def process_audio_stream(
+    audio_url: str,
+    waveform_format: str = "json",
+    amplitude_bits: int = 8,
+    include_timings: bool = False,
+    progressive_waveform: bool = False,
+):
     """Generator function that yields processing updates for each chunk"""
+    outcome = "disconnected"
+    start = time.perf_counter()
     try:
         yield json.dumps({"status": "starting", "progress": 0}) + "\n"
         await asyncio.sleep(0.1)
         
-        p = Process(audio_url)
+        from Process import Process  # librosa and friends load with the first stream or the warm-up
+
+        p = Process(
+            audio_url,
+            dsp_executor=executor.get_dsp_pool(),
+            cache=get_cache(),
+            emotion_memo=get_emotion_memo(),
+            image_memo=get_image_memo(),
+            clients=get_clients(),
+        )
         
         yield json.dumps({"status": "loading_audio", "progress": 5}) + "\n"
         await asyncio.sleep(0.1)
         
-        # Load audio and calculate full waveform upfront
-        waveform_data = p.load_and_calculate_waveform()
-        
-        yield json.dumps({
-            "status": "waveform_ready",
-            "progress": 10,
-            "waveform": waveform_data
-        }) + "\n"
-        await asyncio.sleep(0.1)
-        
-        for chunk_result in p.process_waveform():
-            if "error" in chunk_result:
-                yield json.dumps({"status": "error", "message": chunk_result["error"]}) + "\n"
-                return
+        if progressive_waveform:
+            # Something to draw within milliseconds of decode, the detailed frames once they're ready
+            async with aclosing(executor.iterate_in_thread(p.load_waveform_progressively)) as updates:
+                async for update in updates:
+                    if "overview" in update:
+                        message = waveform_overview_message(update["overview"], 7, waveform_format, amplitude_bits)
+                    else:
+                        message = waveform_message(update["waveform"], 10, waveform_format, amplitude_bits)
+                    yield json.dumps(message) + "\n"
+        else:
+            # Load audio and calculate full waveform upfront (off the event loop)
+            waveform_data = await executor.run_io(p.load_and_calculate_waveform)
             
-            progress = 10 + (chunk_result["chunk_number"] / chunk_result["total_chunks"]) * 90
+            # With streaming ingest the waveform arrives from inside the chunk stream instead
+            if not p.streaming:
+                yield json.dumps(waveform_message(waveform_data, 10, waveform_format, amplitude_bits)) + "\n"
+                await asyncio.sleep(0.1)
+        
+        progress = 10
+        # Chunks are computed on the executor and handed over through a bounded queue;
+        # closing the stream (client disconnect) stops the producer
+        async with aclosing(executor.iterate_in_thread(p.process_waveform)) as chunk_results:
+            async for chunk_result in chunk_results:
+                if "error" in chunk_result:
+                    outcome = "error"
+                    yield json.dumps({"status": "error", "message": chunk_result["error"]}) + "\n"
+                    return
+                if "waveform" in chunk_result:
+                    yield json.dumps(waveform_message(chunk_result["waveform"], progress, waveform_format, amplitude_bits)) + "\n"
+                    continue
             
-            result = {
-                "status": "processing_chunk",
-                "progress": int(progress),
-                "chunk_number": chunk_result["chunk_number"],
-                "total_chunks": chunk_result["total_chunks"],
-                "data": {
-                    "energy": chunk_result["energy"],
-                    "tempo": chunk_result["tempo"],
-                    "key": chunk_result["key"],
-                    "emotion": chunk_result["emotion"],
-                    "image_url": chunk_result["image_url"],
-                    "audio_url": audio_url
-                }
-            }
-            yield json.dumps(result) + "\n"
-            await asyncio.sleep(0.1)
+                result = chunk_message(chunk_result, audio_url, include_timings)
+                progress = result["progress"]
+                yield json.dumps(result) + "\n"
+                await asyncio.sleep(0.1)
         
-        yield json.dumps({"status": "complete", "progress": 100}) + "\n"
+        complete = {"status": "complete", "progress": 100}
+        if include_timings:
+            complete["timings"] = p.timings
+        outcome = "complete"
+        yield json.dumps(complete) + "\n"
         
     except Exception as e:
+        outcome = "error"
+        logger.exception("Stream for %s failed", audio_url)
         yield json.dumps({"status": "error", "message": str(e)}) + "\n"
+    finally:
+        metrics.STREAMS.inc(outcome=outcome)
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="request")
+
+async def batch_stream(audio_urls: list[str], include_results: bool, waveform_format: str, amplitude_bits: int):
+    """
+    One line per track as it finishes (in finishing order, with its "index"), then the throughput summary
+    """
+    outcome = "disconnected"
+    summary = batch.BatchSummary()
+    try:
+        yield json.dumps({"status": "starting", "tracks": len(audio_urls), "progress": 0}) + "\n"
+        run = partial(batch.run_batch, audio_urls, settings.BATCH_CONCURRENCY)
+        async with aclosing(executor.iterate_in_thread(run)) as tracks:
+            async for index, record, messages in tracks:
+                summary.add(record)
+                line = {"index": index, **record, "progress": round(100 * summary.tracks / len(audio_urls))}
+                if include_results:
+                    line["results"] = batch.encode_messages(messages, waveform_format, amplitude_bits)
+                yield json.dumps(line) + "\n"
+        outcome = "complete"
+        yield json.dumps(summary.summary()) + "\n"
+    except Exception as e:
+        outcome = "error"
+        logger.exception("Batch of %d tracks failed", len(audio_urls))
+        yield json.dumps({"status": "error", "message": str(e)}) + "\n"
+    finally:
+        metrics.STREAMS.inc(outcome=outcome)
+
+class StreamSlot:
+    """One admitted stream's place in active_streams; release() gives it back once, however often it's called"""
+
+    def __init__(self):
+        self.released = False
+
+    def release(self):
+        global active_streams
+        if not self.released:
+            self.released = True
+            active_streams -= 1
+
+def admit_stream():
+    """
+    A StreamSlot if the box has room, else None. Checked and taken with no await
+    in between, so two requests can't both get the last slot.
+    """
+    global active_streams
+    if active_streams >= settings.MAX_ACTIVE_STREAMS or ratelimit.overloaded():
+        metrics.STREAMS.inc(outcome="rejected")
+        return None
+    active_streams += 1
+    return StreamSlot()
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that releases its stream's slot when the response ends,
+    however it ends. The body generator's finally can't do it: when the client
+    disconnects before Starlette asks for the first chunk, the generator never
+    starts, so its finally never runs.
+    """
+
+    def __init__(self, content, slot, **kwargs):
+        super().__init__(content, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.slot.release()
+
+def server_busy():
+    """503 for new work while the box is saturated; clients should retry after a pause"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, try again shortly"},
+        headers={"Retry-After": str(max(1, int(settings.API_RETRY_MAX / 3)))},
+    )
+
+async def job_stream(store: jobs.JobStore, job_id: str, from_chunk: int, waveform_format: str, amplitude_bits: int):
+    """Replay a job's messages after chunk `from_chunk`, then follow the job until it finishes"""
+    seen = jobs.EventFilter(from_chunk)
+    after = 0
+    while True:
+        # Status first: a job seen as finished has all its events stored already
+        job = await executor.run_io(store.get, job_id)
+        events = await executor.run_io(store.events, job_id, after)
+        for after, message in events:
+            if not seen.accept(message):
+                continue
+            if message["status"] == "waveform_ready":
+                message = waveform_message(message["waveform"], message["progress"], waveform_format, amplitude_bits)
+            yield json.dumps(message) + "\n"
+            if message["status"] in jobs.FINISHED:
+                return
+        if job is None or job["status"] in jobs.FINISHED:
+            if job is None or job["status"] == "error":
+                yield json.dumps({"status": "error", "message": (job or {}).get("error") or "Job not found"}) + "\n"
+            return
+        await asyncio.sleep(settings.JOB_POLL_SECONDS)
+
 @app.get("/")
 def read_root():
     return {"message": "Audio Visualizer API", "status": "running"}
@@ -85,21 +307,91 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/replicate-webhook")
+async def replicate_webhook(request: Request):
+    # Only wakes the waiting prediction, which re-reads its status from the Replicate API
+    prediction = await request.json()
+    if isinstance(prediction, dict) and isinstance(prediction.get("id"), str):
+        get_clients().replicate.notify(prediction["id"])
+    return {"ok": True}
+
+def check_audio_url(audio_url: str):
+    if urlparse(audio_url).netloc != ALLOWED_DOMAIN:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Only URLs from {ALLOWED_DOMAIN} are allowed"
+        )
+
+@app.post("/api/jobs")
+async def create_job(request: AudioProcessRequest, raw_request: Request):
+    check_audio_url(request.audio_url)
+    store = raw_request.app.state.jobs
+    try:
+        job, created = await executor.run_io(store.enqueue, request.audio_url, settings.JOB_QUEUE_LIMIT)
+    except jobs.QueueFull:
+        return server_busy()
+    return {"job_id": job["id"], "status": job["status"], "deduplicated": not created}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, raw_request: Request):
+    job = await executor.run_io(raw_request.app.state.jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}/stream")
+async def stream_job(
+    job_id: str,
+    raw_request: Request,
+    from_chunk: int = 0,
+    waveform_format: Optional[Literal["json", "compact"]] = None,
+    amplitude_bits: Literal[8, 16] = 8,
+    accept: Optional[str] = Header(default=None),
+):
+    """Replays the job's stream, skipping chunks up to `from_chunk` (the last one a reconnecting client saw)"""
+    store = raw_request.app.state.jobs
+    if await executor.run_io(store.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    waveform_format = negotiate_waveform_format(waveform_format, accept)
+    return StreamingResponse(
+        job_stream(store, job_id, from_chunk, waveform_format, amplitude_bits),
+        media_type="application/x-ndjson",
+        headers={
+            "X-Waveform-Format": waveform_format,
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "Connection": "keep-alive",
+        }
+    )
+
 @app.post("/api/process-audio")
-async def process_audio(request: AudioProcessRequest):
+async def process_audio(request: AudioProcessRequest, accept: Optional[str] = Header(default=None)):
     try:
-        parsed_url = urlparse(request.audio_url)
+        check_audio_url(request.audio_url)
         
-        if parsed_url.netloc != ALLOWED_DOMAIN:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Only URLs from {ALLOWED_DOMAIN} are allowed"
-            )
+        waveform_format = negotiate_waveform_format(request.waveform_format, accept)
         
-        return StreamingResponse(
-            process_audio_stream(request.audio_url),
+        # Admission control: turn new streams away fast instead of letting every stream stall
+        slot = admit_stream()
+        if slot is None:
+            return server_busy()
+        
+        return AdmittedStreamingResponse(
+            process_audio_stream(
+                request.audio_url,
+                waveform_format,
+                request.amplitude_bits,
+                request.include_timings,
+                request.progressive_waveform,
+            ),
+            slot,
             media_type="application/x-ndjson",  # Newline-delimited JSON
             headers={
+                "X-Waveform-Format": waveform_format,
                 "Cache-Control": "no-cache",
                 "X-Accel-Buffering": "no",  # Disable nginx buffering
                 "Connection": "keep-alive",
@@ -111,6 +403,32 @@ async def process_audio(request: AudioProcessRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing audio: {str(e)}")
 
+@app.post("/api/batch")
+async def process_batch(request: BatchRequest, accept: Optional[str] = Header(default=None)):
+    """Analyse many tracks on the shared DSP pool (see batch.py); results also fill the cache for later plays"""
+    if not request.audio_urls:
+        raise HTTPException(status_code=400, detail="No audio_urls given")
+    if len(request.audio_urls) > settings.BATCH_MAX_TRACKS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_TRACKS} tracks per batch")
+    for audio_url in request.audio_urls:
+        check_audio_url(audio_url)
+    waveform_format = negotiate_waveform_format(request.waveform_format, accept)
+    # Counts as one stream against admission control; BATCH_CONCURRENCY bounds the tracks it runs at once
+    slot = admit_stream()
+    if slot is None:
+        return server_busy()
+    return AdmittedStreamingResponse(
+        batch_stream(request.audio_urls, request.include_results, waveform_format, request.amplitude_bits),
+        slot,
+        media_type="application/x-ndjson",
+        headers={
+            "X-Waveform-Format": waveform_format,
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "Connection": "keep-alive",
+        }
+    )
+
 
 if __name__ == "__main__":
     port = int(os.getenv("PYTHON_PORT", "8000"))
@@ -0,0 +1,155 @@
+"""
+Process-wide metrics in the Prometheus text format, served on /metrics.
+
+Only the handful of metric types the server needs: counters, histograms and
+gauges whose value is read from a callback at scrape time (cache stats,
+queue depth). Everything is thread-safe and cheap enough to record on every
+chunk. `timed` measures a block into the stage histogram and, optionally,
+into a dict that ends up in the chunk's NDJSON message.
+"""
+
+import contextlib
+import threading
+import time
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60, 120)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Counter, or one whose samples come from `collect() -> {label values tuple: value}`"""
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+        self._collect = collect
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = dict(self._values)
+        if self._collect is not None:
+            try:
+                items.update(self._collect())
+            except Exception:
+                pass  # a broken source shouldn't take /metrics down
+        return [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in items.items()]
+
+
+class Gauge(Counter):
+    """Set/inc/dec gauge, or one whose samples come from `collect() -> {label values tuple: value}`"""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(entry)) for key, entry in self._values.items()]
+        lines = []
+        names = self.labelnames + ("le",)
+        for key, entry in items:
+            for bound, count in zip(self.buckets, entry):
+                lines.append(f"{self.name}_bucket{_labels(names, key + (bound,))} {count}")
+            lines.append(f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {entry[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {entry[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {entry[-1]}")
+        return lines
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+STAGE_SECONDS = Histogram("audio_stage_seconds", "Time spent per processing stage", ("stage",))
+CHUNKS = Counter("audio_chunks_total", "Chunks processed", ("source",))
+EMOTIONS = Counter("audio_emotions_total", "Chunk emotions by where they came from (gpt, local, memo, unavailable)", ("source",))
+STREAMS = Counter("audio_streams_total", "Processing streams finished", ("outcome",))
+IN_FLIGHT = Gauge("audio_stage_in_flight", "Chunks currently inside each pipeline stage", ("stage",))
+
+
+@contextlib.contextmanager
+def timed(stage, timings=None):
+    """Record the block's duration under `stage`, and in `timings[stage]` if given"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if timings is not None:
+            timings[stage] = round(elapsed, 4)
+
+
+def observe_stages(timings, prefix=""):
+    """Record durations measured elsewhere (e.g. in a DSP worker process)"""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, stage=prefix + stage)
@@ -0,0 +1,166 @@
+"""
+Messages of the NDJSON stream, shared by /api/process-audio and job streams.
+
+The waveform in `waveform_ready` messages has two wire encodings.
+
+"json" is the original list of {"time", "amplitude", "color"} dicts and stays
+the default. "compact" is opt-in and columnar:
+
+    {
+      "format": "compact",
+      "count": 4307,
+      "time_start": 0.0, "time_step": 0.0697,      # frames are evenly spaced
+      "amplitude_bits": 8,                         # or 16
+      "amplitude_scale": 0.41,                     # amplitude = q / (2**bits - 1) * scale
+      "amplitude": "<base64 of little-endian uint8/uint16>",
+      "palette": ["#ffe600", ...],
+      "color_runs": [[palette_index, run_length], ...]
+    }
+
+Colors are constant across 30-frame blocks, so the runs are short lists. If
+the frames are ever unevenly spaced, "time" carries the explicit times and
+time_start/time_step are omitted.
+
+With `progressive_waveform`, `waveform_ready` is preceded by a coarse
+`waveform_overview` of the whole track, sent right after decode, in the same
+encodings. `waveform_ready` replaces it.
+"""
+
+import base64
+
+import numpy as np
+
+WAVEFORM_FORMATS = ("json", "compact")
+AMPLITUDE_BITS = (8, 16)
+
+
+def waveform_message(frames, progress, fmt="json", amplitude_bits=8):
+    return {"status": "waveform_ready", "progress": int(progress), "waveform": encode_waveform(frames, fmt, amplitude_bits)}
+
+
+def waveform_overview_message(frames, progress, fmt="json", amplitude_bits=8):
+    return {"status": "waveform_overview", "progress": int(progress), "waveform": encode_waveform(frames, fmt, amplitude_bits)}
+
+
+
+def chunk_message(chunk_result, audio_url, include_timings=False):
+    """
+    `processing_chunk` message for one Process.process_waveform result; with
+    `include_timings`, adds the chunk's per-stage seconds (absent for replayed chunks)
+    """
+    progress = 10 + (chunk_result["chunk_number"] / chunk_result["total_chunks"]) * 90
+    message = {
+        "status": "processing_chunk",
+        "progress": int(progress),
+        "chunk_number": chunk_result["chunk_number"],
+        "total_chunks": chunk_result["total_chunks"],
+        "data": {
+            "energy": chunk_result["energy"],
+            "tempo": chunk_result["tempo"],
+            "key": chunk_result["key"],
+            "emotion": chunk_result["emotion"],
+            "image_url": chunk_result["image_url"],
+            "audio_url": audio_url
+        }
+    }
+    # Chunk boundaries vary with CHUNKING="adaptive"; replays of older results lack them
+    for field in ("start_time", "end_time"):
+        if field in chunk_result:
+            message["data"][field] = chunk_result[field]
+    if "key_confidence" in chunk_result:
+        message["data"]["key_confidence"] = chunk_result["key_confidence"]
+    if include_timings and chunk_result.get("timings"):
+        message["timings"] = chunk_result["timings"]
+    return message
+
+
+def negotiate_waveform_format(requested=None, accept=None):
+    """
+    Waveform format for a request: the explicit request field if given, else a
+    `waveform=` parameter on the Accept header
+    (e.g. "application/x-ndjson; waveform=compact"), else "json".
+    """
+    if requested:
+        return requested
+    for media_range in (accept or "").split(","):
+        for param in media_range.split(";")[1:]:
+            name, _, value = param.partition("=")
+            value = value.strip().strip('"').lower()
+            if name.strip().lower() == "waveform" and value in WAVEFORM_FORMATS:
+                return value
+    return "json"
+
+
+def encode_waveform(frames, fmt="json", amplitude_bits=8):
+    """`frames` as they go on the wire in format `fmt`."""
+    if fmt == "json":
+        return frames
+    if fmt != "compact":
+        raise ValueError(f"Unknown waveform format {fmt!r}")
+    if amplitude_bits not in AMPLITUDE_BITS:
+        raise ValueError(f"amplitude_bits must be one of {AMPLITUDE_BITS}")
+
+    times = np.fromiter((f["time"] for f in frames), dtype=np.float64, count=len(frames))
+    amplitudes = np.fromiter((f["amplitude"] for f in frames), dtype=np.float64, count=len(frames))
+    payload = {"format": "compact", "count": len(frames)}
+    payload.update(_encode_times(times))
+    payload.update(_encode_amplitudes(amplitudes, amplitude_bits))
+    payload.update(_encode_colors([f["color"] for f in frames]))
+    return payload
+
+
+def decode_waveform(payload):
+    """
+    Frames back from encode_waveform's output, as the web client decodes them
+    (src/lib/waveform.ts); e.g. for batch output files written with --waveform-format compact
+    """
+    if isinstance(payload, list):
+        return payload
+    dtype = "<u1" if payload["amplitude_bits"] == 8 else "<u2"
+    quantized = np.frombuffer(base64.b64decode(payload["amplitude"]), dtype=dtype)
+    amplitudes = quantized / ((1 << payload["amplitude_bits"]) - 1) * payload["amplitude_scale"]
+    if "time" in payload:
+        times = payload["time"]
+    else:
+        times = (payload["time_start"] + np.arange(payload["count"]) * payload["time_step"]).tolist()
+    colors = [payload["palette"][index] for index, length in payload["color_runs"] for _ in range(length)]
+    return [
+        {"time": time, "amplitude": amplitude, "color": color}
+        for time, amplitude, color in zip(times, amplitudes.tolist(), colors)
+    ]
+
+
+def _encode_times(times):
+    if len(times) < 2:
+        return {"time_start": float(times[0]) if len(times) else 0.0, "time_step": 0.0}
+    step = (times[-1] - times[0]) / (len(times) - 1)
+    if np.allclose(np.diff(times), step, rtol=1e-9, atol=1e-9):
+        return {"time_start": float(times[0]), "time_step": float(step)}
+    return {"time": times.tolist()}
+
+
+def _encode_amplitudes(amplitudes, bits):
+    levels = (1 << bits) - 1
+    scale = float(amplitudes.max()) if len(amplitudes) else 0.0
+    if scale > 0:
+        quantized = np.rint(np.clip(amplitudes / scale, 0, 1) * levels)
+    else:
+        quantized = np.zeros(len(amplitudes))
+    data = quantized.astype("<u1" if bits == 8 else "<u2").tobytes()
+    return {
+        "amplitude_bits": bits,
+        "amplitude_scale": scale,
+        "amplitude": base64.b64encode(data).decode("ascii"),
+    }
+
+
+def _encode_colors(colors):
+    palette = {}
+    runs = []
+    for color in colors:
+        index = palette.setdefault(color, len(palette))
+        if runs and runs[-1][0] == index:
+            runs[-1][1] += 1
+        else:
+            runs.append([index, 1])
+    return {"palette": list(palette), "color_runs": runs}
@@ -0,0 +1,156 @@
+"""
+Staged, order-preserving pipeline for per-chunk work.
+
+Each chunk walks through the stages one after another, but different chunks
+overlap: while chunk N+1 is in DSP, chunk N can be with GPT and chunk N-1 can
+be waiting on its image. Every stage has its own concurrency limit and
+results are handed back strictly in input order.
+"""
+
+import logging
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class Stage:
+    """One step of the pipeline: `fn(value) -> value`, at most `concurrency` at a time."""
+
+    def __init__(self, name, fn, concurrency=1):
+        if concurrency < 1:
+            raise ValueError(f"Stage {name!r} needs a concurrency of at least 1")
+        self.name = name
+        self.fn = fn
+        self.slots = threading.BoundedSemaphore(concurrency)
+
+    def __call__(self, value):
+        with self.slots:
+            IN_FLIGHT.inc(stage=self.name)
+            try:
+                return self.fn(value)
+            finally:
+                IN_FLIGHT.dec(stage=self.name)
+
+
+class StagedPipeline:
+    """
+    Runs items through `stages` with up to `window` items in flight.
+
+    `run` is a generator; closing it drops items that have not started yet.
+    """
+
+    def __init__(self, stages, window):
+        if window < 1:
+            raise ValueError("Pipeline window must be at least 1")
+        self.stages = list(stages)
+        self.window = window
+
+    def _run_item(self, value):
+        for stage in self.stages:
+            value = stage(value)
+        return value
+
+    def run(self, items):
+        """Yield the result of every item, in the order the items were given."""
+        workers = ThreadPoolExecutor(max_workers=self.window, thread_name_prefix="pipeline")
+        slots = threading.Semaphore(self.window)
+        submitted = queue.Queue()
+        stop = threading.Event()
+
+        def feed():
+            # Pulls items on its own thread, so a slow source (e.g. a download
+            # still in progress) never holds up results that are already done
+            try:
+                for item in items:
+                    while not slots.acquire(timeout=0.5):
+                        if stop.is_set():
+                            return
+                    if stop.is_set():
+                        return
+                    submitted.put(workers.submit(self._run_item, item))
+            except Exception as e:
+                submitted.put(e)
+            finally:
+                submitted.put(_END)
+
+        threading.Thread(target=feed, name="pipeline-feed", daemon=True).start()
+        try:
+            while True:
+                future = submitted.get()
+                if future is _END:
+                    return
+                if isinstance(future, Exception):
+                    raise future
+                result = future.result()
+                slots.release()
+                yield result
+        finally:
+            stop.set()
+            workers.shutdown(wait=False, cancel_futures=True)
+
+
+class Batcher:
+    """
+    Groups concurrent calls into batches: `batcher(item)` blocks until
+    `fn_batch(items) -> results` has run on a batch containing `item`.
+
+    A batch is sent as soon as it holds `max_size` items, or `max_latency`
+    seconds after its first item arrived. If the batch call fails, or returns
+    the wrong number of results, each item is retried on its own with
+    `fn_single(item)`.
+    """
+
+    def __init__(self, fn_batch, fn_single, max_size, max_latency):
+        if max_size < 1:
+            raise ValueError("Batch size must be at least 1")
+        self.fn_batch = fn_batch
+        self.fn_single = fn_single
+        self.max_size = max_size
+        self.max_latency = max_latency
+        self._cond = threading.Condition()
+        self._pending = []  # (item, future) pairs of the batch being filled
+
+    def __call__(self, item):
+        future = Future()
+        with self._cond:
+            batch = self._pending
+            batch.append((item, future))
+            if len(batch) >= self.max_size:
+                self._pending = []
+                self._cond.notify_all()
+            elif len(batch) == 1:
+                # The first caller sends the batch if it doesn't fill up in time
+                self._cond.wait_for(lambda: self._pending is not batch, timeout=self.max_latency)
+                if self._pending is batch:
+                    self._pending = []
+                else:
+                    batch = None  # filled up and sent by another caller
+            else:
+                batch = None
+        if batch is not None:
+            self._send(batch)
+        return future.result()
+
+    def _send(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = self.fn_batch(items) if len(items) > 1 else None
+            if results is not None and len(results) != len(items):
+                raise ValueError(f"Expected {len(items)} results, got {len(results)}")
+        except Exception as e:
+            logger.warning("Batch of %d failed (%s); falling back to single calls", len(items), e)
+            results = None
+        for i, (item, future) in enumerate(batch):
+            if results is not None:
+                future.set_result(results[i])
+                continue
+            try:
+                future.set_result(self.fn_single(item))
+            except Exception as e:
+                future.set_exception(e)
@@ -0,0 +1,267 @@
+"""
+Rate limiting for the external APIs (OpenAI, Replicate).
+
+Every call takes a slot from a process-wide cap shared by all providers, then
+from its provider's own concurrency limit and token bucket, so a burst of
+streams queues up here instead of fanning out into 429s. Coroutines take
+the same slots with async_slot, which waits without blocking the event loop.
+Calls that still fail with 429/5xx or a dropped connection are retried with
+exponential backoff and full jitter, or after the server's Retry-After; calls
+that must not run twice are only resent after a 429. When too many
+calls are already waiting, `overloaded()` tells the web tier to turn new
+streams away rather than let every stream crawl.
+"""
+
+import asyncio
+import contextlib
+import email.utils
+import logging
+import random
+import threading
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_limits = None
+_limits_lock = threading.Lock()
+
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+# Turned away before anything happened, so safe to resend even when the request isn't idempotent
+REJECTED_STATUS = (429,)
+SLOT_POLL_SECONDS = 0.05  # async_slot's wait between tries for a semaphore shared with threads
+
+
+class RateLimitTimeout(Exception):
+    """A call waited longer than API_WAIT_TIMEOUT for a slot."""
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take a token, waiting for one if needed; False if that would exceed `timeout`"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout=None):
+        """acquire for coroutines"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def _take(self):
+        """Take a token if there is one: 0, else the seconds until there will be"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+
+class ProviderLimit:
+    """Concurrency limit plus token bucket for one provider; also takes a slot of the shared cap."""
+
+    def __init__(self, name, rate, burst, concurrency, shared):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.shared = shared
+        self.waiting = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def slot(self, timeout=None):
+        timeout = settings.API_WAIT_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self.waiting += 1
+        acquired = []
+        try:
+            for semaphore in (self.shared, self.slots):
+                if not semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                    raise RateLimitTimeout(f"No {self.name} slot free after {timeout:.0f}s")
+                acquired.append(semaphore)
+            if not self.bucket.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise RateLimitTimeout(f"{self.name} rate limit: no token after {timeout:.0f}s")
+        except BaseException:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+            raise
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        try:
+            yield
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+
+    @contextlib.asynccontextmanager
+    async def async_slot(self, timeout=None, token=True):
+        """
+        slot() for coroutines, waiting with asyncio.sleep so the event loop keeps running;
+        without `token` only the concurrency limits apply, not the rate
+        """
+        timeout = settings.API_WAIT_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self.waiting += 1
+        acquired = []
+        try:
+            for semaphore in (self.shared, self.slots):
+                # Threads block on these semaphores too, so they are polled rather than awaited
+                while not semaphore.acquire(blocking=False):
+                    if time.monotonic() >= deadline:
+                        raise RateLimitTimeout(f"No {self.name} slot free after {timeout:.0f}s")
+                    await asyncio.sleep(SLOT_POLL_SECONDS)
+                acquired.append(semaphore)
+            if token and not await self.bucket.acquire_async(timeout=max(0.0, deadline - time.monotonic())):
+                raise RateLimitTimeout(f"{self.name} rate limit: no token after {timeout:.0f}s")
+        except BaseException:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+            raise
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        try:
+            yield
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+
+    def call(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) inside a slot, retried on rate limits and transient errors"""
+        def attempt():
+            with self.slot():
+                return fn(*args, **kwargs)
+        return call_with_retries(attempt)
+
+
+def _status_of(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    value = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None  # malformed: fall back to backoff
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def _is_transient(exc):
+    # Connection drops and timeouts from requests, httpx and the OpenAI SDK
+    name = type(exc).__name__
+    return isinstance(exc, (ConnectionError, TimeoutError)) or name in (
+        "APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout", "ConnectTimeout",
+        "RemoteProtocolError", "ReadError", "PoolTimeout",
+    )
+
+
+def retry_delay(exc, attempt, retry_on=RETRYABLE_STATUS, retry_transient=True):
+    """
+    Seconds to wait before retrying after `exc` on try number `attempt` (0-based), or None to give up.
+    Retries HTTP statuses in `retry_on`, and dropped connections and timeouts if `retry_transient`.
+    """
+    if attempt + 1 >= settings.API_RETRY_ATTEMPTS:
+        return None
+    status = _status_of(exc)
+    if status is not None and status not in retry_on:
+        return None
+    if status is None and not (retry_transient and _is_transient(exc)):
+        return None
+    retry_after = _retry_after(exc)
+    if retry_after is not None:
+        # A little jitter so clients told the same time don't all come back at once
+        return min(settings.API_RETRY_MAX, retry_after) + random.uniform(0, settings.API_RETRY_BASE)
+    return random.uniform(0, min(settings.API_RETRY_MAX, settings.API_RETRY_BASE * 2 ** attempt))
+
+
+def call_with_retries(fn, *args, **kwargs):
+    attempt = 0
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            delay = retry_delay(e, attempt)
+            if delay is None:
+                raise
+            logger.info("%s (status %s), retrying in %.1fs", type(e).__name__, _status_of(e), delay)
+            time.sleep(delay)
+            attempt += 1
+
+
+async def call_with_retries_async(fn, *args, retry_on=RETRYABLE_STATUS, retry_transient=True, **kwargs):
+    """
+    Async counterpart of call_with_retries for coroutine functions; `retry_on` and
+    `retry_transient` narrow the retries for calls that must not run twice (see retry_delay)
+    """
+    attempt = 0
+    while True:
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            delay = retry_delay(e, attempt, retry_on, retry_transient)
+            if delay is None:
+                raise
+            logger.info("%s (status %s), retrying in %.1fs", type(e).__name__, _status_of(e), delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def get_limits():
+    """Process-wide {"openai": ProviderLimit, "replicate": ProviderLimit}"""
+    global _limits
+    with _limits_lock:
+        if _limits is None:
+            shared = threading.BoundedSemaphore(settings.API_MAX_CONCURRENCY)
+            _limits = {
+                "openai": ProviderLimit(
+                    "openai", settings.OPENAI_RATE, settings.OPENAI_BURST, settings.OPENAI_CONCURRENCY, shared
+                ),
+                "replicate": ProviderLimit(
+                    "replicate", settings.REPLICATE_RATE, settings.REPLICATE_BURST, settings.REPLICATE_CONCURRENCY, shared
+                ),
+            }
+        return _limits
+
+
+def overloaded():
+    """True when so many calls are queued for a provider that new streams should be turned away"""
+    return any(limit.waiting >= settings.API_MAX_WAITING for limit in get_limits().values())
@@ -0,0 +1,142 @@
+"""
+Async client for Replicate predictions.
+
+All requests share one pooled httpx.AsyncClient on the executor's background
+loop (the application's instance lives in clients.Clients), and a semaphore caps predictions in flight across every stream. A
+prediction is created with `Prefer: wait`, so quick models return their
+output in the first response. Slower ones are then polled with exponential
+backoff, or woken early by Replicate's webhook when REPLICATE_WEBHOOK_URL
+points at /api/replicate-webhook. The webhook only says "look again": the
+status is always re-read from the API, so a forged call can't inject output.
+
+Each API request, not the whole prediction, takes a slot of the shared
+rate limit (ratelimit.ProviderLimit.async_slot), so slow predictions don't
+hold the API_MAX_CONCURRENCY budget while they wait; only creating a
+prediction spends a REPLICATE_RATE token. Polls are retried like any call,
+but the POST that creates a prediction is only resent after a 429: after a
+5xx or a dropped connection the prediction may already exist, and sending it
+again would pay for two.
+
+Point REPLICATE_API_URL at a local server to test against a fake Replicate.
+"""
+
+import asyncio
+import contextlib
+import time
+
+import httpx
+
+from ratelimit import REJECTED_STATUS, call_with_retries_async
+
+FINISHED = ("succeeded", "failed", "canceled")
+
+
+class ReplicateClient:
+    def __init__(self, token, base_url="https://api.replicate.com/v1", max_concurrency=8, wait_seconds=60,
+                 poll_initial=0.5, poll_max=5.0, timeout=120.0, webhook_url=None, retries=0, keepalive=30.0,
+                 limit=None):
+        self.base_url = base_url.rstrip("/")
+        self.wait_seconds = max(1, min(60, wait_seconds))  # Replicate accepts 1-60
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.timeout = timeout
+        self.webhook_url = webhook_url or None
+        self._headers = {"Authorization": f"Token {token}"}
+        self._http = None
+        self._slots = None
+        self._max_concurrency = max_concurrency
+        self._retries = retries  # reconnect attempts on connection errors
+        self._keepalive = keepalive
+        self._updates = {}  # prediction id -> asyncio.Event set by the webhook
+        self.limit = limit  # optional ratelimit.ProviderLimit whose slot every API request takes
+        self.loop = None
+
+    def _ensure_started(self):
+        # Created lazily so everything binds to the loop the client is used on
+        if self._http is None:
+            self.loop = asyncio.get_running_loop()
+            self._slots = asyncio.Semaphore(self._max_concurrency)
+            self._http = httpx.AsyncClient(
+                headers=self._headers,
+                timeout=httpx.Timeout(self.wait_seconds + 30.0, connect=10.0),
+                transport=httpx.AsyncHTTPTransport(
+                    retries=self._retries,
+                    limits=httpx.Limits(
+                        max_connections=self._max_concurrency,
+                        max_keepalive_connections=self._max_concurrency,
+                        keepalive_expiry=self._keepalive,
+                    ),
+                ),
+            )
+
+    async def predict(self, model, model_input):
+        """
+        Run `model` on `model_input` and return the prediction's output.
+        Raises RuntimeError if the prediction fails or TimeoutError after `timeout` seconds.
+        """
+        self._ensure_started()
+        async with self._slots:
+            deadline = time.monotonic() + self.timeout
+            body = {"input": model_input}
+            if self.webhook_url:
+                body["webhook"] = self.webhook_url
+                body["webhook_events_filter"] = ["completed"]
+            prediction = await self._request(
+                "POST",
+                f"{self.base_url}/models/{model}/predictions",
+                json=body,
+                headers={"Prefer": f"wait={self.wait_seconds}"},
+                create=True,
+            )
+            prediction_id = prediction["id"]
+            update = self._updates.setdefault(prediction_id, asyncio.Event())
+            try:
+                delay = self.poll_initial
+                while prediction["status"] not in FINISHED:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"Prediction {prediction_id} still {prediction['status']} after {self.timeout:.0f}s")
+                    try:
+                        await asyncio.wait_for(update.wait(), min(delay, remaining))
+                    except asyncio.TimeoutError:
+                        pass
+                    update.clear()
+                    delay = min(delay * 2, self.poll_max)
+                    prediction = await self._request(
+                        "GET", prediction.get("urls", {}).get("get") or f"{self.base_url}/predictions/{prediction_id}"
+                    )
+            finally:
+                self._updates.pop(prediction_id, None)
+
+        if prediction["status"] != "succeeded":
+            raise RuntimeError(f"Prediction {prediction_id} {prediction['status']}: {prediction.get('error')}")
+        return prediction["output"]
+
+    async def _request(self, method, url, create=False, **kwargs):
+        """
+        JSON body of one API request, retried on 429 (after Retry-After) and, unless it
+        `create`s a prediction, on 5xx and dropped connections
+        """
+        async def send():
+            async with self.limit.async_slot(token=create) if self.limit is not None else contextlib.nullcontext():
+                response = await self._http.request(method, url, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        if create:
+            return await call_with_retries_async(send, retry_on=REJECTED_STATUS, retry_transient=False)
+        return await call_with_retries_async(send)
+
+    def notify(self, prediction_id):
+        """Wake the waiter for `prediction_id` (webhook handler); safe to call from any thread."""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wake, prediction_id)
+
+    def _wake(self, prediction_id):
+        update = self._updates.get(prediction_id)
+        if update is not None:
+            update.set()
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
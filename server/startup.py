@@ -0,0 +1,105 @@
+"""
+Startup: boot timings and a DSP warm-up, so a freshly started worker serves
+its first stream at steady-state latency.
+
+librosa loads scipy, numba and its own submodules lazily and numba compiles
+kernels on first call, which would otherwise land on the first request
+(seconds with a warm numba cache, tens of seconds without). `warm_up` runs
+every kernel the pipeline uses once on a few seconds of synthetic audio; the
+web app runs it in-process and on every DSP pool worker before it starts
+serving, and job workers run it before claiming jobs. With NUMBA_CACHE_DIR
+on a persistent volume, compiled kernels survive restarts and new replicas.
+"""
+
+import asyncio
+import importlib
+import io
+import logging
+import os
+import time
+
+import executor
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+STARTED = time.perf_counter()
+WARMUP_SECONDS = 4.0
+WARMUP_SR = 22050
+
+timings = {}  # startup phase -> seconds, for the log and /metrics
+
+
+def configure_numba():
+    """Point numba's kernel cache at NUMBA_CACHE_DIR; must run before numba is imported"""
+    if settings.NUMBA_CACHE_DIR:
+        # Also inherited by spawned DSP pool and job worker processes
+        os.environ.setdefault("NUMBA_CACHE_DIR", settings.NUMBA_CACHE_DIR)
+
+
+def mark(phase, since=None):
+    """Record seconds from `since` (default: process start-up) to now as `phase`"""
+    timings[phase] = round(time.perf_counter() - (STARTED if since is None else since), 4)
+    return timings[phase]
+
+
+def warm_up():
+    """Run every DSP kernel of the pipeline once on synthetic audio; returns the seconds it took"""
+    start = time.perf_counter()
+    import librosa
+    import numpy as np
+    import soundfile as sf
+
+    import dsp
+
+    sr = WARMUP_SR
+    t = np.arange(int(WARMUP_SECONDS * sr)) / sr
+    rng = np.random.default_rng(0)
+    y = 0.3 * np.sin(2 * np.pi * 220.0 * t) + 0.05 * rng.standard_normal(len(t))
+    y[::sr // 2] += 0.5  # clicks, so onset and tempo code paths see beats
+    y = y.astype(np.float32)
+
+    # Decode and resampling (Process._load_audio, ingest)
+    buffer = io.BytesIO()
+    sf.write(buffer, y, sr, format="WAV", subtype="PCM_16")
+    buffer.seek(0)
+    librosa.load(buffer, sr=None, dtype=np.float32)
+    dsp.resample(y, sr, sr // 2, settings.RESAMPLE_QUALITY)
+
+    # Waveform, overview and adaptive chunking
+    _, rms, spec_centroid = dsp.waveform_analysis(y, sr)
+    dsp.waveform_overview(y, sr, settings.WAVEFORM_OVERVIEW_FRAMES, settings.WAVEFORM_OVERVIEW_SR)
+    dsp.novelty_segments(rms, spec_centroid, WARMUP_SECONDS, 1.0, 2.0)
+
+    # Both feature modes
+    dsp.analyse_chunk(y, sr, settings.KEY_CHROMA, settings.KEY_CONFIDENCE)
+    features = dsp.track_features(y, sr, chroma_backend=settings.KEY_CHROMA)
+    features.chunk_features(0, len(y), settings.KEY_CONFIDENCE, settings.TEMPO_PRIOR_OCTAVES)
+    return time.perf_counter() - start
+
+
+async def warm_up_server(pool=None, workers=0):
+    """
+    warm_up in this process and on `workers` processes of `pool` at once, off
+    the event loop; records "warmup" and "warmup_pool" in `timings`
+    """
+    async def here():
+        start = time.perf_counter()
+        # The web path's own modules too, so the first stream doesn't import them on the event loop
+        await executor.run_io(importlib.import_module, "Process")
+        await executor.run_io(warm_up)
+        mark("warmup", start)
+
+    async def on_pool():
+        # All submitted at once, so the pool starts a process for each instead of reusing an idle one
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(asyncio.wrap_future(pool.submit(warm_up), loop=loop) for _ in range(workers)))
+        mark("warmup_pool", start)
+
+    await asyncio.gather(here(), *([on_pool()] if pool is not None and workers > 0 else []))
+
+
+def report():
+    logger.info("Started in %.2fs (%s)", mark("total"),
+                ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items() if phase != "total"))
@@ -0,0 +1,8 @@
+"""Tests import the server modules from the parent directory, with placeholder API keys."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("REPLICATE_API_TOKEN", "test")
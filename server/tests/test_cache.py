@@ -0,0 +1,102 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import cache
+from cache import ResultCache, content_hash, make_key
+
+
+class Clock:
+    """Stands in for time.time inside cache.py"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+def test_make_key_is_stable_and_order_independent():
+    assert make_key("track", "abc", {"a": 1, "b": 2}) == make_key("track", "abc", {"b": 2, "a": 1})
+    assert make_key("track", "abc", {"a": 1}) != make_key("chunk", "abc", {"a": 1})
+    assert make_key("track", "abc", {"a": 1}) != make_key("track", "abc", {"a": 2})
+    assert make_key("chunk", "abc", None) != make_key("chunk", "abc", "track-key")
+
+
+def test_content_hash_covers_bytes_and_arrays():
+    samples = np.arange(8, dtype=np.float32)
+    assert content_hash(samples) == content_hash(samples.tobytes())
+    assert content_hash(samples) != content_hash(samples[::-1].copy())
+
+
+def test_memory_entries_expire_after_ttl(clock):
+    results = ResultCache(ttl=60)
+    results.set("k", {"v": 1})
+    clock.now += 59
+    assert results.get("k") == {"v": 1}
+    clock.now += 2
+    assert results.get("k") is None
+    assert results.stats()["hits"] == 1
+    assert results.stats()["misses"] == 1
+
+
+def test_memory_is_an_lru():
+    results = ResultCache(memory_entries=2)
+    results.set("a", 1)
+    results.set("b", 2)
+    results.get("a")
+    results.set("c", 3)
+    assert results.get("b") is None
+    assert results.get("a") == 1
+    assert results.get("c") == 3
+
+
+def test_sqlite_entries_survive_a_new_instance_until_they_expire(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    ResultCache(path, ttl=60).set("k", [1, 2, 3])
+    assert ResultCache(path, ttl=60).get("k") == [1, 2, 3]
+    clock.now += 61
+    assert ResultCache(path, ttl=60).get("k") is None
+
+
+def test_sqlite_is_trimmed_to_max_bytes_by_least_recent_access(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    results = ResultCache(path, memory_entries=0, max_bytes=250)  # room for two 102-byte values
+    results.set("a", "x" * 100)
+    clock.now += 1
+    results.set("b", "x" * 100)
+    clock.now += 1
+    assert results.get("a") is not None
+    clock.now += 1
+    results.set("c", "x" * 100)
+    assert results.get("b") is None
+    assert results.get("a") is not None
+    assert results.get("c") is not None
+
+
+def test_sqlite_runs_in_wal_mode(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    ResultCache(path)
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_write_blocked_by_another_process_is_logged_and_kept_in_memory(tmp_path, caplog):
+    path = str(tmp_path / "cache.sqlite3")
+    results = ResultCache(path, busy_timeout=0.05)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")  # holds the write lock, like a worker mid-write
+    results.set("k", {"v": 1})
+    assert "Result cache write failed" in caplog.text
+    assert results.get("k") == {"v": 1}
+    other.execute("ROLLBACK")
+    results.set("k2", {"v": 2})
+    assert ResultCache(path).get("k2") == {"v": 2}
+    assert ResultCache(path).get("k") is None
@@ -0,0 +1,99 @@
+"""dsp functions against signals with known answers, and whole-track features against per-chunk ones"""
+
+import librosa
+import numpy as np
+import pytest
+
+import dsp
+from benchmarks.synthetic import SyntheticTrack
+
+FRAME_RATE = 10  # novelty curve frames per second
+
+
+def curves(*sections):
+    """(rms, centroid) for consecutive (seconds, rms, centroid Hz) sections"""
+    rms = np.concatenate([np.full(seconds * FRAME_RATE, level) for seconds, level, _ in sections])
+    centroid = np.concatenate([np.full(seconds * FRAME_RATE, hz) for seconds, _, hz in sections])
+    return rms, centroid
+
+
+def rounded(segments):
+    return [(round(start, 1), round(end, 1)) for start, end in segments]
+
+
+def test_novelty_boundaries_fall_where_the_sound_changes():
+    # Loud and bright, then quiet (-20 dB), then dark (3 octaves down)
+    rms, centroid = curves((20, 0.5, 4000.0), (20, 0.05, 4000.0), (20, 0.05, 500.0))
+    segments = dsp.novelty_segments(rms, centroid, 60.0, min_seconds=4.0, max_seconds=30.0)
+    assert rounded(segments) == [(0.0, 20.0), (20.0, 40.0), (40.0, 60.0)]
+
+
+def test_novelty_splits_steady_stretches_evenly():
+    rms, centroid = curves((50, 0.3, 2000.0))
+    segments = dsp.novelty_segments(rms, centroid, 50.0, min_seconds=4.0, max_seconds=15.0)
+    assert rounded(segments) == [(0.0, 12.5), (12.5, 25.0), (25.0, 37.5), (37.5, 50.0)]
+
+
+def test_novelty_ignores_changes_below_the_threshold_or_too_close_to_the_ends():
+    # -3 dB is half a novelty unit; the big change at 58 s is within min_seconds of the end
+    rms, centroid = curves((30, 0.5, 2000.0), (28, 0.35, 2000.0), (2, 0.01, 200.0))
+    segments = dsp.novelty_segments(rms, centroid, 60.0, min_seconds=4.0, max_seconds=60.0)
+    assert rounded(segments) == [(0.0, 60.0)]
+
+
+def test_novelty_budget_drops_the_weakest_boundary():
+    # -20 dB at 20 s, then only -9 dB more at 40 s
+    rms, centroid = curves((20, 0.5, 2000.0), (20, 0.05, 2000.0), (20, 0.018, 2000.0))
+    segments = dsp.novelty_segments(rms, centroid, 60.0, min_seconds=4.0, max_seconds=60.0)
+    assert rounded(segments) == [(0.0, 20.0), (20.0, 40.0), (40.0, 60.0)]
+    segments = dsp.novelty_segments(rms, centroid, 60.0, min_seconds=4.0, max_seconds=60.0, budget=2)
+    assert rounded(segments) == [(0.0, 20.0), (20.0, 60.0)]
+
+
+@pytest.mark.parametrize("total_seconds, frames", [(3.0, 30), (60.0, 1)])
+def test_novelty_keeps_short_tracks_whole(total_seconds, frames):
+    rms, centroid = np.linspace(0.1, 1.0, frames), np.full(frames, 1000.0)
+    assert dsp.novelty_segments(rms, centroid, total_seconds, 4.0, 30.0) == [(0.0, total_seconds)]
+
+
+TRACK = SyntheticTrack("mix", 30, 22050, bpm=120, key="A minor")
+CHUNK, HOP = 7 * TRACK.sr, 6 * TRACK.sr
+
+
+@pytest.fixture(scope="module")
+def track():
+    wave = TRACK.render()
+    return wave, dsp.track_features(wave, TRACK.sr, chroma_backend="cqt_fast")
+
+
+@pytest.mark.parametrize("start", range(0, 4 * HOP, HOP))
+def test_sliced_features_match_the_chunk_on_its_own(track, start):
+    wave, features = track
+    chunk = wave[start:start + CHUNK]
+    energy, tempo, key = features.chunk_features(start, start + CHUNK)
+    chunk_energy, chunk_tempo, chunk_key = dsp.analyse_chunk(chunk, TRACK.sr, "cqt_fast")
+    # Frames near the chunk's edges see the neighbouring audio instead of padding
+    assert energy == pytest.approx(chunk_energy, abs=0.01)
+    assert tempo == pytest.approx(chunk_tempo, rel=0.02)
+    assert tempo == pytest.approx(TRACK.bpm, rel=0.02)
+    assert key == chunk_key == TRACK.key
+
+
+@pytest.mark.parametrize("start", [HOP, 2 * HOP, 3 * HOP])
+def test_sliced_frames_match_the_chunk_away_from_its_edges(track, start):
+    wave, features = track
+    start -= start % dsp.WAVEFORM_HOP  # frames line up when the chunk starts on a frame
+    chunk = wave[start:start + CHUNK]
+    edge = 4
+
+    rms = features.rms[start // features.RMS_HOP:(start + CHUNK) // features.RMS_HOP]
+    chunk_rms = librosa.feature.rms(
+        y=chunk, frame_length=dsp.energy_frame_length(TRACK.sr), hop_length=features.RMS_HOP
+    )[0][:len(rms)]
+    np.testing.assert_allclose(rms[edge:-edge], chunk_rms[edge:-edge], rtol=1e-4)
+
+    _, track_rms, track_centroid = dsp.waveform_analysis(wave, TRACK.sr)
+    _, chunk_rms, chunk_centroid = dsp.waveform_analysis(chunk, TRACK.sr)
+    frames = slice(start // dsp.WAVEFORM_HOP + edge, start // dsp.WAVEFORM_HOP + len(chunk_rms) - edge)
+    np.testing.assert_allclose(track_rms[frames], chunk_rms[edge:-edge], rtol=1e-4)
+    np.testing.assert_allclose(track_centroid[frames], chunk_centroid[edge:-edge], rtol=1e-4)
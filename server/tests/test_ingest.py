@@ -0,0 +1,74 @@
+"""StreamingIngest against a local server that sends the file slowly"""
+
+import http.server
+import io
+import threading
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from ingest import StreamingIngest
+
+SECONDS = 20
+BLOCKS = 25  # the file is sent in this many blocks, BLOCK_DELAY apart
+BLOCK_DELAY = 0.03
+
+
+def encode(fmt, sr):
+    t = np.arange(SECONDS * sr) / sr
+    y = (0.3 * np.sin(2 * np.pi * 220.0 * t)).astype(np.float32)
+    buffer = io.BytesIO()
+    sf.write(buffer, y, sr, format=fmt)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def serve(data):
+        block = -(-len(data) // BLOCKS)
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                for start in range(0, len(data), block):
+                    self.wfile.write(data[start:start + block])
+                    self.wfile.flush()
+                    time.sleep(BLOCK_DELAY)
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/track", -(-len(data) // BLOCKS)
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.mark.parametrize("fmt, sr", [("WAV", 8000), ("MP3", 22050)])
+def test_first_chunk_arrives_before_the_download_ends(serve, fmt, sr):
+    data = encode(fmt, sr)
+    url, block = serve(data)
+    ingest = StreamingIngest(url, chunk_duration=7.0, hop_duration=6.0, block_bytes=block)
+    try:
+        ingest.wait_header()
+        assert ingest.sr == sr
+        chunks = ingest.chunks()
+        start, samples = next(chunks)
+        downloaded = ingest.download.size
+        assert start == 0 and len(samples) == 7 * sr
+        assert downloaded < len(data)
+        rest = list(chunks)
+        assert [start for start, _ in rest] == [6 * sr, 12 * sr]
+        assert len(ingest.waveform.result(timeout=10)) > 0
+    finally:
+        ingest.close()
@@ -0,0 +1,111 @@
+import pytest
+
+import jobs
+from config import settings
+from jobs import EventFilter, JobStore, QueueFull
+
+
+class Clock:
+    """Stands in for time.time inside jobs.py"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobs.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_enqueue_reuses_live_jobs_but_not_failed_ones(store):
+    job, created = store.enqueue("a.mp3")
+    assert created and job["status"] == "queued"
+    assert store.enqueue("a.mp3") == (job, False)
+    store.finish(job["id"], "error", "boom")
+    retry, created = store.enqueue("a.mp3")
+    assert created and retry["id"] != job["id"]
+
+
+def test_enqueue_reuses_finished_jobs_only_while_their_image_urls_last(store, clock):
+    job, _ = store.enqueue("a.mp3")
+    store.claim("w1", stale_after=60)
+    clock.now += 30
+    store.finish(job["id"], "complete")
+    clock.now += settings.IMAGE_URL_TTL_SECONDS
+    reused, created = store.enqueue("a.mp3")
+    assert not created and reused["id"] == job["id"]
+    clock.now += 1
+    rerun, created = store.enqueue("a.mp3")
+    assert created and rerun["id"] != job["id"]
+
+
+def test_enqueue_refuses_past_the_queue_limit(store):
+    store.enqueue("a.mp3", max_queued=2)
+    store.enqueue("b.mp3", max_queued=2)
+    with pytest.raises(QueueFull):
+        store.enqueue("c.mp3", max_queued=2)
+    assert store.queue_depth() == 2
+
+
+def test_claim_takes_the_oldest_queued_job_once(store, clock):
+    first, _ = store.enqueue("a.mp3")
+    clock.now += 1
+    second, _ = store.enqueue("b.mp3")
+    claimed = store.claim("w1", stale_after=60)
+    assert claimed["id"] == first["id"]
+    assert claimed["status"] == "running" and claimed["worker"] == "w1"
+    assert store.claim("w2", stale_after=60)["id"] == second["id"]
+    assert store.claim("w3", stale_after=60) is None
+
+
+def test_running_job_is_reclaimed_only_once_its_heartbeat_is_stale(store, clock):
+    job, _ = store.enqueue("a.mp3")
+    store.claim("w1", stale_after=60)
+    clock.now += 50
+    store.heartbeat(job["id"])
+    clock.now += 50
+    assert store.claim("w2", stale_after=60) is None
+    clock.now += 11
+    reclaimed = store.claim("w2", stale_after=60)
+    assert reclaimed["id"] == job["id"]
+    assert store.get(job["id"])["worker"] == "w2"
+
+
+def test_finished_jobs_are_not_reclaimed(store, clock):
+    job, _ = store.enqueue("a.mp3")
+    store.claim("w1", stale_after=60)
+    store.finish(job["id"], "complete")
+    clock.now += 3600
+    assert store.claim("w2", stale_after=60) is None
+
+
+def test_events_replay_after_a_sequence_number(store):
+    job, _ = store.enqueue("a.mp3")
+    for progress in (0, 5, 10):
+        store.append(job["id"], {"status": "loading_audio", "progress": progress})
+    events = store.events(job["id"])
+    assert [seq for seq, _ in events] == [1, 2, 3]
+    assert store.events(job["id"], after=2) == [(3, {"status": "loading_audio", "progress": 10})]
+
+
+def test_event_filter_drops_chunks_repeated_after_a_reclaim():
+    events = EventFilter(from_chunk=1)
+    messages = [
+        {"status": "starting"},
+        {"status": "processing_chunk", "chunk_number": 1},
+        {"status": "processing_chunk", "chunk_number": 2},
+        {"status": "starting"},  # second worker
+        {"status": "processing_chunk", "chunk_number": 2},
+        {"status": "processing_chunk", "chunk_number": 3},
+    ]
+    assert [m for m in messages if events.accept(m)] == [messages[0], messages[2], messages[5]]
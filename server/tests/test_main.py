@@ -0,0 +1,95 @@
+import asyncio
+import json
+import sys
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from config import settings
+
+
+@pytest.fixture
+def client():
+    # Without the context manager the lifespan (job workers, DSP pool) doesn't start
+    return TestClient(main.app)
+
+
+@pytest.fixture(autouse=True)
+def no_streams(monkeypatch):
+    monkeypatch.setattr(main, "active_streams", 0)
+
+
+def test_admit_stream_reserves_until_full(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_ACTIVE_STREAMS", 2)
+    assert main.admit_stream() and main.admit_stream()
+    assert not main.admit_stream()
+    assert main.active_streams == 2
+
+
+def test_full_server_answers_503_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_ACTIVE_STREAMS", 0)
+    response = client.post("/api/process-audio", json={"audio_url": f"https://{main.ALLOWED_DOMAIN}/a.mp3"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert main.active_streams == 0
+
+
+def test_stream_releases_its_slot_when_it_ends(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_ACTIVE_STREAMS", 1)
+
+    def failing_process(*args, **kwargs):
+        raise RuntimeError("no audio here")
+
+    monkeypatch.setitem(sys.modules, "Process", types.SimpleNamespace(Process=failing_process))
+    monkeypatch.setattr(main.executor, "get_dsp_pool", lambda: None)
+    monkeypatch.setattr(main, "get_clients", lambda: None)
+    for _ in range(2):  # the second request only gets in if the first gave its slot back
+        response = client.post("/api/process-audio", json={"audio_url": f"https://{main.ALLOWED_DOMAIN}/a.mp3"})
+        assert response.status_code == 200
+        assert '"status": "error"' in response.text
+    assert main.active_streams == 0
+
+
+@pytest.mark.parametrize("path, generator, body", [
+    ("/api/process-audio", "process_audio_stream", {"audio_url": f"https://{main.ALLOWED_DOMAIN}/a.mp3"}),
+    ("/api/batch", "batch_stream", {"audio_urls": [f"https://{main.ALLOWED_DOMAIN}/a.mp3"]}),
+])
+def test_slot_comes_back_when_the_client_leaves_before_the_first_chunk(monkeypatch, path, generator, body):
+    started = []
+
+    async def stream(*args, **kwargs):
+        started.append(True)
+        yield "never sent\n"
+
+    monkeypatch.setattr(main, generator, stream)
+    body = json.dumps(body).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+        "headers": [(b"host", b"testserver"), (b"content-type", b"application/json")],
+    }
+    requests = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop(0)
+        return {"type": "http.disconnect"}  # gone as soon as the request is read
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            await asyncio.sleep(0.1)  # the disconnect wins the race for the body
+
+    asyncio.run(main.app(scope, receive, send))
+    assert not started
+    assert main.active_streams == 0
+
+
+def test_batch_takes_a_stream_slot(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_ACTIVE_STREAMS", 1)
+    main.admit_stream()
+    response = client.post("/api/batch", json={"audio_urls": [f"https://{main.ALLOWED_DOMAIN}/a.mp3"]})
+    assert response.status_code == 503
+    assert main.active_streams == 1
@@ -0,0 +1,92 @@
+import pytest
+
+from payload import (
+    chunk_message,
+    decode_waveform,
+    encode_waveform,
+    negotiate_waveform_format,
+    waveform_overview_message,
+)
+
+
+def frames(count=100, step=0.0697, colors=("#ff0000", "#00ff00", "#0000ff")):
+    return [
+        {"time": i * step, "amplitude": 0.4 * (i % 17) / 16, "color": colors[(i // 30) % len(colors)]}
+        for i in range(count)
+    ]
+
+
+def test_json_format_is_the_frames_themselves():
+    original = frames()
+    assert encode_waveform(original, "json") is original
+    assert decode_waveform(original) is original
+
+
+@pytest.mark.parametrize("bits", [8, 16])
+def test_compact_round_trip(bits):
+    original = frames()
+    decoded = decode_waveform(encode_waveform(original, "compact", bits))
+    scale = max(f["amplitude"] for f in original)
+    assert len(decoded) == len(original)
+    for before, after in zip(original, decoded):
+        assert after["time"] == pytest.approx(before["time"], abs=1e-9)
+        assert after["color"] == before["color"]
+        # Rounded to the nearest of 2**bits - 1 levels
+        assert after["amplitude"] == pytest.approx(before["amplitude"], abs=scale / ((1 << bits) - 1) / 2 + 1e-12)
+
+
+def test_compact_colors_are_run_length_encoded():
+    payload = encode_waveform(frames(90), "compact")
+    assert payload["palette"] == ["#ff0000", "#00ff00", "#0000ff"]
+    assert payload["color_runs"] == [[0, 30], [1, 30], [2, 30]]
+
+
+def test_uneven_times_are_sent_explicitly():
+    original = frames(5)
+    original[3]["time"] += 0.01
+    payload = encode_waveform(original, "compact")
+    assert "time_step" not in payload
+    assert [f["time"] for f in decode_waveform(payload)] == [f["time"] for f in original]
+
+
+def test_silence_and_empty_waveforms():
+    silent = [dict(f, amplitude=0.0) for f in frames(10)]
+    assert [f["amplitude"] for f in decode_waveform(encode_waveform(silent, "compact"))] == [0.0] * 10
+    assert decode_waveform(encode_waveform([], "compact")) == []
+
+
+def test_bad_format_arguments():
+    with pytest.raises(ValueError):
+        encode_waveform(frames(), "msgpack")
+    with pytest.raises(ValueError):
+        encode_waveform(frames(), "compact", 12)
+
+
+def test_overview_message_encodes_its_frames():
+    message = waveform_overview_message(frames(10), 7, "compact")
+    assert (message["status"], message["progress"]) == ("waveform_overview", 7)
+    assert len(decode_waveform(message["waveform"])) == 10
+
+
+@pytest.mark.parametrize("requested, accept, expected", [
+    ("compact", "application/x-ndjson; waveform=json", "compact"),
+    (None, "application/x-ndjson; waveform=compact", "compact"),
+    (None, 'text/html, application/x-ndjson;q=0.9;waveform="COMPACT"', "compact"),
+    (None, "application/x-ndjson; waveform=msgpack", "json"),
+    (None, None, "json"),
+])
+def test_negotiate_waveform_format(requested, accept, expected):
+    assert negotiate_waveform_format(requested, accept) == expected
+
+
+def test_chunk_message():
+    result = {
+        "chunk_number": 3, "total_chunks": 9, "energy": 0.5, "tempo": 120.0, "key": "A minor",
+        "emotion": {"happy": 100.0}, "image_url": None, "start_time": 12.0, "end_time": 19.0,
+        "timings": {"dsp": 0.1},
+    }
+    message = chunk_message(result, "https://cdn/x.mp3")
+    assert message["progress"] == 40
+    assert message["data"]["start_time"] == 12.0
+    assert "timings" not in message
+    assert chunk_message(result, "https://cdn/x.mp3", include_timings=True)["timings"] == {"dsp": 0.1}
@@ -0,0 +1,148 @@
+"""StagedPipeline ordering and per-stage limits, Batcher grouping and fallback"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pipeline import Batcher, Stage, StagedPipeline
+
+
+class Gauge:
+    """Counts calls in flight and remembers the most seen at once"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.current -= 1
+
+
+def test_results_come_back_in_input_order():
+    # Early items are the slowest, so they finish last
+    def slow(value):
+        time.sleep(0.01 * (10 - value))
+        return value * 2
+
+    pipeline = StagedPipeline([Stage("slow", slow, 10), Stage("inc", lambda v: v + 1, 10)], window=10)
+    assert list(pipeline.run(range(10))) == [2 * v + 1 for v in range(10)]
+
+
+def test_each_stage_keeps_to_its_own_limit():
+    gauges = {"a": Gauge(), "b": Gauge()}
+
+    def stage(name):
+        def fn(value):
+            with gauges[name]:
+                time.sleep(0.02)
+            return value
+        return fn
+
+    pipeline = StagedPipeline([Stage("a", stage("a"), 1), Stage("b", stage("b"), 3)], window=6)
+    assert list(pipeline.run(range(12))) == list(range(12))
+    assert gauges["a"].peak == 1
+    assert 1 < gauges["b"].peak <= 3
+
+
+def test_window_bounds_the_items_in_flight():
+    gauge = Gauge()
+    pulled = []
+
+    def items():
+        for value in range(8):
+            pulled.append(value)
+            yield value
+
+    def fn(value):
+        with gauge:
+            time.sleep(0.02)
+        return value
+
+    results = StagedPipeline([Stage("s", fn, 8)], window=2).run(items())
+    assert next(results) == 0
+    time.sleep(0.1)
+    # 1 and 2 are done but not taken yet, so only 3 is pulled, waiting for a slot
+    assert pulled == [0, 1, 2, 3]
+    assert list(results) == list(range(1, 8))
+    assert gauge.peak <= 2
+
+
+def test_errors_surface_for_their_item():
+    def fn(value):
+        if value == 3:
+            raise RuntimeError("boom")
+        return value
+
+    results = StagedPipeline([Stage("s", fn)], window=4).run(range(6))
+    assert [next(results) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(RuntimeError, match="boom"):
+        next(results)
+
+
+def test_bad_limits_are_refused():
+    with pytest.raises(ValueError):
+        Stage("s", lambda v: v, 0)
+    with pytest.raises(ValueError):
+        StagedPipeline([], window=0)
+
+
+def call_together(batcher, items):
+    with ThreadPoolExecutor(max_workers=len(items)) as pool:
+        futures = [pool.submit(batcher, item) for item in items]
+        return [f.exception() or f.result() for f in futures]
+
+
+def test_batcher_sends_full_batches_at_once():
+    batches = []
+
+    def fn_batch(items):
+        batches.append(sorted(items))
+        return [item * 10 for item in items]
+
+    batcher = Batcher(fn_batch, lambda item: pytest.fail("no single calls expected"), 4, max_latency=5.0)
+    start = time.perf_counter()
+    assert call_together(batcher, [1, 2, 3, 4]) == [10, 20, 30, 40]
+    assert batches == [[1, 2, 3, 4]]
+    assert time.perf_counter() - start < 1.0  # didn't wait for max_latency
+
+
+def test_batcher_sends_a_partial_batch_after_max_latency():
+    batches = []
+
+    def fn_batch(items):
+        batches.append(sorted(items))
+        return list(items)
+
+    batcher = Batcher(fn_batch, lambda item: item, 4, max_latency=0.1)
+    assert call_together(batcher, [1, 2]) == [1, 2]
+    assert batches == [[1, 2]]
+    assert batcher(7) == 7  # alone: a single call, no batch
+    assert batches == [[1, 2]]
+
+
+@pytest.mark.parametrize("fn_batch", [
+    lambda items: 1 / 0,
+    lambda items: items[:-1],
+], ids=["raises", "short"])
+def test_batcher_falls_back_to_single_calls(fn_batch):
+    singles = []
+
+    def fn_single(item):
+        singles.append(item)
+        if item == 3:
+            raise RuntimeError("three")
+        return -item
+
+    results = call_together(Batcher(fn_batch, fn_single, 3, max_latency=5.0), [1, 2, 3])
+    assert results[:2] == [-1, -2]
+    assert isinstance(results[2], RuntimeError)  # each item gets its own outcome
+    assert sorted(singles) == [1, 2, 3]
@@ -0,0 +1,61 @@
+"""Process's DSP work goes to the attached pool, and gives what it gives inline"""
+
+import concurrent.futures
+
+import pytest
+
+import dsp
+from benchmarks.fakes import FakeClients
+from benchmarks.synthetic import SyntheticTrack
+from config import settings
+from Process import Process
+
+TRACK = SyntheticTrack("mix", 20.0, 22050, bpm=120.0, key="A minor")
+
+
+class RecordingExecutor(concurrent.futures.ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.submitted = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted.append(fn.__name__)
+        return super().submit(fn, *args, **kwargs)
+
+
+def chunk_values(process, starts):
+    samples, _ = process.chunk()
+    values = []
+    for n, start in enumerate(starts):
+        state = {"chunk_number": n, "total_chunks": len(starts), "start": start, "end": start + samples,
+                 "timings": {}}
+        process._dsp_stage(state)
+        values.append((state["energy"], state["tempo"], state["key"]))
+    return values
+
+
+@pytest.mark.parametrize("block_seconds", [60.0, 8.0])
+def test_track_features_run_on_the_pool(monkeypatch, block_seconds):
+    monkeypatch.setattr(settings, "FEATURE_MODE", "track")
+    monkeypatch.setattr(settings, "FEATURE_BLOCK_SECONDS", block_seconds)
+    wave = TRACK.render()
+    starts = [0, 6 * TRACK.sr, 12 * TRACK.sr]
+
+    inline = Process("https://example.test/track.wav", clients=FakeClients({}))
+    inline.wave, inline.sr = wave, TRACK.sr
+    expected = chunk_values(inline, starts)
+
+    with RecordingExecutor() as pool:
+        pooled = Process("https://example.test/track.wav", dsp_executor=pool, clients=FakeClients({}))
+        pooled.wave, pooled.sr = wave, TRACK.sr
+        assert chunk_values(pooled, starts) == expected
+
+    if block_seconds < TRACK.seconds:
+        assert pool.submitted.count("track_features") == 3
+        assert pool.submitted.count("with_tempogram") == 1
+    else:
+        assert pool.submitted.count("track_features") == 1
+    assert pool.submitted.count("sliced_chunk_features") == len(starts)
+    assert set(pool.submitted) <= {"track_features", "with_tempogram", "sliced_chunk_features"}
+    assert pooled.timings["tempogram"] > 0
+    assert "tempogram" in pooled.features.__dict__
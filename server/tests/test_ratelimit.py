@@ -0,0 +1,133 @@
+import email.utils
+import threading
+import time
+
+import pytest
+
+import ratelimit
+from config import settings
+from ratelimit import ProviderLimit, RateLimitTimeout, TokenBucket, call_with_retries, retry_delay
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    """Shaped like the requests, httpx and OpenAI SDK errors: the status is on .response"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = Response(status_code, headers)
+
+
+@pytest.fixture(autouse=True)
+def retry_settings(monkeypatch):
+    monkeypatch.setattr(settings, "API_RETRY_ATTEMPTS", 4)
+    monkeypatch.setattr(settings, "API_RETRY_BASE", 1.0)
+    monkeypatch.setattr(settings, "API_RETRY_MAX", 30.0)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Delays call_with_retries waited, without waiting them"""
+    sleeps = []
+    monkeypatch.setattr(ratelimit.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def test_backoff_grows_exponentially_with_full_jitter():
+    for attempt in range(3):
+        for _ in range(50):
+            assert 0 <= retry_delay(HTTPError(503), attempt) <= 2 ** attempt
+
+
+def test_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, "API_RETRY_ATTEMPTS", 20)
+    assert all(retry_delay(HTTPError(503), 15) <= settings.API_RETRY_MAX for _ in range(50))
+
+
+def test_retry_after_seconds_wins_over_backoff():
+    delay = retry_delay(HTTPError(429, {"Retry-After": "7"}), 0)
+    assert 7 <= delay <= 7 + settings.API_RETRY_BASE
+
+
+def test_retry_after_http_date():
+    when = email.utils.formatdate(time.time() + 20, usegmt=True)
+    delay = retry_delay(HTTPError(503, {"Retry-After": when}), 0)
+    assert 18 <= delay <= 21 + settings.API_RETRY_BASE
+
+
+def test_retry_after_is_capped():
+    assert retry_delay(HTTPError(429, {"Retry-After": "3600"}), 0) <= settings.API_RETRY_MAX + settings.API_RETRY_BASE
+
+
+def test_malformed_retry_after_falls_back_to_backoff():
+    assert 0 <= retry_delay(HTTPError(429, {"Retry-After": "soon"}), 0) <= settings.API_RETRY_BASE
+
+
+def test_client_errors_and_last_attempt_are_not_retried():
+    assert retry_delay(HTTPError(400), 0) is None
+    assert retry_delay(ValueError("bad input"), 0) is None
+    assert retry_delay(HTTPError(503), settings.API_RETRY_ATTEMPTS - 1) is None
+
+
+def test_retry_on_and_transient_narrow_what_is_retried():
+    assert retry_delay(HTTPError(503), 0, retry_on=ratelimit.REJECTED_STATUS) is None
+    assert retry_delay(HTTPError(429), 0, retry_on=ratelimit.REJECTED_STATUS) is not None
+    assert retry_delay(ConnectionError(), 0) is not None
+    assert retry_delay(ConnectionError(), 0, retry_transient=False) is None
+
+
+def test_call_with_retries_retries_until_success(sleeps):
+    outcomes = [HTTPError(503), HTTPError(429, {"Retry-After": "2"}), "ok"]
+
+    def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert call_with_retries(call) == "ok"
+    assert len(sleeps) == 2
+    assert 2 <= sleeps[1] <= 2 + settings.API_RETRY_BASE
+
+
+def test_call_with_retries_gives_up_after_the_last_attempt(sleeps):
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise HTTPError(503)
+
+    with pytest.raises(HTTPError):
+        call_with_retries(call)
+    assert len(calls) == settings.API_RETRY_ATTEMPTS
+    assert len(sleeps) == settings.API_RETRY_ATTEMPTS - 1
+
+
+def test_token_bucket_allows_a_burst_then_times_out():
+    bucket = TokenBucket(rate=0.01, burst=2)
+    assert bucket.acquire(timeout=0) and bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0.1)
+
+
+def test_slot_times_out_when_the_provider_is_full_and_counts_waiters():
+    limit = ProviderLimit("test", rate=100, burst=100, concurrency=1, shared=threading.BoundedSemaphore(4))
+    with limit.slot():
+        with pytest.raises(RateLimitTimeout):
+            with limit.slot(timeout=0.05):
+                pass
+    assert limit.waiting == 0
+    with limit.slot(timeout=0.05):
+        pass  # released again
+
+
+def test_overloaded_when_too_many_calls_wait(monkeypatch):
+    monkeypatch.setattr(settings, "API_MAX_WAITING", 2)
+    limit = ratelimit.get_limits()["openai"]
+    assert not ratelimit.overloaded()
+    monkeypatch.setattr(limit, "waiting", 2)
+    assert ratelimit.overloaded()
@@ -0,0 +1,188 @@
+"""ReplicateClient against a local fake of the Replicate predictions API"""
+
+import asyncio
+import http.server
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+import ratelimit
+from config import settings
+from replicate_client import ReplicateClient
+
+
+class FakeReplicate:
+    """
+    Predictions that finish `duration` seconds after they are created. Statuses queued in
+    `create_errors` / `poll_errors` are answered to the next creates / polls instead.
+    """
+
+    def __init__(self, duration=0.0, outcome="succeeded"):
+        self.duration = duration
+        self.outcome = outcome
+        self.create_errors = []
+        self.poll_errors = []
+        self.creates = 0
+        self.polls = 0
+        self.prefer = None
+        self.predictions = {}  # id -> created (monotonic)
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body=None, headers=()):
+                data = json.dumps(body or {}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                fake.creates += 1
+                fake.prefer = self.headers.get("Prefer")
+                if fake.create_errors:
+                    return self.reply(fake.create_errors.pop(0), headers=[("Retry-After", "0")])
+                prediction_id = f"p{fake.creates}"
+                fake.predictions[prediction_id] = time.monotonic()
+                self.reply(201, fake.status(prediction_id))
+
+            def do_GET(self):
+                fake.polls += 1
+                if fake.poll_errors:
+                    return self.reply(fake.poll_errors.pop(0))
+                self.reply(200, fake.status(self.path.rsplit("/", 1)[-1]))
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def status(self, prediction_id):
+        done = time.monotonic() - self.predictions[prediction_id] >= self.duration
+        prediction = {
+            "id": prediction_id,
+            "status": self.outcome if done else "processing",
+            "urls": {"get": f"{self.url}/predictions/{prediction_id}"},
+        }
+        if done and self.outcome == "succeeded":
+            prediction["output"] = f"https://replicate.delivery/{prediction_id}.webp"
+        if done and self.outcome == "failed":
+            prediction["error"] = "NSFW content detected"
+        return prediction
+
+
+@pytest.fixture
+def fake():
+    fake = FakeReplicate()
+    yield fake
+    fake.server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def quick_retries(monkeypatch):
+    monkeypatch.setattr(settings, "API_RETRY_BASE", 0.01)
+    monkeypatch.setattr(settings, "API_RETRY_ATTEMPTS", 3)
+
+
+def predict(fake, count=1, **options):
+    """Outputs (or exceptions) of `count` concurrent predictions on a fresh client"""
+    options = {"poll_initial": 0.02, "poll_max": 0.05, **options}
+    client = ReplicateClient("token", base_url=fake.url, **options)
+
+    async def run():
+        try:
+            return await asyncio.gather(
+                *(client.predict("luma/photon-flash", {"prompt": "calm"}) for _ in range(count)),
+                return_exceptions=True,
+            )
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(run())
+    return results if count > 1 else results[0]
+
+
+def test_quick_prediction_comes_back_with_the_create_call(fake):
+    assert predict(fake, wait_seconds=5) == "https://replicate.delivery/p1.webp"
+    assert fake.prefer == "wait=5"
+    assert fake.polls == 0
+
+
+def test_slow_prediction_is_polled_until_it_finishes(fake):
+    fake.duration = 0.2
+    assert predict(fake) == "https://replicate.delivery/p1.webp"
+    assert fake.creates == 1
+    assert fake.polls >= 2
+
+
+def test_failed_prediction_raises(fake):
+    fake.outcome = "failed"
+    with pytest.raises(RuntimeError, match="NSFW"):
+        raise predict(fake)
+
+
+def test_prediction_times_out(fake):
+    fake.duration = 60
+    with pytest.raises(TimeoutError):
+        raise predict(fake, timeout=0.2)
+
+
+def test_create_is_resent_after_a_429(fake):
+    fake.create_errors = [429]
+    assert predict(fake) == "https://replicate.delivery/p2.webp"
+    assert fake.creates == 2
+
+
+@pytest.mark.parametrize("status", [409, 500, 503])
+def test_create_is_not_resent_after_errors_that_may_have_started_a_prediction(fake, status):
+    fake.create_errors = [status]
+    result = predict(fake)
+    assert isinstance(result, httpx.HTTPStatusError)
+    assert result.response.status_code == status
+    assert fake.creates == 1
+
+
+def test_polls_are_retried(fake):
+    fake.duration = 0.1
+    fake.poll_errors = [503]
+    assert predict(fake) == "https://replicate.delivery/p1.webp"
+
+
+def test_webhook_wakes_the_poll_early(fake):
+    fake.duration = 0.2
+    client = ReplicateClient("token", base_url=fake.url, poll_initial=30, poll_max=30)
+
+    async def run():
+        task = asyncio.create_task(client.predict("luma/photon-flash", {"prompt": "calm"}))
+        await asyncio.sleep(0.4)
+        client.notify("p1")  # as /api/replicate-webhook would, from another thread
+        try:
+            return await asyncio.wait_for(task, 5)
+        finally:
+            await client.aclose()
+
+    start = time.monotonic()
+    assert asyncio.run(run()) == "https://replicate.delivery/p1.webp"
+    assert time.monotonic() - start < 5
+
+
+def test_rate_limit_slot_is_only_held_during_requests(fake):
+    # One API call at a time across the process, yet three slow predictions run side by side
+    fake.duration = 0.5
+    shared = threading.BoundedSemaphore(1)
+    limit = ratelimit.ProviderLimit("replicate", rate=100, burst=100, concurrency=1, shared=shared)
+    start = time.monotonic()
+    outputs = predict(fake, count=3, limit=limit)
+    assert sorted(outputs) == [f"https://replicate.delivery/p{i}.webp" for i in (1, 2, 3)]
+    assert time.monotonic() - start < 1.2
+    # Nothing left holding the shared budget
+    assert shared.acquire(blocking=False)
+    shared.release()
@@ -6,6 +6,7 @@ import { useState, useEffect, useRef } from "react";
 import { toast } from "sonner";
 import { X } from "lucide-react";
 import type { StreamResponse, ChunkData, WaveformFrame } from "@/types/audio";
+import { decodeWaveform } from "@/lib/waveform";
 import WaveformGraph from "./waveform-graph";
 import NextImage from "next/image";
 
@@ -169,7 +170,11 @@ export default function AudioVisualizer() {
           headers: {
             "Content-Type": "application/json",
           },
-          body: JSON.stringify({ audio_url: audioUrl }),
+          body: JSON.stringify({
+            audio_url: audioUrl,
+            waveform_format: "compact",
+            progressive_waveform: true,
+          }),
           signal: abortControllerRef.current.signal,
         },
       );
@@ -209,12 +214,16 @@ export default function AudioVisualizer() {
             }
 
             if (data.status === "waveform_ready") {
+              const waveform = decodeWaveform(data.waveform);
               console.log(
                 "Waveform data received:",
-                data.waveform.length,
+                waveform.length,
                 "frames",
               );
-              setAllWaveform(data.waveform);
+              setAllWaveform(waveform);
+            } else if (data.status === "waveform_overview") {
+              // Progressive waveform: coarse frames until waveform_ready replaces them
+              setAllWaveform(decodeWaveform(data.waveform));
             } else if (data.status === "processing_chunk") {
               console.log("Received chunk data:", data.data);
               setCurrentChunk(data.data);
@@ -0,0 +1,28 @@
+import type { WaveformFrame, WaveformPayload } from "@/types/audio";
+
+export function decodeWaveform(payload: WaveformPayload): WaveformFrame[] {
+  if (Array.isArray(payload)) return payload;
+
+  const bytes = Uint8Array.from(atob(payload.amplitude), (c) => c.charCodeAt(0));
+  const view = new DataView(bytes.buffer);
+  const levels = 2 ** payload.amplitude_bits - 1;
+  const step = payload.amplitude_bits / 8;
+
+  const frames: WaveformFrame[] = [];
+  let i = 0;
+  for (const [paletteIndex, length] of payload.color_runs) {
+    const color = payload.palette[paletteIndex];
+    for (let end = i + length; i < end; i++) {
+      const quantized =
+        step === 1 ? view.getUint8(i) : view.getUint16(i * 2, true);
+      frames.push({
+        time: payload.time
+          ? payload.time[i]
+          : (payload.time_start ?? 0) + i * (payload.time_step ?? 0),
+        amplitude: (quantized / levels) * payload.amplitude_scale,
+        color,
+      });
+    }
+  }
+  return frames;
+}
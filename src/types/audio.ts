@@ -17,30 +17,61 @@ export interface WaveformFrame {
   color: string;
 }
 
+// Opt-in columnar encoding of WaveformFrame[] (see server/payload.py)
+export interface CompactWaveform {
+  format: "compact";
+  count: number;
+  time_start?: number;
+  time_step?: number;
+  time?: number[];
+  amplitude_bits: 8 | 16;
+  amplitude_scale: number;
+  amplitude: string; // base64, little-endian uint8/uint16
+  palette: string[];
+  color_runs: [number, number][];
+}
+
+export type WaveformPayload = WaveformFrame[] | CompactWaveform;
+
 export interface ChunkData {
   energy: number;
   tempo: number;
   key: string;
+  /** Present when the server runs with KEY_CONFIDENCE: lead of the best key over the runner-up */
+  key_confidence?: number;
+  /** Seconds into the track this chunk covers */
+  start_time?: number;
+  end_time?: number;
   emotion: EmotionData;
   image_url: string | null;
   audio_url?: string;
 }
 
+/** Seconds per processing stage, sent when the request sets include_timings */
+export type StageTimings = Record<string, number>;
+
 export type StreamResponse =
   | { status: "starting"; progress: number }
   | { status: "loading_audio"; progress: number }
-  | { status: "waveform_ready"; progress: number; waveform: WaveformFrame[] }
+  | { status: "waveform_ready"; progress: number; waveform: WaveformPayload }
+  /** progressive_waveform: coarse frames for the whole track, replaced by waveform_ready */
+  | { status: "waveform_overview"; progress: number; waveform: WaveformPayload }
   | {
       status: "processing_chunk";
       progress: number;
       chunk_number: number;
       total_chunks: number;
       data: ChunkData;
+      timings?: StageTimings;
     }
-  | { status: "complete"; progress: number }
+  | { status: "complete"; progress: number; timings?: StageTimings }
   | { status: "error"; message: string };
 
 export interface AudioProcessRequest {
   audio_url: string;
+  waveform_format?: "json" | "compact";
+  amplitude_bits?: 8 | 16;
+  include_timings?: boolean;
+  progressive_waveform?: boolean;
 }
 